@@ -22,6 +22,18 @@ const attachToken = (config) => {
   return config;
 };
 
+// Give every POST an Idempotency-Key; a retry of the same request config
+// reuses it, so order/payment-service replay the first response
+const attachIdempotencyKey = (config) => {
+  if (config.method === 'post' && !config.headers['Idempotency-Key']) {
+    config.headers['Idempotency-Key'] = crypto.randomUUID();
+  }
+  return config;
+};
+
 [userAPI, productAPI, orderAPI, paymentAPI].forEach((client) => {
   client.interceptors.request.use(attachToken);
 });
+[orderAPI, paymentAPI].forEach((client) => {
+  client.interceptors.request.use(attachIdempotencyKey);
+});
@@ -11,7 +11,7 @@ function Orders() {
 
   useEffect(() => {
     orderAPI.get('/orders')
-      .then((res) => setOrders(res.data))
+      .then((res) => setOrders(res.data.items))
       .catch((err) => console.error('Failed to fetch orders:', err))
       .finally(() => setLoading(false));
   }, []);
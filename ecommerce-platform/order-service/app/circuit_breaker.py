@@ -0,0 +1,86 @@
+# ============================================================
+# Order Service – Circuit Breaker
+# Fails fast once a downstream dependency keeps erroring or
+# responding too slowly, then probes it again after a cool-down.
+# ============================================================
+import time
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling the dependency while the circuit is open."""
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker for async calls.
+
+    A call counts as a failure if it raises or takes longer than
+    ``slow_call_threshold`` seconds. After ``failure_threshold`` failures in a
+    row the circuit opens and calls are rejected with CircuitOpenError. Once
+    ``reset_timeout`` seconds have passed a single trial call is let through
+    (half-open): success closes the circuit, failure opens it again.
+    """
+
+    def __init__(self, name: str, failure_threshold: int, slow_call_threshold: float, reset_timeout: float):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.slow_call_threshold = slow_call_threshold
+        self.reset_timeout = reset_timeout
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+
+    @property
+    def state(self) -> str:
+        if self._state == OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+            return HALF_OPEN
+        return self._state
+
+    def snapshot(self) -> dict:
+        """State summary for the readiness probe."""
+        return {"state": self.state, "consecutive_failures": self._failures}
+
+    def _before_call(self):
+        state = self.state
+        if state == OPEN or (state == HALF_OPEN and self._trial_in_flight):
+            raise CircuitOpenError(f"{self.name} circuit is open")
+        if state == HALF_OPEN:
+            self._state = HALF_OPEN
+            self._trial_in_flight = True
+
+    def _on_success(self):
+        self._state = CLOSED
+        self._failures = 0
+        self._trial_in_flight = False
+
+    def _on_failure(self):
+        self._failures += 1
+        self._trial_in_flight = False
+        if self._state == HALF_OPEN or self._failures >= self.failure_threshold:
+            self._state = OPEN
+            self._opened_at = time.monotonic()
+
+    async def call(self, func, *args, **kwargs):
+        """Await ``func(*args, **kwargs)`` through the breaker."""
+        self._before_call()
+        start = time.monotonic()
+        try:
+            result = await func(*args, **kwargs)
+        except Exception:
+            self._on_failure()
+            raise
+        except BaseException:
+            # Cancelled (client gone, outer timeout, shutdown): no verdict on the
+            # dependency, but a half-open trial must not stay in flight forever
+            self._trial_in_flight = False
+            raise
+        if time.monotonic() - start > self.slow_call_threshold:
+            self._on_failure()
+        else:
+            self._on_success()
+        return result
@@ -0,0 +1,126 @@
+# ============================================================
+# Order Service – Event Consumers
+# Applies payment.completed / payment.updated events from
+# payment-service to order status, one bulk UPDATE per batch.
+# ============================================================
+from datetime import datetime
+
+from sqlalchemy import DateTime, Integer, String, and_, column, literal, or_, select, union_all, update, values
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.cache import invalidate, order_key
+from app.config import settings
+from app import rollup
+from app.database import SessionLocal, mark_write
+from app.messaging import start_batch_consumer
+from app.models import Order
+from app.outbox import enqueue_event
+from app.schemas import PaymentEvent
+
+PAYMENT_EVENTS_QUEUE = "order-service.payment-events"
+
+# Payment status -> order status it moves the order to
+PAYMENT_TO_ORDER_STATUS = {
+    "completed": "paid",
+    "failed": "payment_failed",
+    "refunded": "refunded",
+}
+
+# Order status -> statuses an order may be in for the transition to apply
+ALLOWED_FROM = {
+    "paid": ("pending", "payment_failed"),
+    "payment_failed": ("pending",),
+    "refunded": ("paid", "shipped", "delivered", "cancelled"),
+}
+
+
+def _status_rows(db: AsyncSession, rows: list):
+    """
+    (order_id, status, event_at) rows as a FROM-able table. Postgres gets a
+    VALUES list; SQLite (tests) can't alias VALUES columns, so it gets the
+    equivalent UNION ALL of SELECTs.
+    """
+    if db.bind.dialect.name == "postgresql":
+        return values(
+            column("order_id", Integer), column("status", String), column("event_at", DateTime), name="v",
+        ).data(rows)
+    return union_all(*(
+        select(
+            literal(order_id, Integer).label("order_id"),
+            literal(status, String).label("status"),
+            literal(event_at, DateTime).label("event_at"),
+        )
+        for order_id, status, event_at in rows
+    )).subquery("v")
+
+
+async def apply_payment_events(events: list[PaymentEvent]):
+    """
+    Apply a batch of payment events with a single UPDATE ... FROM (VALUES ...).
+    Only the newest event per order is used; events older than the last one
+    applied to the order, or transitions the order's current status does not
+    allow, are ignored. Every changed order gets an order.updated outbox event
+    and its rollup deltas in the same transaction, and its cached document is
+    invalidated; its owner's reads go to the primary for a while.
+    """
+    received_at = datetime.utcnow()
+    latest = {}
+    for event in events:
+        status = PAYMENT_TO_ORDER_STATUS.get(event.status)
+        if status is None:
+            continue
+        event_at = event.updated_at or received_at
+        if event.order_id not in latest or event_at > latest[event.order_id][1]:
+            latest[event.order_id] = (status, event_at)
+    if not latest:
+        return
+
+    async with SessionLocal() as db:
+        # Lock the orders first so the statuses read here are the ones the UPDATE replaces
+        before = {
+            row.id: row for row in await db.execute(
+                select(Order.id, Order.user_id, Order.created_at, Order.currency, Order.total_cents, Order.status)
+                .where(Order.id.in_(latest))
+                .order_by(Order.id)
+                .with_for_update()
+            )
+        }
+        v = _status_rows(db, [(order_id, status, at) for order_id, (status, at) in latest.items()])
+        stmt = (
+            update(Order)
+            .where(
+                Order.id == v.c.order_id,
+                or_(*(and_(v.c.status == target, Order.status.in_(sources)) for target, sources in ALLOWED_FROM.items())),
+                or_(Order.payment_status_at.is_(None), Order.payment_status_at < v.c.event_at),
+            )
+            .values(status=v.c.status, payment_status_at=v.c.event_at)
+            .returning(Order.id, Order.status)
+            .execution_options(synchronize_session=False)
+        )
+        changed = (await db.execute(stmt)).all()
+        for order_id, status in changed:
+            enqueue_event(db, "order.updated", {"order_id": order_id, "status": status})
+        await rollup.apply_deltas(db, (
+            delta
+            for order_id, status in changed
+            for delta in rollup.moved(
+                before[order_id].user_id, before[order_id].created_at, before[order_id].currency,
+                before[order_id].total_cents, before[order_id].status, status,
+            )
+        ))
+        await db.commit()
+    # Owners read the new status from the primary until the replicas have it
+    await mark_write(*{before[order_id].user_id for order_id, _ in changed})
+    await invalidate(*(order_key(order_id) for order_id, _ in changed))
+
+
+async def start_consumers():
+    """Start all order-service event consumers (called from the lifespan)."""
+    await start_batch_consumer(
+        PAYMENT_EVENTS_QUEUE,
+        ["payment.completed", "payment.updated"],
+        decode=lambda data: PaymentEvent(**data),
+        handler=apply_payment_events,
+        batch_size=settings.PAYMENT_EVENTS_BATCH_SIZE,
+        window=settings.PAYMENT_EVENTS_WINDOW_MS / 1000,
+    )
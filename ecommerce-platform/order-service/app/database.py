@@ -1,19 +1,239 @@
 # ============================================================
 # Order Service – Database Session
-# Creates SQLAlchemy engine and provides session dependency.
+# Creates the async SQLAlchemy engines (asyncpg) for the
+# primary and any read replicas, and provides the AsyncSession
+# dependencies used by the routes: get_db (primary) for writes,
+# get_read_db (a replica when it is safe) for GET endpoints.
 # ============================================================
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+import asyncio
+import itertools
+import logging
+import time
+from typing import Optional
+from uuid import uuid4
+
+from fastapi import Depends
+from redis.exceptions import RedisError
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import NullPool
+from sqlalchemy.sql.dml import UpdateBase
+
+from app.auth import get_current_user
+from app.cache import redis_client
 from app.config import settings
+from app.metrics import TimedQueuePool, instrument_engine
+from app.tracing import trace_engine
+
+
+def engine_options() -> dict:
+    """Engine keyword arguments built from the DB_POOL_* and DB_PGBOUNCER settings."""
+    options = {"pool_pre_ping": settings.DB_POOL_PRE_PING}
+    if settings.DB_POOL_CLASS == "null":
+        options["poolclass"] = NullPool
+    else:
+        options.update(
+            poolclass=TimedQueuePool,
+            pool_size=settings.DB_POOL_SIZE,
+            max_overflow=settings.DB_MAX_OVERFLOW,
+            pool_timeout=settings.DB_POOL_TIMEOUT_SECONDS,
+            pool_recycle=settings.DB_POOL_RECYCLE_SECONDS,
+        )
+    if settings.DB_PGBOUNCER:
+        # Consecutive statements may run on different server connections, so
+        # asyncpg must neither cache prepared statements nor reuse their names
+        options["connect_args"] = {
+            "statement_cache_size": 0,
+            "prepared_statement_cache_size": 0,
+            "prepared_statement_name_func": lambda: f"__asyncpg_{uuid4()}__",
+        }
+    return options
+
+
+engine = create_async_engine(settings.database_url, **engine_options())
+instrument_engine(engine)
+trace_engine(engine)
+SessionLocal = async_sessionmaker(engine, expire_on_commit=False, autoflush=False)
+
+logger = logging.getLogger(__name__)
+
+# Replication delay in seconds; 0 when the replica has replayed all WAL it received
+REPLICA_LAG_SQL = text(
+    "SELECT CASE WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END"
+)
+
+
+class ReplicaSet:
+    """
+    Read-replica engines and their last measured lag. Reads are spread
+    round-robin over the replicas within ``max_lag``; a replica that was not
+    measured yet or failed its last check gets none.
+    """
+
+    def __init__(self, engines: dict, max_lag: float):
+        self.engines = engines
+        self.max_lag = max_lag
+        self.lag: dict = {name: None for name in engines}
+        self._turn = itertools.count()
+
+    def pick(self) -> Optional[AsyncEngine]:
+        """A replica engine within the lag threshold, or None (read from the primary)."""
+        healthy = [name for name, lag in self.lag.items() if lag is not None and lag <= self.max_lag]
+        if not healthy:
+            return None
+        return self.engines[healthy[next(self._turn) % len(healthy)]]
+
+    async def measure(self, timeout: float):
+        for name, replica in self.engines.items():
+            try:
+                async with replica.connect() as conn:
+                    lag = (await asyncio.wait_for(conn.execute(REPLICA_LAG_SQL), timeout)).scalar()
+            except (DBAPIError, OSError, asyncio.TimeoutError) as e:
+                if self.lag[name] is not None:
+                    logger.warning("Replica %s unreachable, reading from the primary: %s", name, e)
+                lag = None
+            self.lag[name] = None if lag is None else float(lag)
+
+    def stats(self) -> dict:
+        return {name: None if lag is None else round(lag, 3) for name, lag in self.lag.items()}
+
+
+def _replica_engine(name: str, url: str) -> AsyncEngine:
+    replica = create_async_engine(url, **engine_options())
+    instrument_engine(replica, name)
+    trace_engine(replica, name)
+    return replica
+
+
+replicas = ReplicaSet(
+    {f"replica{n}": _replica_engine(f"replica{n}", url) for n, url in enumerate(settings.replica_urls, 1)},
+    max_lag=settings.DB_REPLICA_MAX_LAG_SECONDS,
+)
+
+
+class RoutingSession(Session):
+    """
+    Session for read-only dependencies: statements go to the replica in
+    ``info["replica"]`` (chosen by get_read_db), but flushes and
+    insert/update/delete constructs always go to the primary.
+    """
+
+    def get_bind(self, mapper=None, clause=None, **kw):
+        replica = self.info.get("replica")
+        if replica is None or self._flushing or isinstance(clause, UpdateBase):
+            return super().get_bind(mapper, clause=clause, **kw)
+        return replica.sync_engine
 
-engine = create_engine(settings.database_url, pool_pre_ping=True)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+ReadSessionLocal = async_sessionmaker(
+    engine, sync_session_class=RoutingSession, expire_on_commit=False, autoflush=False,
+)
 
-def get_db():
-    """FastAPI dependency that yields a DB session and closes it after use."""
-    db = SessionLocal()
+# user id -> monotonic time until which this worker reads their data from the primary
+_recent_writes: dict = {}
+
+
+def _write_key(user_id: int) -> str:
+    return f"recent-write:{user_id}"
+
+
+async def mark_write(*user_ids: int):
+    """
+    Read-your-writes: after committing a write, send the users' reads to the
+    primary for DB_READ_YOUR_WRITES (in every worker and replica, through Redis).
+    """
+    if not replicas.engines or not user_ids:
+        return
+    window = settings.DB_READ_YOUR_WRITES_SECONDS
+    until = time.monotonic() + window
+    for user_id in user_ids:
+        _recent_writes[user_id] = until
+    if len(_recent_writes) > 10000:
+        now = time.monotonic()
+        for user_id in [u for u, deadline in _recent_writes.items() if deadline <= now]:
+            del _recent_writes[user_id]
+    client = redis_client()
+    if client is not None:
+        try:
+            async with client.pipeline(transaction=False) as pipe:
+                for user_id in user_ids:
+                    pipe.set(_write_key(user_id), b"1", px=int(window * 1000))
+                await pipe.execute()
+        except RedisError as e:
+            logger.warning("Could not record write for read-your-writes: %s", e)
+
+
+async def wrote_recently(user_id: int) -> bool:
+    if _recent_writes.get(user_id, 0) > time.monotonic():
+        return True
+    client = redis_client()
+    if client is None:
+        return False
     try:
+        return bool(await client.exists(_write_key(user_id)))
+    except RedisError:
+        # Can't tell whether another worker just wrote for this user
+        return True
+
+
+async def run_replica_monitor():
+    """Measure replica lag every DB_REPLICA_LAG_CHECK_INTERVAL until cancelled (no-op without replicas)."""
+    if not replicas.engines:
+        return
+    interval = settings.DB_REPLICA_LAG_CHECK_INTERVAL_SECONDS
+    while True:
+        await replicas.measure(timeout=interval)
+        await asyncio.sleep(interval)
+
+
+async def dispose_engines():
+    """Release the pooled connections of the primary and the replicas."""
+    await engine.dispose()
+    for replica in replicas.engines.values():
+        await replica.dispose()
+
+
+# Alembic revision this code expects (tests/test_migrations.py checks it is the head)
+SCHEMA_VERSION = "0007"
+
+
+async def check_schema_version(engine):
+    """Fail fast unless the migrations step brought the database to SCHEMA_VERSION."""
+    async with engine.connect() as conn:
+        try:
+            current = (await conn.execute(text("SELECT version_num FROM alembic_version"))).scalar()
+        except DBAPIError:
+            current = None
+    if current != SCHEMA_VERSION:
+        raise RuntimeError(f"Database schema is at {current}, expected {SCHEMA_VERSION}: run `alembic upgrade head`")
+
+
+async def get_db():
+    """FastAPI dependency that yields an async DB session and closes it after use."""
+    async with SessionLocal() as db:
         yield db
-    finally:
-        db.close()
+
+
+async def get_read_db(user: dict = Depends(get_current_user)):
+    """
+    Session for read-only endpoints: a replica within the lag threshold, or
+    the primary when there is none or ``user`` wrote recently.
+    """
+    async with ReadSessionLocal() as db:
+        if replicas.engines and not await wrote_recently(user["id"]):
+            db.info["replica"] = replicas.pick()
+        yield db
+
+
+def session_like(db: AsyncSession) -> AsyncSession:
+    """
+    A new session on ``db``'s bind, with its replica choice, for work that
+    may outlive the request owning ``db`` (a cache load other requests share).
+    """
+    return AsyncSession(
+        bind=db.bind, sync_session_class=type(db.sync_session), info=dict(db.info),
+        expire_on_commit=False, autoflush=False,
+    )
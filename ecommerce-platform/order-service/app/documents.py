@@ -0,0 +1,72 @@
+# ============================================================
+# Order Service – Response Documents
+# Builds OrderResponse JSON documents straight from row tuples
+# for the read paths: no ORM identity map, no Pydantic
+# validation, encoded once by orjson.
+# ============================================================
+from collections import defaultdict
+from datetime import datetime
+
+import orjson
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models import ArchivedOrder, Order, OrderItem
+
+# Column order is the field order of OrderResponse / OrderItemResponse
+ORDER_COLUMNS = (
+    Order.id, Order.user_id, Order.status, Order.total_cents, Order.currency,
+    Order.notes, Order.created_at, Order.updated_at,
+)
+ITEM_COLUMNS = (OrderItem.order_id, OrderItem.id, OrderItem.product_id, OrderItem.quantity, OrderItem.price_cents)
+ARCHIVE_COLUMNS = (ArchivedOrder.document,)
+
+
+def amount(cents: int) -> float:
+    # Same float as float(from_minor(cents)): both round the exact value once
+    return cents / 100
+
+
+def assemble(order_rows, item_rows) -> list:
+    """Order documents for ``order_rows`` (ORDER_COLUMNS) with their ``item_rows`` (ITEM_COLUMNS)."""
+    items = defaultdict(list)
+    for order_id, item_id, product_id, quantity, price_cents in item_rows:
+        items[order_id].append({
+            "id": item_id, "product_id": product_id, "quantity": quantity,
+            "price_cents": price_cents, "price": amount(price_cents),
+        })
+    return [
+        {
+            "id": order_id, "user_id": user_id, "status": status, "total_cents": total_cents,
+            "currency": currency, "notes": notes, "created_at": created_at, "updated_at": updated_at,
+            "items": items[order_id], "total": amount(total_cents),
+        }
+        for order_id, user_id, status, total_cents, currency, notes, created_at, updated_at in order_rows
+    ]
+
+
+async def load_orders(db: AsyncSession, query) -> list:
+    """Run ``query`` (a select of ORDER_COLUMNS) and load the items of all its orders in one more query."""
+    order_rows = (await db.execute(query)).all()
+    if not order_rows:
+        return []
+    # Bounding created_at limits the scan to the partitions of these orders
+    created = [row[6] for row in order_rows]
+    item_rows = await db.execute(
+        select(*ITEM_COLUMNS)
+        .where(
+            OrderItem.order_id.in_([row[0] for row in order_rows]),
+            OrderItem.created_at.between(min(created), max(created)),
+        )
+        .order_by(OrderItem.id)
+    )
+    return assemble(order_rows, item_rows)
+
+
+async def load_archived(db: AsyncSession, query) -> list:
+    """Run ``query`` (a select of ARCHIVE_COLUMNS) and decode the archived order documents."""
+    orders = [orjson.loads(document) for document, in (await db.execute(query)).all()]
+    for order in orders:
+        # Back to a datetime, as in live documents (for cursors)
+        order["created_at"] = datetime.fromisoformat(order["created_at"])
+    return orders
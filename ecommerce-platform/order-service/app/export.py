@@ -0,0 +1,69 @@
+# ============================================================
+# Order Service – Streaming Exports
+# Streams query rows as NDJSON or CSV from a server-side
+# cursor, one yield_per partition at a time, so memory stays
+# flat however many rows an account has.
+# ============================================================
+import csv
+import io
+from datetime import datetime
+
+import orjson
+from fastapi.responses import StreamingResponse
+
+from app.config import settings
+from app.database import SessionLocal
+
+MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+
+def _csv_value(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def _encode(fmt: str, keys: list, rows) -> bytes:
+    if fmt == "ndjson":
+        return b"".join(orjson.dumps(dict(zip(keys, row))) + b"\n" for row in rows)
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows([_csv_value(value) for value in row] for row in rows)
+    return buffer.getvalue().encode()
+
+
+def export_response(query, fmt: str, filename: str, archived=None, keep=None, after=None) -> StreamingResponse:
+    """
+    Stream the rows of a column-level ``query`` (one object or CSV line per row).
+    The body runs in its own session: request-scoped sessions are closed
+    before a streaming body starts.
+
+    ``archived`` (a query of archived documents in the same order) is streamed
+    first, as the columns of ``query``, skipping documents ``keep`` rejects.
+    ``after(created_at, id)`` then narrows ``query`` to the rows past the last
+    archived one, as archived rows stay in the live table until their
+    partition is dropped.
+    """
+    keys = [column.key for column in query.selected_columns]
+
+    async def body():
+        async with SessionLocal() as db:
+            if fmt == "csv":
+                yield _encode(fmt, keys, [keys])
+            live = query
+            if archived is not None:
+                last = None
+                result = await db.stream(archived.execution_options(yield_per=settings.EXPORT_YIELD_PER))
+                async for rows in result.partitions():
+                    documents = [orjson.loads(document) for document, in rows]
+                    last = documents[-1]
+                    kept = [document for document in documents if keep is None or keep(document)]
+                    yield _encode(fmt, keys, [[document[key] for key in keys] for document in kept])
+                if last is not None:
+                    live = after(datetime.fromisoformat(last["created_at"]), last["id"])
+            result = await db.stream(live.execution_options(yield_per=settings.EXPORT_YIELD_PER))
+            async for rows in result.partitions():
+                yield _encode(fmt, keys, rows)
+
+    return StreamingResponse(
+        body(),
+        media_type=MEDIA_TYPES[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{filename}.{fmt}"'},
+    )
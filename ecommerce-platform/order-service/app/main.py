@@ -2,26 +2,66 @@
 # Order Service – FastAPI Application Entry Point
 # Sets up the app, lifespan events, health checks, and routes.
 # ============================================================
+import asyncio
+import logging
 from contextlib import asynccontextmanager
-from fastapi import FastAPI
+from fastapi import Depends, FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.database import engine
-from app.models import Base
+from app.database import check_schema_version, dispose_engines, engine, get_db, replicas, run_replica_monitor
 from app.routes import router as order_router
-from app.messaging import connect_rabbitmq, close_rabbitmq
+from app.cache import cache_stats, connect_redis, close_redis
+from app.log import RequestIdMiddleware, configure_logging, shutdown_logging
+from app.metrics import MetricsMiddleware, metrics_response
+from app.ratelimit import RateLimitMiddleware, limiter_stats
+from app.tracing import TracingMiddleware, configure_tracing, shutdown_tracing
+from app.messaging import connect_rabbitmq, close_rabbitmq, consumer_stats, publisher_stats
+from app.consumer import start_consumers
+from app.outbox import run_outbox_relay
+from app.idempotency import run_purger
+from app.partitions import run_partition_maintenance
+from app.payment_client import breaker as payment_breaker, open_payment_client, close_payment_client
+
+logger = logging.getLogger(__name__)
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Startup and shutdown events for the application."""
-    # Startup: create tables and connect to RabbitMQ
-    Base.metadata.create_all(bind=engine)
-    print("✅ Orders database tables ready")
+    configure_logging()
+    configure_tracing()
+    # Startup: check the schema (migrations run as a separate step) and connect to RabbitMQ
+    await check_schema_version(engine)
+    logger.info("Orders database schema up to date")
+    await connect_redis()
     await connect_rabbitmq()
+    await start_consumers()
+    await open_payment_client()
+    background = [
+        asyncio.create_task(run_outbox_relay()),
+        asyncio.create_task(run_purger()),
+        asyncio.create_task(run_replica_monitor()),
+        asyncio.create_task(run_partition_maintenance()),
+    ]
     yield
-    # Shutdown: close RabbitMQ connection
+    # Shutdown: stop the outbox relay, idempotency purger, replica monitor and
+    # partition maintenance, close RabbitMQ/payment-service connections and
+    # release pooled DB connections
+    for task in background:
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+    await close_payment_client()
     await close_rabbitmq()
+    await close_redis()
+    await dispose_engines()
+    shutdown_tracing()
+    shutdown_logging()
 
 
 app = FastAPI(
@@ -29,6 +69,7 @@ app = FastAPI(
     description="Manages customer orders for the e-commerce platform",
     version="1.0.0",
     lifespan=lifespan,
+    default_response_class=ORJSONResponse,
 )
 
 # CORS middleware for frontend access
@@ -39,6 +80,13 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Innermost of ours, so refused requests are still counted, logged and traced
+app.add_middleware(RateLimitMiddleware)
+app.add_middleware(MetricsMiddleware)
+app.add_middleware(RequestIdMiddleware)
+# Outermost, so the request span is current for everything below it (and the
+# access line logged by RequestIdMiddleware carries the trace id)
+app.add_middleware(TracingMiddleware)
 
 
 @app.get("/health")
@@ -47,15 +95,26 @@ async def health_check():
     return {"status": "healthy", "service": "order-service"}
 
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus scrape endpoint."""
+    return metrics_response()
+
+
 @app.get("/ready")
-async def readiness_check():
-    """Readiness probe – checks DB connectivity."""
+async def readiness_check(db: AsyncSession = Depends(get_db)):
+    """Readiness probe – checks DB connectivity and reports payment circuit and publisher state."""
     try:
-        from app.database import SessionLocal
-        db = SessionLocal()
-        db.execute("SELECT 1")
-        db.close()
-        return {"status": "ready"}
+        await db.execute(text("SELECT 1"))
+        return {
+            "status": "ready",
+            "payment_circuit": payment_breaker.snapshot(),
+            "publisher": publisher_stats(),
+            "consumers": consumer_stats(),
+            "cache": cache_stats(),
+            "replica_lag_seconds": replicas.stats(),
+            "admission": limiter_stats(),
+        }
     except Exception as e:
         return {"status": "not ready", "error": str(e)}
 
@@ -1,46 +1,460 @@
 # ============================================================
 # Order Service – RabbitMQ Messaging
-# Publishes order events (created, updated, cancelled).
+# Publishes order events (created, updated, cancelled) through
+# a batched, confirm-mode publisher with a bounded queue, and
+# consumes payment events in short batching windows.
 # ============================================================
-import json
+import asyncio
+import logging
+import time
+from typing import Optional
+
 import aio_pika
+import orjson
 from app.config import settings
+from app import tracing
+from app.metrics import PUBLISH_FAILURES, PUBLISH_LATENCY
+
+logger = logging.getLogger(__name__)
 
 _connection = None
 _channel = None
+_publisher = None
+_consumers: list = []
 EXCHANGE = "ecommerce_events"
+DEAD_LETTER_EXCHANGE = "ecommerce_events.dlx"
 
 
-async def connect_rabbitmq():
-    """Establish connection to RabbitMQ and declare exchange."""
-    global _connection, _channel
-    try:
-        _connection = await aio_pika.connect_robust(settings.RABBITMQ_URL)
-        _channel = await _connection.channel()
-        await _channel.declare_exchange(EXCHANGE, aio_pika.ExchangeType.TOPIC, durable=True)
-        print("✅ Connected to RabbitMQ")
-    except Exception as e:
-        print(f"⚠️  RabbitMQ connection failed: {e}")
+class BatchPublisher:
+    """
+    Pipelines publishes to one cached exchange on a confirm-mode channel.
 
+    Callers enqueue onto a bounded asyncio.Queue (a full queue blocks them,
+    giving backpressure) and wait for the broker confirm. A single worker
+    task takes up to ``batch_size`` messages at a time (waiting at most
+    ``linger`` seconds to fill a batch), publishes them concurrently so their
+    confirms arrive together, and retries failed messages with backoff.
+    Callers give up waiting after ``publish_timeout`` seconds.
+    """
 
-async def publish_message(routing_key: str, data: dict):
-    """Publish a JSON message to the topic exchange."""
-    if not _channel:
-        print("⚠️  RabbitMQ channel not ready, skipping publish")
-        return
-    try:
-        exchange = await _channel.get_exchange(EXCHANGE)
+    def __init__(self, exchange, max_queue: int, batch_size: int, linger: float,
+                 max_retries: int, confirm_timeout: float, publish_timeout: float):
+        self._exchange = exchange
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self._batch_size = batch_size
+        self._linger = linger
+        self._max_retries = max_retries
+        self._confirm_timeout = confirm_timeout
+        self._publish_timeout = publish_timeout
+        self._task: Optional[asyncio.Task] = None
+        self.published = 0
+        self.failed = 0
+        self.retried = 0
+        self.timed_out = 0
+        self.last_confirm_ms = 0.0
+        self._confirm_ms_total = 0.0
+        self._batches = 0
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self, timeout: float = 5.0):
+        """Flush queued messages (up to ``timeout`` seconds), then stop the worker."""
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Publisher stopped with unsent messages", extra={"unsent": self._queue.qsize()})
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    async def publish(self, routing_key: str, body: bytes, headers: Optional[dict] = None) -> bool:
+        """
+        Enqueue a message and wait until the broker confirms it (True) or it is
+        given up or not confirmed within ``publish_timeout`` (False; it may still
+        be sent later).
+        """
+        start = time.perf_counter()
+        future = asyncio.get_running_loop().create_future()
+        try:
+            await asyncio.wait_for(self._queue.put((routing_key, body, headers, future)), self._publish_timeout)
+            confirmed = await asyncio.wait_for(future, self._publish_timeout - (time.perf_counter() - start))
+        except asyncio.TimeoutError:
+            self.timed_out += 1
+            logger.warning("Publish not confirmed within %.1fs", self._publish_timeout, extra={"routing_key": routing_key})
+            return False
+        if confirmed:
+            PUBLISH_LATENCY.observe(time.perf_counter() - start)
+        return confirmed
+
+    def stats(self) -> dict:
+        return {
+            "queue_depth": self._queue.qsize(),
+            "published": self.published,
+            "failed": self.failed,
+            "retried": self.retried,
+            "timed_out": self.timed_out,
+            "confirm_latency_ms": {
+                "last": round(self.last_confirm_ms, 3),
+                "avg": round(self._confirm_ms_total / self._batches, 3) if self._batches else 0.0,
+            },
+        }
+
+    async def _next_batch(self) -> list:
+        batch = [await self._queue.get()]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self._linger
+        while len(batch) < self._batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+                continue
+            except asyncio.QueueEmpty:
+                pass
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _publish_one(self, routing_key: str, body: bytes, headers: Optional[dict]):
+        # Building the message inside the coroutine puts a bad header value in
+        # this message's result instead of failing the whole batch
         message = aio_pika.Message(
-            body=json.dumps(data).encode(),
+            body=body,
+            content_type="application/json",
             delivery_mode=aio_pika.DeliveryMode.PERSISTENT,
+            headers=headers,
+        )
+        await self._exchange.publish(message, routing_key=routing_key, timeout=self._confirm_timeout)
+
+    async def _publish_batch(self, batch: list):
+        pending = batch
+        for attempt in range(self._max_retries + 1):
+            start = time.perf_counter()
+            results = await asyncio.gather(
+                *(self._publish_one(routing_key, body, headers) for routing_key, body, headers, _ in pending),
+                return_exceptions=True,
+            )
+            self.last_confirm_ms = (time.perf_counter() - start) * 1000
+            self._confirm_ms_total += self.last_confirm_ms
+            self._batches += 1
+
+            failed = []
+            for item, result in zip(pending, results):
+                if isinstance(result, BaseException):
+                    failed.append(item)
+                else:
+                    self.published += 1
+                    _resolve(item[3], True)
+            if not failed:
+                return
+            if attempt < self._max_retries:
+                self.retried += len(failed)
+                await asyncio.sleep(0.1 * 2 ** attempt)
+            pending = failed
+
+        logger.error("Failed to publish %d message(s) after %d retries", len(pending), self._max_retries)
+        self.failed += len(pending)
+        PUBLISH_FAILURES.inc(len(pending))
+        for *_, future in pending:
+            _resolve(future, False)
+
+    async def _run(self):
+        while True:
+            batch = await self._next_batch()
+            try:
+                await self._publish_batch(batch)
+            except Exception as e:
+                # Keep the worker alive; callers of this batch get False
+                logger.exception("Batch of %d not published: %s", len(batch), e)
+                unresolved = [future for *_, future in batch if not future.done()]
+                self.failed += len(unresolved)
+                PUBLISH_FAILURES.inc(len(unresolved))
+                for future in unresolved:
+                    _resolve(future, False)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+
+class BatchConsumer:
+    """
+    Durable named-queue consumer that hands messages to ``handler`` in batches.
+
+    Deliveries are buffered until ``batch_size`` messages arrived or
+    ``window`` seconds passed since the first one. Each body is decoded with
+    ``decode`` (a ValueError or TypeError marks a poison message, dead-lettered on
+    its own); the rest of the batch goes to ``handler`` in one call and is
+    acked when it returns. A failing batch is retried up to ``max_attempts``
+    times, then its events are handled one at a time so only the ones that
+    still fail are dead-lettered. ``prefetch_count`` should be at least
+    ``batch_size`` so a full batch can be in flight.
+    """
+
+    def __init__(self, queue_name: str, routing_keys: list, decode, handler, prefetch_count: int,
+                 batch_size: int, window: float, max_attempts: int):
+        self.queue_name = queue_name
+        self.routing_keys = routing_keys
+        self._decode = decode
+        self._handler = handler
+        self._prefetch_count = prefetch_count
+        self._batch_size = batch_size
+        self._window = window
+        self._max_attempts = max_attempts
+        self._buffer: asyncio.Queue = asyncio.Queue()
+        self._task: Optional[asyncio.Task] = None
+        self._queue = None
+        self._consumer_tag = None
+        self.processed = 0
+        self.dead_lettered = 0
+        self.batches = 0
+
+    async def start(self, connection):
+        channel = await connection.channel()
+        await channel.set_qos(prefetch_count=self._prefetch_count)
+        exchange = await channel.declare_exchange(EXCHANGE, aio_pika.ExchangeType.TOPIC, durable=True)
+
+        # Dead-letter queue for messages that can't be processed
+        dlx = await channel.declare_exchange(DEAD_LETTER_EXCHANGE, aio_pika.ExchangeType.DIRECT, durable=True)
+        dlq = await channel.declare_queue(f"{self.queue_name}.dlq", durable=True)
+        await dlq.bind(dlx, routing_key=self.queue_name)
+
+        self._queue = await channel.declare_queue(
+            self.queue_name,
+            durable=True,
+            arguments={
+                "x-dead-letter-exchange": DEAD_LETTER_EXCHANGE,
+                "x-dead-letter-routing-key": self.queue_name,
+            },
+        )
+        for routing_key in self.routing_keys:
+            await self._queue.bind(exchange, routing_key=routing_key)
+        self._task = asyncio.create_task(self._run())
+        self._consumer_tag = await self._queue.consume(self._buffer.put)
+        logger.info(
+            "Consuming %s from %s in batches of %d", self.routing_keys, self.queue_name, self._batch_size,
+            extra={"queue": self.queue_name},
         )
-        await exchange.publish(message, routing_key=routing_key)
-        print(f"📤 Published [{routing_key}]: {data}")
+
+    async def stop(self, timeout: float = 10.0):
+        """Stop receiving, process what is buffered, then stop the batching task."""
+        if self._queue and self._consumer_tag:
+            await self._queue.cancel(self._consumer_tag)
+        try:
+            await asyncio.wait_for(self._buffer.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(
+                "Unacked messages left for redelivery", extra={"queue": self.queue_name, "unacked": self._buffer.qsize()},
+            )
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    def stats(self) -> dict:
+        return {
+            "running": self._task is not None and not self._task.done(),
+            "buffered": self._buffer.qsize(),
+            "processed": self.processed,
+            "dead_lettered": self.dead_lettered,
+            "batches": self.batches,
+        }
+
+    async def _next_batch(self) -> list:
+        batch = [await self._buffer.get()]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self._window
+        while len(batch) < self._batch_size:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._buffer.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = await self._next_batch()
+            try:
+                await self.process(batch)
+            except Exception as e:
+                # Keep consuming; unsettled messages go to the DLQ rather than
+                # holding prefetch slots (or are redelivered if the channel is gone)
+                logger.exception("Batch of %d not processed: %s", len(batch), e, extra={"queue": self.queue_name})
+                await self._dead_letter_unsettled(batch)
+            finally:
+                for _ in batch:
+                    self._buffer.task_done()
+
+    async def _dead_letter_unsettled(self, messages: list):
+        for message in messages:
+            if message.processed:
+                continue
+            self.dead_lettered += 1
+            try:
+                await message.reject(requeue=False)
+            except Exception as e:
+                logger.warning("Could not dead-letter message: %s", e, extra={"queue": self.queue_name})
+
+    async def process(self, messages: list):
+        events, accepted = [], []
+        for message in messages:
+            try:
+                events.append(self._decode(orjson.loads(message.body)))
+                accepted.append(message)
+            except (ValueError, TypeError) as e:
+                logger.warning("Poison message dead-lettered: %s", e, extra={"queue": self.queue_name})
+                self.dead_lettered += 1
+                await message.reject(requeue=False)
+        if not accepted:
+            return
+
+        # One span per batch, linked to the span that published each message
+        links = [link for link in (tracing.link(message.headers) for message in accepted) if link]
+        with tracing.span(
+            f"{self.queue_name} process", tracing.SpanKind.CONSUMER, links=links,
+            attributes={"messaging.system": "rabbitmq", "messaging.source": self.queue_name,
+                        "messaging.batch.message_count": len(accepted)},
+        ) as current:
+            await self._handle(accepted, events, current)
+
+    async def _handle(self, accepted: list, events: list, current):
+        for attempt in range(1, self._max_attempts + 1):
+            try:
+                await self._handler(events)
+            except Exception as e:
+                if attempt < self._max_attempts:
+                    await asyncio.sleep(0.1 * 2 ** attempt)
+                    continue
+                if len(accepted) > 1:
+                    logger.warning(
+                        "Batch of %d failed %d times, handling its events one at a time: %s", len(accepted), attempt, e,
+                        extra={"queue": self.queue_name},
+                    )
+                    await self._handle_one_by_one(accepted, events, current)
+                    return
+                logger.error("Event dead-lettered after %d attempts: %s", attempt, e, extra={"queue": self.queue_name})
+                tracing.record_error(current, e)
+                self.dead_lettered += 1
+                await accepted[0].reject(requeue=False)
+                return
+            for message in accepted:
+                await message.ack()
+            self.batches += 1
+            self.processed += len(accepted)
+            return
+
+    async def _handle_one_by_one(self, accepted: list, events: list, current):
+        """Isolate the events that fail a batch: the others are acked, only those are dead-lettered."""
+        for message, event in zip(accepted, events):
+            try:
+                await self._handler([event])
+            except Exception as e:
+                logger.error("Event dead-lettered: %s", e, extra={"queue": self.queue_name})
+                tracing.record_error(current, e)
+                self.dead_lettered += 1
+                await message.reject(requeue=False)
+                continue
+            await message.ack()
+            self.processed += 1
+
+
+def _resolve(future: asyncio.Future, value: bool):
+    # The caller may have been cancelled while waiting for its confirm
+    if not future.done():
+        future.set_result(value)
+
+
+async def connect_rabbitmq():
+    """Establish connection to RabbitMQ, declare the exchange and start the publisher."""
+    global _connection, _channel, _publisher
+    try:
+        _connection = await aio_pika.connect_robust(settings.RABBITMQ_URL)
+        _channel = await _connection.channel(publisher_confirms=True)
+        exchange = await _channel.declare_exchange(EXCHANGE, aio_pika.ExchangeType.TOPIC, durable=True)
+        _publisher = BatchPublisher(
+            exchange,
+            max_queue=settings.PUBLISH_QUEUE_SIZE,
+            batch_size=settings.PUBLISH_BATCH_SIZE,
+            linger=settings.PUBLISH_LINGER_MS / 1000,
+            max_retries=settings.PUBLISH_MAX_RETRIES,
+            confirm_timeout=settings.PUBLISH_CONFIRM_TIMEOUT_SECONDS,
+            publish_timeout=settings.PUBLISH_TIMEOUT_SECONDS,
+        )
+        _publisher.start()
+        logger.info("Connected to RabbitMQ")
     except Exception as e:
-        print(f"Failed to publish: {e}")
+        logger.warning("RabbitMQ connection failed: %s", e)
+
+
+async def publish_message(routing_key: str, data: dict, trace_context: Optional[dict] = None) -> bool:
+    """
+    Publish a JSON message to the topic exchange. Returns True once the broker confirms it.
+    The message carries the trace context in its headers; ``trace_context``
+    (an outbox row's) is its parent instead of the current span.
+    """
+    if not _publisher:
+        logger.warning("RabbitMQ channel not ready, skipping publish", extra={"routing_key": routing_key})
+        return False
+    body = orjson.dumps(data)
+    with tracing.span(
+        f"{routing_key} publish", tracing.SpanKind.PRODUCER, context=tracing.extract(trace_context),
+        attributes={"messaging.system": "rabbitmq", "messaging.destination": EXCHANGE, "messaging.rabbitmq.routing_key": routing_key},
+    ) as current:
+        confirmed = await _publisher.publish(routing_key, body, tracing.inject() or None)
+        if not confirmed:
+            current.set_status(tracing.Status(tracing.StatusCode.ERROR, "not confirmed"))
+    # One record per message: sampled by LOG_DEBUG_SAMPLE_EVERY when DEBUG is on
+    logger.debug("Published", extra={"routing_key": routing_key, "bytes": len(body), "confirmed": confirmed})
+    return confirmed
+
+
+def publisher_stats() -> Optional[dict]:
+    """Queue depth, counters and confirm latency of the publisher (None if not connected)."""
+    return _publisher.stats() if _publisher else None
+
+
+async def start_batch_consumer(queue_name: str, routing_keys: list, decode, handler,
+                               batch_size: int, window: float):
+    """Start a BatchConsumer with the configured prefetch and retry policy."""
+    if not _connection:
+        logger.warning("RabbitMQ not connected, consumer not started", extra={"queue": queue_name})
+        return None
+    consumer = BatchConsumer(
+        queue_name,
+        routing_keys,
+        decode,
+        handler,
+        prefetch_count=settings.CONSUMER_PREFETCH_COUNT,
+        batch_size=batch_size,
+        window=window,
+        max_attempts=settings.CONSUMER_MAX_ATTEMPTS,
+    )
+    await consumer.start(_connection)
+    _consumers.append(consumer)
+    return consumer
+
+
+def consumer_stats() -> dict:
+    return {consumer.queue_name: consumer.stats() for consumer in _consumers}
 
 
 async def close_rabbitmq():
-    """Close RabbitMQ connection gracefully."""
+    """Drain consumers, flush pending publishes and close RabbitMQ connection gracefully."""
+    for consumer in _consumers:
+        await consumer.stop()
+    _consumers.clear()
+    if _publisher:
+        await _publisher.stop()
     if _connection:
         await _connection.close()
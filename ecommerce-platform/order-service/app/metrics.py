@@ -0,0 +1,164 @@
+# ============================================================
+# Order Service – Prometheus Metrics
+# Request latency per route template, DB query timings from
+# SQLAlchemy engine events, pool gauges read at scrape time,
+# RabbitMQ publish and payment-service call instrumentation.
+# ============================================================
+import os
+import time
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest,
+)
+from prometheus_client import multiprocess
+from prometheus_client.core import GaugeMetricFamily
+from sqlalchemy import event, exc
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from starlette.responses import Response
+
+FAST_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+HTTP_REQUESTS = Counter(
+    "http_requests", "HTTP requests handled", ["method", "route", "status"],
+)
+HTTP_LATENCY = Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route template", ["method", "route"],
+    buckets=FAST_BUCKETS,
+)
+DB_QUERY_LATENCY = Histogram(
+    "db_query_duration_seconds", "Duration of SQL statements by verb", ["operation"],
+    buckets=FAST_BUCKETS,
+)
+DB_QUERY_ERRORS = Counter(
+    "db_query_errors", "SQL statements that raised", ["operation"],
+)
+PUBLISH_LATENCY = Histogram(
+    "rabbitmq_publish_duration_seconds", "Time from enqueueing a message to its broker confirm",
+    buckets=FAST_BUCKETS,
+)
+PUBLISH_FAILURES = Counter(
+    "rabbitmq_publish_failures", "Messages given up after all publish retries",
+)
+PAYMENT_CALL_LATENCY = Histogram(
+    "payment_http_request_duration_seconds", "Latency of calls to payment-service", ["outcome"],
+    buckets=FAST_BUCKETS,
+)
+POOL_WAIT = Histogram(
+    "db_pool_checkout_wait_seconds", "Time to get a pooled connection, including opening a new one",
+    buckets=FAST_BUCKETS,
+)
+POOL_TIMEOUTS = Counter(
+    "db_pool_checkout_timeouts", "Checkouts that gave up after DB_POOL_TIMEOUT_SECONDS",
+)
+# Set by every worker's partition maintenance pass; alert well before it reaches 0
+PARTITION_HORIZON = Gauge(
+    "db_partition_horizon_days", "Days until the newest monthly partition of a table ends", ["table"],
+    multiprocess_mode="livemin",
+)
+
+
+def _operation(statement: str) -> str:
+    return statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "UNKNOWN"
+
+
+def instrument_engine(engine, name: str = "primary"):
+    """Time every statement on ``engine`` and expose its pool state under ``name``."""
+    sync_engine = engine.sync_engine
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        DB_QUERY_LATENCY.labels(_operation(statement)).observe(time.perf_counter() - conn.info["query_start"].pop())
+
+    @event.listens_for(sync_engine, "handle_error")
+    def _error(context):
+        starts = context.connection.info.get("query_start") if context.connection is not None else None
+        if starts:
+            starts.pop()
+        DB_QUERY_ERRORS.labels(_operation(context.statement or "")).inc()
+
+    _pool_collector.pools[name] = sync_engine.pool
+
+
+class PoolCollector:
+    """Reads connection-pool counters of every instrumented engine only when Prometheus scrapes."""
+
+    def __init__(self):
+        self.pools: dict = {}
+
+    def collect(self):
+        for metric, doc, attr in (
+            ("db_pool_checked_out", "Connections currently checked out", "checkedout"),
+            ("db_pool_overflow", "Connections open beyond pool_size", "overflow"),
+            ("db_pool_size", "Configured pool size", "size"),
+        ):
+            family = GaugeMetricFamily(metric, doc, labels=["engine"])
+            for name, pool in self.pools.items():
+                if hasattr(pool, attr):
+                    # QueuePool counts overflow from -pool_size while the pool is not full
+                    family.add_metric([name], max(0, getattr(pool, attr)()))
+            yield family
+
+
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    """Queue pool that records how long each checkout waited for a connection."""
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            POOL_TIMEOUTS.inc()
+            raise
+        finally:
+            POOL_WAIT.observe(time.perf_counter() - start)
+
+
+_pool_collector = PoolCollector()
+REGISTRY.register(_pool_collector)
+
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware recording latency and status per route template
+    (``/api/orders/{order_id}``, not the raw path, to bound label cardinality).
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status_code = 500
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = scope.get("route")
+            template = getattr(route, "path", "unmatched")
+            HTTP_LATENCY.labels(scope["method"], template).observe(time.perf_counter() - start)
+            HTTP_REQUESTS.labels(scope["method"], template, str(status_code)).inc()
+
+
+def metrics_response() -> Response:
+    registry = REGISTRY
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        # Under gunicorn, sum the samples every worker wrote; pool gauges
+        # are those of the worker answering the scrape
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        registry.register(_pool_collector)
+    return Response(generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
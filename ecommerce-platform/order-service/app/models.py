@@ -1,8 +1,12 @@
 # ============================================================
 # Order Service – Database Models
-# SQLAlchemy ORM models for orders and order items.
+# SQLAlchemy ORM models for orders, order items, archived
+# orders, the per-user order rollup, the transactional outbox
+# of order events and idempotency keys.
 # ============================================================
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Text
+from sqlalchemy import (
+    JSON, BigInteger, Column, Date, Integer, String, DateTime, ForeignKey, Index, LargeBinary, Text, event,
+)
 from sqlalchemy.orm import relationship, declarative_base
 from datetime import datetime
 
@@ -10,28 +14,118 @@ Base = declarative_base()
 
 
 class Order(Base):
-    """Represents a customer order."""
+    """
+    Represents a customer order.
+    On Postgres orders and order_items are partitioned by month of
+    created_at (migration 0007, app/partitions.py) with primary keys
+    (id, created_at); ids stay unique through their sequences.
+    """
     __tablename__ = "orders"
 
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, nullable=False, index=True)
-    status = Column(String(50), default="pending")  # pending, paid, shipped, delivered, cancelled
-    total = Column(Float, default=0.0)
+    user_id = Column(Integer, nullable=False)
+    status = Column(String(50), default="pending")  # pending, paid, payment_failed, refunded, shipped, delivered, cancelled
+    # Money is stored in integer minor units (cents) of ``currency``
+    total_cents = Column(BigInteger, nullable=False, default=0)
+    currency = Column(String(3), nullable=False, default="USD", server_default="USD")
     notes = Column(Text, nullable=True)
-    created_at = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)  # partition key
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # Time of the last payment event applied; older (out-of-order) events are ignored
+    payment_status_at = Column(DateTime, nullable=True)
 
     items = relationship("OrderItem", back_populates="order", cascade="all, delete-orphan")
 
+    # Serves the keyset-paginated listing (WHERE user_id = ? ORDER BY created_at DESC, id DESC)
+    # and also covers plain user_id lookups, so no separate user_id index is needed.
+    __table_args__ = (
+        Index("ix_orders_user_id_created_at_id", user_id, created_at.desc(), id.desc()),
+    )
+
 
 class OrderItem(Base):
     """Represents a single item within an order."""
     __tablename__ = "order_items"
 
     id = Column(Integer, primary_key=True, index=True)
-    order_id = Column(Integer, ForeignKey("orders.id"), nullable=False)
+    order_id = Column(Integer, ForeignKey("orders.id"), nullable=False, index=True)
     product_id = Column(Integer, nullable=False)
     quantity = Column(Integer, default=1)
-    price = Column(Float, nullable=False)
+    price_cents = Column(BigInteger, nullable=False)  # in the order's currency
+    # The order's created_at: items live in the partition of their order
+    created_at = Column(DateTime, nullable=False)
 
     order = relationship("Order", back_populates="items")
+
+
+@event.listens_for(OrderItem, "before_insert")
+def _item_created_at(mapper, connection, item):
+    if item.created_at is None:
+        item.created_at = item.order.created_at
+
+
+class ArchivedOrder(Base):
+    """
+    An order moved out of the live tables by the archival job: its order
+    document (items included) encoded once, read by id or per user in the
+    same keyset order as live orders. Archived orders are read-only.
+    """
+    __tablename__ = "orders_archive"
+
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    user_id = Column(Integer, nullable=False)
+    created_at = Column(DateTime, nullable=False)
+    document = Column(LargeBinary, nullable=False)  # orjson-encoded OrderResponse
+
+    __table_args__ = (
+        Index("ix_orders_archive_user_id_created_at_id", user_id, created_at.desc(), id.desc()),
+    )
+
+
+class OutboxEvent(Base):
+    """
+    An order event waiting to be relayed to RabbitMQ.
+    Written in the same transaction as the order change it describes,
+    then published and deleted by the outbox relay.
+    """
+    __tablename__ = "outbox"
+
+    id = Column(Integer, primary_key=True)
+    routing_key = Column(String(100), nullable=False)
+    payload = Column(JSON, nullable=False)
+    # traceparent of the request that staged the event (AMQP headers on relay)
+    trace_context = Column(JSON, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
+class OrderRollup(Base):
+    """
+    Per-user order counts and totals by creation day, status and currency.
+    Kept in step with orders by every write path (see app/rollup.py), so the
+    summary endpoint reads a few rows per active day instead of every order.
+    """
+    __tablename__ = "order_rollups"
+
+    user_id = Column(Integer, primary_key=True)
+    day = Column(Date, primary_key=True)
+    status = Column(String(50), primary_key=True)
+    currency = Column(String(3), primary_key=True)
+    week = Column(Date, nullable=False)  # Monday of the day's ISO week
+    month = Column(Date, nullable=False)  # First day of the day's month
+    order_count = Column(Integer, nullable=False, default=0)
+    total_cents = Column(BigInteger, nullable=False, default=0)
+
+
+class IdempotencyKey(Base):
+    """
+    A request made with an Idempotency-Key header and the response it got.
+    Inserted in the request's own transaction, so the key and the work it
+    guards commit together; purged after IDEMPOTENCY_TTL_SECONDS.
+    """
+    __tablename__ = "idempotency_keys"
+
+    key = Column(String(300), primary_key=True)
+    fingerprint = Column(String(64), nullable=False)  # sha256 of the request body
+    status_code = Column(Integer, nullable=True)
+    response = Column(LargeBinary, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
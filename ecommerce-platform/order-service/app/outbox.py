@@ -0,0 +1,73 @@
+# ============================================================
+# Order Service – Transactional Outbox
+# Order events are stored in the `outbox` table in the same
+# transaction as the order rows, then relayed to RabbitMQ in
+# batches by a background task started from the lifespan.
+# ============================================================
+import asyncio
+import logging
+
+from sqlalchemy import delete, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import tracing
+from app.config import settings
+from app.database import SessionLocal
+from app.messaging import publish_message
+from app.models import OutboxEvent
+
+logger = logging.getLogger(__name__)
+
+
+def enqueue_event(db: AsyncSession, routing_key: str, data: dict):
+    """Stage an event in the caller's transaction; it is published after commit."""
+    db.add(OutboxEvent(routing_key=routing_key, payload=data, trace_context=tracing.inject() or None))
+
+
+async def enqueue_events(db: AsyncSession, routing_key: str, payloads: list):
+    """Stage many events of one kind with a single multi-row INSERT."""
+    if payloads:
+        trace_context = tracing.inject() or None
+        await db.execute(insert(OutboxEvent), [
+            {"routing_key": routing_key, "payload": data, "trace_context": trace_context} for data in payloads
+        ])
+
+
+async def relay_batch(batch_size: int) -> int:
+    """
+    Publish up to ``batch_size`` pending events in insertion order and delete
+    the ones the broker confirmed. Rows are locked with SKIP LOCKED so several
+    replicas can relay concurrently without publishing the same event twice.
+    Returns the number of events published.
+    """
+    async with SessionLocal() as db:
+        result = await db.execute(
+            select(OutboxEvent)
+            .order_by(OutboxEvent.id)
+            .limit(batch_size)
+            .with_for_update(skip_locked=True)
+        )
+        events = result.scalars().all()
+        # Enqueue the whole batch at once so the publisher pipelines it and
+        # collects the broker confirms together; failures stay for the next poll.
+        # Each publish continues the trace of the request that staged it.
+        confirmed = await asyncio.gather(
+            *(publish_message(e.routing_key, e.payload, e.trace_context) for e in events)
+        )
+        published = [event.id for event, ok in zip(events, confirmed) if ok]
+        if published:
+            await db.execute(delete(OutboxEvent).where(OutboxEvent.id.in_(published)))
+        await db.commit()
+        return len(published)
+
+
+async def run_outbox_relay():
+    """Drain the outbox until cancelled; sleeps only when a batch comes back short."""
+    while True:
+        try:
+            published = await relay_batch(settings.OUTBOX_BATCH_SIZE)
+        except Exception as e:
+            logger.warning("Outbox relay failed: %s", e)
+            published = 0
+        if published < settings.OUTBOX_BATCH_SIZE:
+            await asyncio.sleep(settings.OUTBOX_POLL_INTERVAL_SECONDS)
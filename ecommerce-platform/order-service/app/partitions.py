@@ -0,0 +1,249 @@
+# ============================================================
+# Order Service – Partition Maintenance and Archival
+# On Postgres orders and order_items are range-partitioned by
+# month of created_at (migration 0007), with DEFAULT partitions
+# catching rows no month covers. A background task keeps
+# PARTITION_PREMAKE_MONTHS of future partitions in place
+# (moving such rows into them), reports how far ahead they
+# reach, and moves orders older than ARCHIVE_AFTER_MONTHS into
+# orders_archive as encoded documents, then drops their
+# partitions. Elsewhere (SQLite in tests) the archived rows are
+# deleted instead.
+# ============================================================
+import asyncio
+import logging
+import re
+from datetime import datetime
+from typing import Optional
+
+import orjson
+from sqlalchemy import delete, select, text, tuple_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from app import documents
+from app.config import settings
+from app.database import SessionLocal, engine
+from app.metrics import PARTITION_HORIZON
+from app.models import ArchivedOrder, Order, OrderItem
+
+logger = logging.getLogger(__name__)
+
+# Parent tables, referenced ones last (partitions are dropped in this order)
+PARTITIONED = ("order_items", "orders")
+PARTITION_NAME = re.compile(r"^(?P<table>\w+)_y(?P<year>\d{4})m(?P<month>\d{2})$")
+# Less than this left before the newest partition ends is logged as an error
+MIN_HORIZON_DAYS = 31
+
+
+def month_start(moment: datetime, months: int = 0) -> datetime:
+    """First instant of the month ``months`` after (or before) the month of ``moment``."""
+    index = moment.year * 12 + moment.month - 1 + months
+    return datetime(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(table: str, start: datetime) -> str:
+    return f"{table}_y{start.year}m{start.month:02d}"
+
+
+def archive_cutoff(now: Optional[datetime] = None) -> Optional[datetime]:
+    """Orders created before this are archived (None when archival is disabled)."""
+    if settings.ARCHIVE_AFTER_MONTHS <= 0:
+        return None
+    return month_start(now or datetime.utcnow(), -settings.ARCHIVE_AFTER_MONTHS)
+
+
+async def _partitions(conn, table: str) -> list:
+    """Names of the partitions of ``table``."""
+    return (await conn.execute(text(
+        "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = CAST(:parent AS regclass)"
+    ), {"parent": table})).scalars().all()
+
+
+def _month_partitions(table: str, names: list) -> list:
+    """(name, first day) of the monthly partitions among ``names``, oldest first."""
+    months = []
+    for name in names:
+        match = PARTITION_NAME.match(name)
+        if match and match["table"] == table:
+            months.append((name, datetime(int(match["year"]), int(match["month"]), 1)))
+    return sorted(months, key=lambda month: month[1])
+
+
+async def _move_out_of_default(conn, start: datetime, end: datetime):
+    """
+    Create the partitions of [start, end) when their DEFAULT partitions hold
+    rows of that range: a new partition can't be attached over them. The
+    defaults are detached (order_items first, it references orders), the
+    rows moved into the new partitions, and the defaults attached again.
+    """
+    for table in PARTITIONED:
+        await conn.execute(text(f"ALTER TABLE {table} DETACH PARTITION {table}_default"))
+    for table in reversed(PARTITIONED):
+        await conn.execute(text(
+            f"CREATE TABLE {partition_name(table, start)} PARTITION OF {table} "
+            f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+        ))
+        await conn.execute(text(
+            f"WITH moved AS (DELETE FROM {table}_default WHERE created_at >= :start AND created_at < :end "
+            f"RETURNING *) INSERT INTO {table} SELECT * FROM moved"
+        ), {"start": start, "end": end})
+    for table in reversed(PARTITIONED):
+        await conn.execute(text(f"ALTER TABLE {table} ATTACH PARTITION {table}_default DEFAULT"))
+    logger.warning("Moved rows out of the default partitions into %s", partition_name("orders", start))
+
+
+async def ensure_partitions(now: Optional[datetime] = None):
+    """Create the partitions of this month and the next PARTITION_PREMAKE_MONTHS (Postgres only)."""
+    if engine.dialect.name != "postgresql":
+        return
+    now = now or datetime.utcnow()
+    async with engine.begin() as conn:
+        existing = set(await _partitions(conn, "orders"))
+        for offset in range(settings.PARTITION_PREMAKE_MONTHS + 1):
+            start, end = month_start(now, offset), month_start(now, offset + 1)
+            if partition_name("orders", start) in existing:
+                continue
+            stray = await conn.scalar(text(
+                "SELECT EXISTS (SELECT 1 FROM orders_default WHERE created_at >= :start AND created_at < :end)"
+            ), {"start": start, "end": end})
+            if stray:
+                await _move_out_of_default(conn, start, end)
+                continue
+            # orders first: order_items partitions reference it
+            for table in reversed(PARTITIONED):
+                await conn.execute(text(
+                    f"CREATE TABLE IF NOT EXISTS {partition_name(table, start)} PARTITION OF {table} "
+                    f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+                ))
+
+
+async def check_partition_horizon(now: Optional[datetime] = None) -> dict:
+    """
+    Days until the newest monthly partition of each table ends, exported as
+    db_partition_horizon_days; under MIN_HORIZON_DAYS is logged as an error
+    (new rows would then land in the DEFAULT partition). Postgres only.
+    """
+    if engine.dialect.name != "postgresql":
+        return {}
+    now = now or datetime.utcnow()
+    horizon = {}
+    async with engine.connect() as conn:
+        for table in PARTITIONED:
+            months = _month_partitions(table, await _partitions(conn, table))
+            end = month_start(months[-1][1], 1) if months else now
+            horizon[table] = (end - now).total_seconds() / 86400
+            PARTITION_HORIZON.labels(table).set(horizon[table])
+            if horizon[table] < MIN_HORIZON_DAYS:
+                logger.error(
+                    "Partitions of %s end in %.1f days: is partition maintenance running?", table, horizon[table],
+                )
+    return horizon
+
+
+async def archive_batch(cutoff: datetime, batch_size: int) -> int:
+    """
+    Copy the oldest ``batch_size`` orders created before ``cutoff`` (with
+    their items) into orders_archive. On Postgres the rows stay until their
+    partition is dropped, so the copy is keyed on the last archived order;
+    elsewhere they are deleted in the same transaction. Returns the number
+    of orders archived.
+    """
+    postgres = engine.dialect.name == "postgresql"
+    async with SessionLocal() as db:
+        query = (
+            select(*documents.ORDER_COLUMNS)
+            .where(Order.created_at < cutoff)
+            .order_by(Order.created_at, Order.id)
+            .limit(batch_size)
+        )
+        if postgres:
+            last = (await db.execute(
+                select(ArchivedOrder.created_at, ArchivedOrder.id)
+                .where(ArchivedOrder.created_at < cutoff)
+                .order_by(ArchivedOrder.created_at.desc(), ArchivedOrder.id.desc())
+                .limit(1)
+            )).first()
+            if last is not None:
+                query = query.where(tuple_(Order.created_at, Order.id) > tuple_(*last))
+
+        orders = await documents.load_orders(db, query)
+        if not orders:
+            return 0
+        insert = pg_insert if postgres else sqlite_insert
+        await db.execute(insert(ArchivedOrder).values([
+            {"id": o["id"], "user_id": o["user_id"], "created_at": o["created_at"], "document": orjson.dumps(o)}
+            for o in orders
+        ]).on_conflict_do_nothing(index_elements=[ArchivedOrder.id]))
+        if not postgres:
+            archived = [o["id"] for o in orders]
+            await db.execute(delete(OrderItem).where(OrderItem.order_id.in_(archived)))
+            await db.execute(delete(Order).where(Order.id.in_(archived)))
+        await db.commit()
+        return len(orders)
+
+
+async def drop_archived_partitions(cutoff: datetime) -> list:
+    """Drop the partitions that end at or before ``cutoff`` (Postgres only); returns their names."""
+    if engine.dialect.name != "postgresql":
+        return []
+    dropped = []
+    async with engine.begin() as conn:
+        for table in PARTITIONED:
+            for name, start in _month_partitions(table, await _partitions(conn, table)):
+                if month_start(start, 1) > cutoff:
+                    continue
+                # orders partitions are referenced by order_items: detach before dropping
+                await conn.execute(text(f"ALTER TABLE {table} DETACH PARTITION {name}"))
+                await conn.execute(text(f"DROP TABLE {name}"))
+                dropped.append(name)
+    return dropped
+
+
+async def archive_orders(now: Optional[datetime] = None) -> int:
+    """Move every order created before the archive cutoff to orders_archive; returns how many."""
+    cutoff = archive_cutoff(now)
+    if cutoff is None:
+        return 0
+    archived = 0
+    while True:
+        count = await archive_batch(cutoff, settings.ARCHIVE_BATCH_SIZE)
+        archived += count
+        if count < settings.ARCHIVE_BATCH_SIZE:
+            break
+    dropped = await drop_archived_partitions(cutoff)
+    if archived or dropped:
+        logger.info("Archived %d orders created before %s", archived, cutoff.date(), extra={"dropped": dropped})
+    return archived
+
+
+async def maintain_partitions():
+    """
+    One maintenance pass; on Postgres only the worker holding the advisory
+    lock runs it, but every worker reports the partition horizon.
+    """
+    if engine.dialect.name != "postgresql":
+        await archive_orders()
+        return
+    try:
+        async with engine.connect() as conn:
+            if not await conn.scalar(text("SELECT pg_try_advisory_lock(hashtext('orders_partitions'))")):
+                return
+            try:
+                await ensure_partitions()
+                await archive_orders()
+            finally:
+                await conn.execute(text("SELECT pg_advisory_unlock(hashtext('orders_partitions'))"))
+    finally:
+        await check_partition_horizon()
+
+
+async def run_partition_maintenance():
+    """Run maintain_partitions() every PARTITION_MAINTENANCE_INTERVAL_SECONDS until cancelled."""
+    while True:
+        try:
+            await maintain_partitions()
+        except Exception as e:
+            logger.warning("Partition maintenance failed: %s", e)
+        await asyncio.sleep(settings.PARTITION_MAINTENANCE_INTERVAL_SECONDS)
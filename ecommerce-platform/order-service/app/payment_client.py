@@ -0,0 +1,94 @@
+# ============================================================
+# Order Service – Payment Service Client
+# One pooled, keep-alive httpx client shared by all requests,
+# opened and closed from the app lifespan and guarded by a
+# circuit breaker so a struggling payment-service fails fast.
+# ============================================================
+import time
+from typing import Optional
+
+import httpx
+
+from app import tracing
+from app.circuit_breaker import CircuitBreaker
+from app.config import settings
+from app.log import request_id_var
+from app.metrics import PAYMENT_CALL_LATENCY
+from app.schemas import from_minor
+
+_client: Optional[httpx.AsyncClient] = None
+
+breaker = CircuitBreaker(
+    "payment-service",
+    failure_threshold=settings.PAYMENT_CB_FAILURE_THRESHOLD,
+    slow_call_threshold=settings.PAYMENT_CB_SLOW_CALL_SECONDS,
+    reset_timeout=settings.PAYMENT_CB_RESET_TIMEOUT_SECONDS,
+)
+
+
+async def open_payment_client(transport: Optional[httpx.AsyncBaseTransport] = None):
+    """Create the shared client. ``transport`` lets tests plug in a stub server."""
+    global _client
+    _client = httpx.AsyncClient(
+        base_url=settings.PAYMENT_SERVICE_URL,
+        http2=settings.PAYMENT_HTTP2,
+        timeout=httpx.Timeout(settings.PAYMENT_TIMEOUT_SECONDS, connect=settings.PAYMENT_CONNECT_TIMEOUT_SECONDS),
+        limits=httpx.Limits(
+            max_connections=settings.PAYMENT_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.PAYMENT_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=settings.PAYMENT_KEEPALIVE_EXPIRY_SECONDS,
+        ),
+        transport=transport,
+    )
+
+
+async def close_payment_client():
+    """Close the shared client and its pooled connections."""
+    global _client
+    if _client:
+        await _client.aclose()
+        _client = None
+
+
+async def _post_payment(payload: dict, token: str) -> httpx.Response:
+    # Retries of the same order's payment are charged once
+    headers = {"Authorization": f"Bearer {token}", "Idempotency-Key": f"order-{payload['order_id']}"}
+    request_id = request_id_var.get()
+    if request_id:
+        # Ties payment-service's log lines to the request that caused the call
+        headers["X-Request-ID"] = request_id
+    start = time.perf_counter()
+    with tracing.span(
+        "POST /api/payments/", tracing.SpanKind.CLIENT,
+        attributes={"http.method": "POST", "http.url": f"{settings.PAYMENT_SERVICE_URL}/api/payments/"},
+    ) as current:
+        # payment-service's spans join this trace through the traceparent header
+        tracing.inject(headers)
+        try:
+            response = await _client.post("/api/payments/", json=payload, headers=headers)
+        except httpx.HTTPError:
+            PAYMENT_CALL_LATENCY.labels("error").observe(time.perf_counter() - start)
+            raise
+        current.set_attribute("http.status_code", response.status_code)
+        if response.status_code >= 500:
+            current.set_status(tracing.Status(tracing.StatusCode.ERROR))
+    PAYMENT_CALL_LATENCY.labels(f"{response.status_code // 100}xx").observe(time.perf_counter() - start)
+    # Only server-side errors say something about payment-service health
+    if response.status_code >= 500:
+        response.raise_for_status()
+    return response
+
+
+async def initiate_payment(order_id: int, amount_cents: int, currency: str, user_id: int,
+                           token: str = "") -> httpx.Response:
+    """POST a payment for the order through the circuit breaker."""
+    if _client is None:
+        raise RuntimeError("Payment client not started")
+    # payment-service takes a decimal amount; a string keeps it exact
+    payload = {
+        "order_id": order_id,
+        "amount": str(from_minor(amount_cents)),
+        "currency": currency,
+        "user_id": user_id,
+    }
+    return await breaker.call(_post_payment, payload, token)
@@ -0,0 +1,290 @@
+# ============================================================
+# Order Service – Rate Limiting and Admission Control
+# Token buckets per user (JWT id) and per client IP, updated
+# atomically in Redis by a Lua script (in-process buckets while
+# Redis is unreachable), answer 429 with Retry-After. A per-
+# worker concurrency limit sized to the DB pool answers 503
+# with Retry-After before requests start queueing on the pool.
+# ============================================================
+import asyncio
+import ipaddress
+import logging
+import math
+import time
+from collections import OrderedDict, deque
+from functools import lru_cache
+from typing import NamedTuple, Optional
+
+from fastapi import HTTPException
+from fastapi.responses import ORJSONResponse
+from redis.exceptions import RedisError
+
+from app.auth import verify_token
+from app.cache import redis_client
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+LIMITED_PREFIX = "/api/"
+WRITE_METHODS = {"POST", "PUT", "PATCH", "DELETE"}
+
+# KEYS: bucket keys; ARGV: cost, then rate and burst per key. Takes ``cost``
+# tokens from every bucket or, if any of them is short, from none; returns
+# {allowed, seconds until it would be allowed}. Uses the Redis clock so
+# every replica refills the same way.
+TOKEN_BUCKET_LUA = """
+local cost = tonumber(ARGV[1])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local levels = {}
+local wait = 0
+for i, key in ipairs(KEYS) do
+    local rate = tonumber(ARGV[2 * i])
+    local burst = tonumber(ARGV[2 * i + 1])
+    local state = redis.call('HMGET', key, 'tokens', 'ts')
+    local tokens = tonumber(state[1]) or burst
+    local ts = tonumber(state[2]) or now
+    tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+    levels[i] = tokens
+    if tokens < cost then
+        wait = math.max(wait, (cost - tokens) / rate)
+    end
+end
+for i, key in ipairs(KEYS) do
+    local rate = tonumber(ARGV[2 * i])
+    local burst = tonumber(ARGV[2 * i + 1])
+    local tokens = levels[i]
+    if wait == 0 then
+        tokens = tokens - cost
+    end
+    redis.call('HSET', key, 'tokens', tostring(tokens), 'ts', tostring(now))
+    redis.call('PEXPIRE', key, math.ceil(burst / rate * 1000) + 1000)
+end
+if wait == 0 then
+    return {1, '0'}
+end
+return {0, tostring(wait)}
+"""
+
+
+class Bucket(NamedTuple):
+    key: str
+    rate: float  # tokens per second
+    burst: int
+
+
+class LocalBuckets:
+    """
+    In-process token buckets (bounded LRU), used while Redis is unreachable.
+    Limits then apply per worker rather than across the deployment.
+    """
+
+    def __init__(self, maxsize: int = 100_000):
+        self.maxsize = maxsize
+        self._levels: OrderedDict = OrderedDict()
+
+    def take(self, buckets: list, cost: int) -> float:
+        now = time.monotonic()
+        levels = []
+        for bucket in buckets:
+            tokens, ts = self._levels.get(bucket.key, (bucket.burst, now))
+            levels.append(min(bucket.burst, tokens + (now - ts) * bucket.rate))
+        wait = max(((cost - tokens) / b.rate for b, tokens in zip(buckets, levels) if tokens < cost), default=0.0)
+        for bucket, tokens in zip(buckets, levels):
+            self._levels[bucket.key] = (tokens - cost if not wait else tokens, now)
+            self._levels.move_to_end(bucket.key)
+        while len(self._levels) > self.maxsize:
+            self._levels.popitem(last=False)
+        return wait
+
+
+class RateLimiter:
+    """Token buckets in Redis with LocalBuckets as the fallback."""
+
+    def __init__(self):
+        self.local = LocalBuckets()
+        self._script = None
+        self._client = None
+        self.limited = 0
+        self.fallbacks = 0
+
+    def _redis_script(self):
+        client = redis_client()
+        if client is not self._client:
+            self._client = client
+            self._script = client.register_script(TOKEN_BUCKET_LUA) if client is not None else None
+        return self._script
+
+    async def take(self, buckets: list, cost: int) -> float:
+        """Take ``cost`` tokens from every bucket; returns 0 if allowed, else the seconds to wait."""
+        script = self._redis_script()
+        wait = None
+        if script is not None:
+            args = [cost]
+            for bucket in buckets:
+                args += [bucket.rate, bucket.burst]
+            try:
+                _, wait = await script(keys=[f"ratelimit:{b.key}" for b in buckets], args=args)
+                wait = float(wait)
+            except RedisError as e:
+                self.fallbacks += 1
+                logger.debug("Rate limiting in process, Redis unavailable: %s", e)
+        if wait is None:
+            wait = self.local.take(buckets, cost)
+        if wait:
+            self.limited += 1
+        return wait
+
+
+class ConcurrencyLimiter:
+    """
+    At most ``limit`` holders at a time; waiters are served first come, first
+    served (a released slot passes straight to the oldest waiter).
+    """
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.active = 0
+        self.rejected = 0
+        self._waiters: deque = deque()
+
+    async def acquire(self, timeout: float) -> bool:
+        if self.active < self.limit and not self._waiters:
+            self.active += 1
+            return True
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(waiter, timeout)
+            return True
+        except asyncio.TimeoutError:
+            # The slot may have been handed over just as the wait timed out
+            if waiter.done() and not waiter.cancelled():
+                return True
+            self.rejected += 1
+            return False
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            raise
+        finally:
+            if not waiter.done():
+                waiter.cancel()
+            try:
+                self._waiters.remove(waiter)
+            except ValueError:
+                pass
+
+    def release(self):
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.active -= 1
+
+    def stats(self) -> dict:
+        return {"limit": self.limit, "active": self.active, "waiting": len(self._waiters), "rejected": self.rejected}
+
+
+limiter = RateLimiter()
+admission = ConcurrencyLimiter(settings.ADMISSION_MAX_CONCURRENT or settings.DB_POOL_SIZE + settings.DB_MAX_OVERFLOW)
+
+
+def limiter_stats() -> dict:
+    return {**admission.stats(), "rate_limited": limiter.limited, "rate_limit_fallbacks": limiter.fallbacks}
+
+
+async def _user_id(scope) -> Optional[int]:
+    """
+    The caller's user id, through verify_token (and its token cache); None if
+    unauthenticated. The outcome is kept in the request state for get_current_user.
+    """
+    for name, value in scope["headers"]:
+        if name == b"authorization":
+            scheme, _, token = value.decode("latin-1").partition(" ")
+            if scheme.lower() != "bearer" or not token:
+                return None
+            try:
+                user = verify_token(token)
+            except HTTPException as e:
+                scope.setdefault("state", {})["verified_token"] = (token, e)
+                return None
+            scope.setdefault("state", {})["verified_token"] = (token, user)
+            return user["id"]
+    return None
+
+
+@lru_cache(maxsize=8)
+def _trusted_networks(cidrs: str) -> tuple:
+    return tuple(ipaddress.ip_network(cidr.strip(), strict=False) for cidr in cidrs.split(",") if cidr.strip())
+
+
+def _trusted(host: str, networks: tuple) -> bool:
+    try:
+        address = ipaddress.ip_address(host)
+    except ValueError:
+        return False
+    return any(address in network for network in networks)
+
+
+def _client_ip(scope) -> str:
+    """
+    The caller's IP: the connecting peer, or, when the peer is a trusted proxy
+    (TRUSTED_PROXY_CIDRS), the right-most X-Forwarded-For entry that is not one.
+    """
+    client = scope.get("client")
+    peer = client[0] if client else "unknown"
+    networks = _trusted_networks(settings.TRUSTED_PROXY_CIDRS)
+    if not _trusted(peer, networks):
+        return peer
+    forwarded = [
+        hop.strip() for name, value in scope["headers"] if name == b"x-forwarded-for"
+        for hop in value.decode("latin-1").split(",")
+    ]
+    # Proxies append the address they received from; anything further left is client-supplied
+    for hop in reversed(forwarded):
+        if hop and not _trusted(hop, networks):
+            return hop
+    return forwarded[0] if forwarded and forwarded[0] else peer
+
+
+def _reject(status_code: int, detail: str, retry_after: float) -> ORJSONResponse:
+    return ORJSONResponse(
+        {"detail": detail}, status_code=status_code, headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+    )
+
+
+class RateLimitMiddleware:
+    """
+    Pure ASGI middleware applying the rate limits and then admission control
+    to /api/ requests (probes and /metrics are never limited). Rate-limited
+    requests are refused before they take a concurrency slot.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not scope["path"].startswith(LIMITED_PREFIX):
+            await self.app(scope, receive, send)
+            return
+
+        if settings.RATE_LIMIT_ENABLED:
+            buckets = [Bucket(f"ip:{_client_ip(scope)}", settings.RATE_LIMIT_IP_RATE, settings.RATE_LIMIT_IP_BURST)]
+            user_id = await _user_id(scope)
+            if user_id is not None:
+                buckets.append(Bucket(f"user:{user_id}", settings.RATE_LIMIT_USER_RATE, settings.RATE_LIMIT_USER_BURST))
+            cost = settings.RATE_LIMIT_WRITE_COST if scope["method"] in WRITE_METHODS else 1
+            wait = await limiter.take(buckets, cost)
+            if wait:
+                await _reject(429, "Too many requests", wait)(scope, receive, send)
+                return
+
+        if not await admission.acquire(settings.ADMISSION_QUEUE_TIMEOUT_SECONDS):
+            await _reject(503, "Server busy", settings.ADMISSION_RETRY_AFTER_SECONDS)(scope, receive, send)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            admission.release()
@@ -0,0 +1,80 @@
+# ============================================================
+# Order Service – Order Rollup Maintenance
+# Every write that creates an order or changes its status also
+# applies count/total deltas to order_rollups in the same
+# transaction, with one upsert per touched rollup row.
+# ============================================================
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from typing import Iterable, NamedTuple
+
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models import OrderRollup
+
+# Statuses whose totals count as money spent
+SPEND_STATUSES = ("paid", "shipped", "delivered")
+
+
+class RollupDelta(NamedTuple):
+    user_id: int
+    day: date
+    status: str
+    currency: str
+    order_count: int
+    total_cents: int
+
+
+def created(user_id: int, created_at: datetime, status: str, currency: str, total_cents: int) -> list:
+    """Deltas for a new order."""
+    return [RollupDelta(user_id, created_at.date(), status, currency, 1, total_cents)]
+
+
+def moved(user_id: int, created_at: datetime, currency: str, total_cents: int,
+          old_status: str, new_status: str) -> list:
+    """Deltas moving an order from one status to another (none if unchanged)."""
+    if old_status == new_status:
+        return []
+    day = created_at.date()
+    return [
+        RollupDelta(user_id, day, old_status, currency, -1, -total_cents),
+        RollupDelta(user_id, day, new_status, currency, 1, total_cents),
+    ]
+
+
+async def apply_deltas(db: AsyncSession, deltas: Iterable[RollupDelta]):
+    """Merge deltas per rollup row and upsert them (INSERT ... ON CONFLICT DO UPDATE)."""
+    merged = defaultdict(lambda: [0, 0])
+    for delta in deltas:
+        key = (delta.user_id, delta.day, delta.status, delta.currency)
+        merged[key][0] += delta.order_count
+        merged[key][1] += delta.total_cents
+    # Sorted so concurrent upserts lock rollup rows in the same order
+    rows = [
+        {
+            "user_id": user_id,
+            "day": day,
+            "status": status,
+            "currency": currency,
+            "week": day - timedelta(days=day.weekday()),
+            "month": day.replace(day=1),
+            "order_count": order_count,
+            "total_cents": total_cents,
+        }
+        for (user_id, day, status, currency), (order_count, total_cents) in sorted(merged.items())
+        if order_count or total_cents
+    ]
+    if not rows:
+        return
+
+    insert = pg_insert if db.bind.dialect.name == "postgresql" else sqlite_insert
+    stmt = insert(OrderRollup).values(rows)
+    await db.execute(stmt.on_conflict_do_update(
+        index_elements=[OrderRollup.user_id, OrderRollup.day, OrderRollup.status, OrderRollup.currency],
+        set_={
+            "order_count": OrderRollup.order_count + stmt.excluded.order_count,
+            "total_cents": OrderRollup.total_cents + stmt.excluded.total_cents,
+        },
+    ))
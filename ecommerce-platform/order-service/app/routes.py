@@ -1,134 +1,440 @@
 # ============================================================
 # Order Service – Order Routes
 # Full CRUD for orders with JWT-protected endpoints.
-# Creates orders, initiates payment via payment-service.
+# Order events go through the transactional outbox; payment-service
+# picks up order.created to initiate payment.
 # ============================================================
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-import httpx
+import base64
+import logging
+from datetime import date, datetime
+from typing import Literal, Optional
 
-from app.database import get_db
-from app.models import Order, OrderItem
-from app.schemas import OrderCreate, OrderResponse, OrderUpdate
+import orjson
+from fastapi import APIRouter, Body, Depends, Header, HTTPException, Query, Response, status
+from fastapi.responses import ORJSONResponse
+from pydantic import ValidationError
+from sqlalchemy import case, func, insert, select, tuple_, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+from sqlalchemy.orm.attributes import set_committed_value
+
+from app.database import get_db, get_read_db, mark_write, session_like
+from app.models import ArchivedOrder, Order, OrderItem, OrderRollup
+from app.schemas import (
+    BulkOrderResponse,
+    BulkOrderResult,
+    OrderCreate,
+    OrderPage,
+    OrderResponse,
+    OrderSummary,
+    OrderUpdate,
+)
 from app.auth import get_current_user
-from app.messaging import publish_message
+from app.cache import get_or_load, invalidate, order_key
 from app.config import settings
+from app.outbox import enqueue_event, enqueue_events
+from app.payment_client import initiate_payment
+from app import documents, idempotency, rollup
+from app.export import export_response
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/api/orders", tags=["orders"])
 
+# Sum of an order's line items in minor units, correlated to the orders row being updated
+ITEMS_TOTAL_CENTS = (
+    select(func.coalesce(func.sum(OrderItem.price_cents * OrderItem.quantity), 0))
+    .where(OrderItem.order_id == Order.id)
+    .scalar_subquery()
+)
+
+
+async def _get_user_order(db: AsyncSession, order_id: int, user_id: int, lock: bool = False) -> Order:
+    """Load an order with its items (owner only) or raise 404. ``lock`` holds the row until commit."""
+    query = select(Order).options(selectinload(Order.items)).where(Order.id == order_id, Order.user_id == user_id)
+    if lock:
+        query = query.with_for_update(of=Order)
+    result = await db.execute(query)
+    order = result.scalar_one_or_none()
+    if not order:
+        raise HTTPException(status_code=404, detail="Order not found")
+    return order
+
+
+def _encode_cursor(created_at: datetime, order_id: int) -> str:
+    """Opaque cursor pointing at the last order of a page: base64("<created_at>|<id>")."""
+    raw = f"{created_at.isoformat()}|{order_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def _decode_cursor(cursor: str) -> tuple[datetime, int]:
+    try:
+        created_at, order_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(created_at), int(order_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
 
 @router.post("/", response_model=OrderResponse, status_code=status.HTTP_201_CREATED)
 async def create_order(
     order_data: OrderCreate,
-    db: Session = Depends(get_db),
+    idempotency_key: Optional[str] = Header(None, max_length=255),
+    db: AsyncSession = Depends(get_db),
     user: dict = Depends(get_current_user),
 ):
     """
     Create a new order for the authenticated user.
-    Calculates total from items, persists to DB, and publishes event.
+    Persists the order, its items and the order.created outbox event in one
+    transaction; the outbox relay publishes the event after commit. Retries
+    with the same Idempotency-Key get the first response back instead of a
+    second order.
     """
-    # Calculate total from items
-    total = sum(item.price * item.quantity for item in order_data.items)
-
-    # Create order record
-    order = Order(user_id=user["id"], total=total, notes=order_data.notes)
-    db.add(order)
-    db.flush()  # Get the order ID before adding items
-
-    # Add order items
-    for item in order_data.items:
-        db_item = OrderItem(
-            order_id=order.id,
-            product_id=item.product_id,
-            quantity=item.quantity,
-            price=item.price,
+    key = f"orders:{user['id']}:{idempotency_key}" if idempotency_key else None
+    async with idempotency.claim(db, key, idempotency.fingerprint(order_data)) as claim:
+        if claim.replay:
+            return claim.replay
+
+        # Create order record together with its items
+        order = Order(
+            user_id=user["id"],
+            currency=order_data.currency,
+            notes=order_data.notes,
+            items=[
+                OrderItem(product_id=item.product_id, quantity=item.quantity, price_cents=item.price_cents)
+                for item in order_data.items
+            ],
         )
-        db.add(db_item)
+        db.add(order)
+        await db.flush()  # Get the order ID for the event payload
 
-    db.commit()
-    db.refresh(order)
+        # Total computed by the database from the stored integer prices
+        total_cents, updated_at = (await db.execute(
+            update(Order)
+            .where(Order.id == order.id)
+            .values(total_cents=ITEMS_TOTAL_CENTS)
+            .returning(Order.total_cents, Order.updated_at)
+            .execution_options(synchronize_session=False)
+        )).one()
+        set_committed_value(order, "total_cents", total_cents)
+        set_committed_value(order, "updated_at", updated_at)
+        await rollup.apply_deltas(db, rollup.created(order.user_id, order.created_at, order.status, order.currency, total_cents))
 
-    # Publish order.created event
-    await publish_message("order.created", {
-        "order_id": order.id,
-        "user_id": user["id"],
-        "total": total,
-    })
+        enqueue_event(db, "order.created", {
+            "order_id": order.id,
+            "user_id": user["id"],
+            "total_cents": total_cents,
+            "currency": order.currency,
+        })
+        response = claim.complete(
+            status.HTTP_201_CREATED, orjson.dumps(OrderResponse.model_validate(order).model_dump(mode="json")),
+        )
+        await db.commit()
+    await mark_write(user["id"])
 
-    # Initiate payment asynchronously (fire-and-forget)
-    try:
-        async with httpx.AsyncClient() as client:
-            await client.post(
-                f"{settings.PAYMENT_SERVICE_URL}/api/payments",
-                json={"order_id": order.id, "amount": total, "user_id": user["id"]},
-                headers={"Authorization": f"Bearer {user.get('token', '')}"},
-                timeout=5.0,
-            )
-    except Exception as e:
-        print(f"⚠️  Payment initiation failed: {e}")
+    # Legacy synchronous payment initiation over the shared client (fails fast
+    # while the payment-service circuit is open)
+    if settings.PAYMENT_VIA_HTTP:
+        try:
+            await initiate_payment(order.id, total_cents, order.currency, user["id"], user.get("token", ""))
+        except Exception as e:
+            logger.warning("Payment initiation failed: %s", e, extra={"order_id": order.id})
 
-    return order
+    return response
+
+
+@router.post("/bulk", response_model=BulkOrderResponse)
+async def create_orders_bulk(
+    payload: list = Body(...),
+    db: AsyncSession = Depends(get_db),
+    user: dict = Depends(get_current_user),
+):
+    """
+    Create many orders for the authenticated user in one transaction.
+    Each entry is validated as an OrderCreate on its own, so invalid entries
+    are reported per index without rejecting the rest. Valid orders, their
+    items and their order.created outbox events are written with one
+    multi-row INSERT each.
+    """
+    if len(payload) > settings.BULK_ORDER_LIMIT:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"At most {settings.BULK_ORDER_LIMIT} orders per request",
+        )
 
+    results, valid = [], []
+    for index, raw in enumerate(payload):
+        try:
+            valid.append((index, OrderCreate.model_validate(raw)))
+        except ValidationError as e:
+            error = "; ".join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors())
+            results.append(BulkOrderResult(index=index, error=error))
 
-@router.get("/", response_model=list[OrderResponse])
+    if valid:
+        inserted = (await db.execute(
+            insert(Order).returning(Order.id, Order.created_at, Order.status, sort_by_parameter_order=True),
+            [{"user_id": user["id"], "currency": order.currency, "notes": order.notes} for _, order in valid],
+        )).all()
+        order_ids = [order_id for order_id, _, _ in inserted]
+
+        item_rows = [
+            {
+                "order_id": order_id, "product_id": item.product_id, "quantity": item.quantity,
+                "price_cents": item.price_cents, "created_at": created_at,
+            }
+            for (order_id, created_at, _), (_, order) in zip(inserted, valid)
+            for item in order.items
+        ]
+        if item_rows:
+            await db.execute(insert(OrderItem), item_rows)
+        totals = dict((await db.execute(
+            update(Order)
+            .where(Order.id.in_(order_ids))
+            .values(total_cents=ITEMS_TOTAL_CENTS)
+            .returning(Order.id, Order.total_cents)
+            .execution_options(synchronize_session=False)
+        )).all())
+        await enqueue_events(db, "order.created", [
+            {"order_id": order_id, "user_id": user["id"], "total_cents": totals[order_id], "currency": order.currency}
+            for order_id, (_, order) in zip(order_ids, valid)
+        ])
+        await rollup.apply_deltas(db, (
+            delta
+            for (order_id, created_at, order_status), (_, order) in zip(inserted, valid)
+            for delta in rollup.created(user["id"], created_at, order_status, order.currency, totals[order_id])
+        ))
+        await db.commit()
+        await mark_write(user["id"])
+
+        results.extend(
+            BulkOrderResult(index=index, order_id=order_id, total_cents=totals[order_id])
+            for (index, _), order_id in zip(valid, order_ids)
+        )
+
+    results.sort(key=lambda result: result.index)
+    return BulkOrderResponse(created=len(valid), failed=len(payload) - len(valid), results=results)
+
+
+@router.get("/", response_model=OrderPage)
 async def list_orders(
-    db: Session = Depends(get_db),
+    limit: int = Query(20, ge=1, le=100),
+    after: Optional[str] = None,
+    include_archived: bool = False,
+    db: AsyncSession = Depends(get_read_db),
     user: dict = Depends(get_current_user),
 ):
-    """List all orders for the authenticated user."""
-    orders = db.query(Order).filter(Order.user_id == user["id"]).order_by(Order.created_at.desc()).all()
-    return orders
+    """
+    List the authenticated user's orders, newest first, one page at a time.
+    Uses keyset pagination on (created_at, id) so every page is an index range scan,
+    loads the items of the whole page in one more query and builds the page from
+    row tuples, skipping ORM objects and response_model validation.
+    With ``include_archived`` the pages continue into orders_archive once the
+    live orders run out (archived orders are all older than live ones).
+    """
+    query = (
+        select(*documents.ORDER_COLUMNS)
+        .where(Order.user_id == user["id"])
+        .order_by(Order.created_at.desc(), Order.id.desc())
+        .limit(limit + 1)
+    )
+    cursor = _decode_cursor(after) if after else None
+    if cursor:
+        query = query.where(tuple_(Order.created_at, Order.id) < tuple_(*cursor))
+
+    orders = await documents.load_orders(db, query)
+    if include_archived and len(orders) <= limit:
+        if orders:
+            cursor = orders[-1]["created_at"], orders[-1]["id"]
+        archived = (
+            select(*documents.ARCHIVE_COLUMNS)
+            .where(ArchivedOrder.user_id == user["id"])
+            .order_by(ArchivedOrder.created_at.desc(), ArchivedOrder.id.desc())
+            .limit(limit + 1 - len(orders))
+        )
+        if cursor:
+            archived = archived.where(tuple_(ArchivedOrder.created_at, ArchivedOrder.id) < tuple_(*cursor))
+        orders += await documents.load_archived(db, archived)
+    last = orders[limit - 1] if len(orders) > limit else None
+    next_cursor = _encode_cursor(last["created_at"], last["id"]) if last else None
+    return ORJSONResponse({"items": orders[:limit], "next_cursor": next_cursor})
+
+
+@router.get("/export")
+async def export_orders(
+    fmt: Literal["ndjson", "csv"] = Query("ndjson", alias="format"),
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    status_: Optional[str] = Query(None, alias="status"),
+    include_archived: bool = False,
+    user: dict = Depends(get_current_user),
+):
+    """
+    Stream the authenticated user's orders, oldest first, as NDJSON or CSV.
+    ``since``/``until`` (created_at, half-open) and ``status`` are applied in
+    SQL, so the scan stays on the (user_id, created_at, id) index. Amounts are
+    exported exactly, as total_cents plus currency. With ``include_archived``
+    the export starts with the user's orders in orders_archive.
+    """
+    query = (
+        select(
+            Order.id, Order.status, Order.total_cents, Order.currency,
+            Order.notes, Order.created_at, Order.updated_at,
+        )
+        .where(Order.user_id == user["id"])
+        .order_by(Order.created_at, Order.id)
+    )
+    if since:
+        query = query.where(Order.created_at >= since)
+    if until:
+        query = query.where(Order.created_at < until)
+    if status_:
+        query = query.where(Order.status == status_)
+    if not include_archived:
+        return export_response(query, fmt, "orders")
+
+    archived = (
+        select(ArchivedOrder.document)
+        .where(ArchivedOrder.user_id == user["id"])
+        .order_by(ArchivedOrder.created_at, ArchivedOrder.id)
+    )
+    if since:
+        archived = archived.where(ArchivedOrder.created_at >= since)
+    if until:
+        archived = archived.where(ArchivedOrder.created_at < until)
+    return export_response(
+        query, fmt, "orders", archived=archived,
+        keep=(lambda order: order["status"] == status_) if status_ else None,
+        after=lambda created_at, order_id: query.where(
+            tuple_(Order.created_at, Order.id) > tuple_(created_at, order_id)
+        ),
+    )
+
+
+@router.get("/summary", response_model=OrderSummary)
+async def order_summary(
+    bucket: Literal["day", "week", "month"] = "month",
+    since: Optional[date] = None,
+    until: Optional[date] = None,
+    db: AsyncSession = Depends(get_read_db),
+    user: dict = Depends(get_current_user),
+):
+    """
+    Per-status counts and totals, spend per currency and spend per day, week
+    or month for the authenticated user, optionally limited to orders created
+    between ``since`` and ``until`` (inclusive). Reads the order_rollups rows
+    of the user (primary key range), never the orders themselves.
+    """
+    scope = [OrderRollup.user_id == user["id"]]
+    if since:
+        scope.append(OrderRollup.day >= since)
+    if until:
+        scope.append(OrderRollup.day <= until)
+
+    count = func.sum(OrderRollup.order_count)
+    by_status = (await db.execute(
+        select(OrderRollup.status, OrderRollup.currency, count, func.sum(OrderRollup.total_cents))
+        .where(*scope)
+        .group_by(OrderRollup.status, OrderRollup.currency)
+        .having(count > 0)
+        .order_by(OrderRollup.status, OrderRollup.currency)
+    )).all()
+
+    start = getattr(OrderRollup, bucket)
+    spent = func.sum(case((OrderRollup.status.in_(rollup.SPEND_STATUSES), OrderRollup.total_cents), else_=0))
+    buckets = (await db.execute(
+        select(start, OrderRollup.currency, count, spent)
+        .where(*scope)
+        .group_by(start, OrderRollup.currency)
+        .having(count > 0)
+        .order_by(start, OrderRollup.currency)
+    )).all()
+
+    spend = {}
+    for status_, currency, _, total_cents in by_status:
+        if status_ in rollup.SPEND_STATUSES:
+            spend[currency] = spend.get(currency, 0) + total_cents
+
+    return {
+        "by_status": [
+            {"status": status_, "currency": currency, "count": n, "total_cents": total_cents}
+            for status_, currency, n, total_cents in by_status
+        ],
+        "spend": [{"currency": currency, "total_cents": total_cents} for currency, total_cents in sorted(spend.items())],
+        "bucket": bucket,
+        "buckets": [
+            {"start": bucket_start, "currency": currency, "count": n, "spend_cents": spend_cents}
+            for bucket_start, currency, n, spend_cents in buckets
+        ],
+    }
 
 
 @router.get("/{order_id}", response_model=OrderResponse)
 async def get_order(
     order_id: int,
-    db: Session = Depends(get_db),
+    include_archived: bool = False,
+    db: AsyncSession = Depends(get_read_db),
     user: dict = Depends(get_current_user),
 ):
-    """Get a specific order by ID (owner only)."""
-    order = db.query(Order).filter(Order.id == order_id, Order.user_id == user["id"]).first()
-    if not order:
+    """
+    Get a specific order by ID (owner only), read through the Redis cache.
+    With ``include_archived`` an order moved to orders_archive is returned too.
+    """
+    async def load() -> Optional[bytes]:
+        # Shared with concurrent requests for this order, so not on this request's session
+        async with session_like(db) as session:
+            orders = await documents.load_orders(session, select(*documents.ORDER_COLUMNS).where(Order.id == order_id))
+        return orjson.dumps(orders[0]) if orders else None
+
+    document = await get_or_load(order_key(order_id), load)
+    if document is None and include_archived:
+        document = (await db.execute(
+            select(ArchivedOrder.document).where(ArchivedOrder.id == order_id, ArchivedOrder.user_id == user["id"])
+        )).scalar()
+    # Cached documents are shared by order id, so ownership is checked on the document
+    if document is None or orjson.loads(document)["user_id"] != user["id"]:
         raise HTTPException(status_code=404, detail="Order not found")
-    return order
+    return Response(content=document, media_type="application/json")
 
 
 @router.put("/{order_id}", response_model=OrderResponse)
 async def update_order(
     order_id: int,
     update: OrderUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     user: dict = Depends(get_current_user),
 ):
     """Update order status or notes."""
-    order = db.query(Order).filter(Order.id == order_id, Order.user_id == user["id"]).first()
-    if not order:
-        raise HTTPException(status_code=404, detail="Order not found")
+    order = await _get_user_order(db, order_id, user["id"], lock=True)
 
     if update.status:
+        await rollup.apply_deltas(db, rollup.moved(
+            order.user_id, order.created_at, order.currency, order.total_cents, order.status, update.status,
+        ))
         order.status = update.status
     if update.notes is not None:
         order.notes = update.notes
 
-    db.commit()
-    db.refresh(order)
-
-    await publish_message("order.updated", {"order_id": order.id, "status": order.status})
+    enqueue_event(db, "order.updated", {"order_id": order.id, "status": order.status})
+    await db.commit()
+    await mark_write(user["id"])
+    await invalidate(order_key(order.id))
+    await db.refresh(order)
     return order
 
 
 @router.delete("/{order_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def cancel_order(
     order_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     user: dict = Depends(get_current_user),
 ):
     """Cancel an order (set status to cancelled)."""
-    order = db.query(Order).filter(Order.id == order_id, Order.user_id == user["id"]).first()
-    if not order:
-        raise HTTPException(status_code=404, detail="Order not found")
+    order = await _get_user_order(db, order_id, user["id"], lock=True)
 
+    await rollup.apply_deltas(db, rollup.moved(
+        order.user_id, order.created_at, order.currency, order.total_cents, order.status, "cancelled",
+    ))
     order.status = "cancelled"
-    db.commit()
-
-    await publish_message("order.cancelled", {"order_id": order.id, "user_id": user["id"]})
+    enqueue_event(db, "order.cancelled", {"order_id": order.id, "user_id": user["id"]})
+    await db.commit()
+    await mark_write(user["id"])
+    await invalidate(order_key(order.id))
@@ -2,21 +2,45 @@
 # Order Service – Pydantic Schemas
 # Request/response models for API validation and serialization.
 # ============================================================
-from pydantic import BaseModel
-from typing import List, Optional
-from datetime import datetime
+from pydantic import BaseModel, Field, PlainSerializer, computed_field
+from typing import Annotated, List, Optional
+from datetime import date, datetime
+from decimal import Decimal
+
+# Amounts cross the API as decimal numbers with at most two places and are
+# stored as integer minor units; conversion happens only in these schemas.
+Money = Annotated[
+    Decimal,
+    Field(max_digits=14, decimal_places=2),
+    PlainSerializer(float, return_type=float, when_used="json"),
+]
+
+
+def to_minor(amount: Decimal) -> int:
+    """12.34 -> 1234 (exact: Money has at most two decimal places)."""
+    return int(amount.scaleb(2))
+
+
+def from_minor(cents: int) -> Decimal:
+    """1234 -> Decimal("12.34")"""
+    return Decimal(cents).scaleb(-2)
 
 
 class OrderItemCreate(BaseModel):
     """Schema for creating an order item."""
     product_id: int
     quantity: int = 1
-    price: float
+    price: Money
+
+    @property
+    def price_cents(self) -> int:
+        return to_minor(self.price)
 
 
 class OrderCreate(BaseModel):
     """Schema for creating a new order."""
     items: List[OrderItemCreate]
+    currency: str = Field("USD", pattern="^[A-Z]{3}$")
     notes: Optional[str] = None
 
 
@@ -25,7 +49,12 @@ class OrderItemResponse(BaseModel):
     id: int
     product_id: int
     quantity: int
-    price: float
+    price_cents: int
+
+    @computed_field
+    @property
+    def price(self) -> Money:
+        return from_minor(self.price_cents)
 
     class Config:
         from_attributes = True
@@ -36,17 +65,96 @@ class OrderResponse(BaseModel):
     id: int
     user_id: int
     status: str
-    total: float
+    total_cents: int
+    currency: str
     notes: Optional[str]
     created_at: datetime
     updated_at: datetime
     items: List[OrderItemResponse]
 
+    @computed_field
+    @property
+    def total(self) -> Money:
+        return from_minor(self.total_cents)
+
     class Config:
         from_attributes = True
 
 
+class OrderPage(BaseModel):
+    """Schema for one page of the keyset-paginated order listing."""
+    items: List[OrderResponse]
+    next_cursor: Optional[str] = None
+
+
+class BulkOrderResult(BaseModel):
+    """Outcome of one order in a bulk request (by position in the request)."""
+    index: int
+    order_id: Optional[int] = None
+    total_cents: Optional[int] = None
+    error: Optional[str] = None
+
+
+class BulkOrderResponse(BaseModel):
+    """Schema for the bulk order creation report."""
+    created: int
+    failed: int
+    results: List[BulkOrderResult]
+
+
+class StatusTotals(BaseModel):
+    """Number and total of a user's orders in one status and currency."""
+    status: str
+    currency: str
+    count: int
+    total_cents: int
+
+    @computed_field
+    @property
+    def total(self) -> Money:
+        return from_minor(self.total_cents)
+
+
+class CurrencyTotal(BaseModel):
+    """Money spent in one currency (orders that are paid, shipped or delivered)."""
+    currency: str
+    total_cents: int
+
+    @computed_field
+    @property
+    def total(self) -> Money:
+        return from_minor(self.total_cents)
+
+
+class SpendBucket(BaseModel):
+    """Orders placed and money spent in one day, week or month (by order creation date)."""
+    start: date
+    currency: str
+    count: int
+    spend_cents: int
+
+    @computed_field
+    @property
+    def spend(self) -> Money:
+        return from_minor(self.spend_cents)
+
+
+class OrderSummary(BaseModel):
+    """Schema for GET /api/orders/summary."""
+    by_status: List[StatusTotals]
+    spend: List[CurrencyTotal]
+    bucket: str
+    buckets: List[SpendBucket]
+
+
 class OrderUpdate(BaseModel):
     """Schema for updating order status."""
     status: Optional[str] = None
     notes: Optional[str] = None
+
+
+class PaymentEvent(BaseModel):
+    """payment.completed / payment.updated event published by payment-service."""
+    order_id: int
+    status: str = "completed"
+    updated_at: Optional[datetime] = None
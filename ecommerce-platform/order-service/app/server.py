@@ -0,0 +1,17 @@
+# ============================================================
+# Order Service – Gunicorn Worker
+# Uvicorn worker used by gunicorn.conf.py in production.
+# ============================================================
+from uvicorn_worker import UvicornWorker
+
+from app.config import settings
+
+
+class Worker(UvicornWorker):
+    """Uvicorn on uvloop/httptools, with a bounded wait for in-flight requests on shutdown."""
+
+    CONFIG_KWARGS = {
+        "loop": "uvloop",
+        "http": "httptools",
+        "timeout_graceful_shutdown": settings.DRAIN_TIMEOUT_SECONDS,
+    }
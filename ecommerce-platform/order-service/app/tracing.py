@@ -0,0 +1,182 @@
+# ============================================================
+# Order Service – Distributed Tracing (OpenTelemetry)
+# Spans for HTTP routes, SQL statements, RabbitMQ publishes
+# and consumed batches, and the call to payment-service. W3C
+# trace context travels in HTTP and AMQP message headers (and
+# in outbox rows, so relayed events continue the request's
+# trace). Head-based sampling; spans are exported over OTLP
+# to a local collector.
+# ============================================================
+import logging
+from typing import Optional
+
+from opentelemetry import propagate, trace
+from opentelemetry.sdk.resources import Resource
+from opentelemetry.sdk.trace import TracerProvider
+from opentelemetry.sdk.trace.export import BatchSpanProcessor, SimpleSpanProcessor, SpanExporter
+from opentelemetry.sdk.trace.sampling import ParentBased, TraceIdRatioBased
+from opentelemetry.trace import SpanKind, Status, StatusCode
+from sqlalchemy import event
+
+from app.config import settings
+
+SERVICE = "order-service"
+
+logger = logging.getLogger(__name__)
+
+# No-op until configure_tracing(): spans cost next to nothing and nothing is propagated
+_tracer: trace.Tracer = trace.NoOpTracer()
+_provider: Optional[TracerProvider] = None
+
+
+def configure_tracing(exporter: Optional[SpanExporter] = None):
+    """
+    Start recording spans (called at worker startup, like configure_logging).
+    Spans go to ``exporter`` as they end (tests pass an InMemorySpanExporter),
+    else in batches to the OTLP collector at OTEL_EXPORTER_OTLP_ENDPOINT.
+    """
+    global _tracer, _provider
+    if _provider is not None or not (settings.TRACING_ENABLED or exporter):
+        return
+    # Root spans are kept with probability TRACE_SAMPLE_RATIO; everything
+    # downstream follows the decision carried in the incoming traceparent
+    _provider = TracerProvider(
+        resource=Resource.create({"service.name": SERVICE}),
+        sampler=ParentBased(TraceIdRatioBased(settings.TRACE_SAMPLE_RATIO)),
+    )
+    if exporter is not None:
+        _provider.add_span_processor(SimpleSpanProcessor(exporter))
+    else:
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+
+        _provider.add_span_processor(BatchSpanProcessor(
+            OTLPSpanExporter(endpoint=f"{settings.OTEL_EXPORTER_OTLP_ENDPOINT.rstrip('/')}/v1/traces"),
+        ))
+        logger.info("Exporting traces to %s", settings.OTEL_EXPORTER_OTLP_ENDPOINT)
+    _tracer = _provider.get_tracer(SERVICE)
+
+
+def shutdown_tracing():
+    """Export finished spans and stop recording."""
+    global _tracer, _provider
+    if _provider is not None:
+        _provider.shutdown()
+        _provider = None
+        _tracer = trace.NoOpTracer()
+
+
+def span(name: str, kind: SpanKind = SpanKind.INTERNAL, context=None, attributes: Optional[dict] = None, links=None):
+    """Start a span as the current one (a context manager); ``context`` overrides the parent."""
+    return _tracer.start_as_current_span(name, context=context, kind=kind, attributes=attributes, links=links)
+
+
+def inject(carrier: Optional[dict] = None) -> dict:
+    """The current trace context as headers (``traceparent``), added to ``carrier`` if given."""
+    carrier = {} if carrier is None else carrier
+    propagate.inject(carrier)
+    return carrier
+
+
+def extract(carrier: Optional[dict]):
+    """A parent context from headers written by inject() (the current context if there are none)."""
+    if not carrier:
+        return None
+    # AMQP header values may arrive as bytes
+    return propagate.extract({k: v.decode() if isinstance(v, bytes) else v for k, v in carrier.items()})
+
+
+def link(carrier: Optional[dict]) -> Optional[trace.Link]:
+    """A link to the span that wrote ``carrier`` (for batches that have many parents)."""
+    span_context = trace.get_current_span(extract(carrier)).get_span_context() if carrier else None
+    return trace.Link(span_context) if span_context and span_context.is_valid else None
+
+
+def current_trace_id() -> Optional[str]:
+    """Hex id of the trace being recorded, for log records (None outside a sampled span)."""
+    span_context = trace.get_current_span().get_span_context()
+    return format(span_context.trace_id, "032x") if span_context.is_valid and span_context.trace_flags.sampled else None
+
+
+def record_error(current: trace.Span, error: BaseException):
+    current.record_exception(error)
+    current.set_status(Status(StatusCode.ERROR, type(error).__name__))
+
+
+def _operation(statement: str) -> str:
+    return statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "UNKNOWN"
+
+
+def trace_engine(engine, name: str = "primary"):
+    """
+    A CLIENT span per statement on ``engine`` (the statement text, never its
+    parameters). Only statements inside a trace are recorded, so background
+    polling (outbox relay, purger) doesn't start a trace per query.
+    """
+    sync_engine = engine.sync_engine
+    dialect = sync_engine.dialect.name
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        # Entered and left from the same greenlet, which sees the caller's context
+        current = None
+        if trace.get_current_span().get_span_context().is_valid:
+            current = _tracer.start_span(
+                f"{_operation(statement)} {name}", kind=SpanKind.CLIENT,
+                attributes={"db.system": dialect, "db.statement": statement[:2000], "db.engine": name},
+            )
+        conn.info.setdefault("query_spans", []).append(current)
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        spans = conn.info.get("query_spans")
+        current = spans.pop() if spans else None
+        if current is not None:
+            current.end()
+
+    @event.listens_for(sync_engine, "handle_error")
+    def _error(context):
+        spans = context.connection.info.get("query_spans") if context.connection is not None else None
+        current = spans.pop() if spans else None
+        if current is not None:
+            record_error(current, context.original_exception)
+            current.end()
+
+
+class TracingMiddleware:
+    """
+    Pure ASGI middleware: one SERVER span per request, continuing the
+    caller's trace from its ``traceparent`` header and named after the route
+    template once routing has matched (``GET /api/orders/{order_id}``).
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = {name.decode("latin-1"): value.decode("latin-1") for name, value in scope["headers"]}
+        status_code = 500
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        with span(
+            scope["method"], SpanKind.SERVER, context=propagate.extract(headers),
+            attributes={"http.method": scope["method"], "http.target": scope["path"]},
+        ) as current:
+            try:
+                await self.app(scope, receive, send_with_status)
+            finally:
+                route = getattr(scope.get("route"), "path", None)
+                if route:
+                    current.update_name(f"{scope['method']} {route}")
+                    current.set_attribute("http.route", route)
+                current.set_attribute("http.status_code", status_code)
+                if status_code >= 500:
+                    current.set_status(Status(StatusCode.ERROR))
@@ -0,0 +1,54 @@
+# ============================================================
+# Order Service – get_current_user Micro-benchmark
+# Compares the old uncached decode with the cached dependency
+# (and both JWT backends on a cache miss), JWT_BACKEND for the
+# dependency. Part of the micro suite (benchmarks.run).
+#
+#   python -m benchmarks.bench_auth --iterations 50000
+# ============================================================
+import argparse
+import time
+
+import jwt as pyjwt
+from fastapi.security import HTTPAuthorizationCredentials
+from jose import jwt as jose_jwt
+
+from app.auth import TokenCache, get_current_user
+from app.config import settings
+from app import auth
+from benchmarks.harness import call, report, time_calls
+
+
+def make_token() -> str:
+    claims = {"id": 42, "email": "bench@example.com", "role": "customer", "exp": int(time.time()) + 3600}
+    return jose_jwt.encode(claims, settings.JWT_SECRET, algorithm="HS256")
+
+
+def run(iterations: int) -> dict:
+    token = make_token()
+    credentials = HTTPAuthorizationCredentials(scheme="Bearer", credentials=token)
+
+    def dependency():
+        call(get_current_user(credentials))
+
+    results = {
+        "auth.jose_decode": time_calls(
+            lambda: jose_jwt.decode(token, settings.JWT_SECRET, algorithms=["HS256"]), iterations),
+        "auth.pyjwt_decode": time_calls(
+            lambda: pyjwt.decode(token, settings.JWT_SECRET.encode(), algorithms=["HS256"]), iterations),
+    }
+    previous = auth.token_cache
+    try:
+        auth.token_cache = TokenCache(maxsize=1, ttl=0)  # every call is a miss
+        results["auth.get_current_user_cache_miss"] = time_calls(dependency, iterations)
+        auth.token_cache = TokenCache(maxsize=settings.JWT_CACHE_SIZE, ttl=settings.JWT_CACHE_TTL_SECONDS)
+        results["auth.get_current_user_cache_hit"] = time_calls(dependency, iterations)
+    finally:
+        auth.token_cache = previous
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="get_current_user micro-benchmark")
+    parser.add_argument("--iterations", type=int, default=20000)
+    report(run(parser.parse_args().iterations))
@@ -0,0 +1,133 @@
+# ============================================================
+# Order Service – Publisher Throughput Benchmark
+# Compares the old one-at-a-time publish (exchange lookup +
+# awaited confirm per message) with the batched publisher.
+#
+# Needs a local RabbitMQ:
+#   docker compose up -d rabbitmq
+#   python -m benchmarks.bench_publish --messages 20000 --producers 50
+#
+# --stub instead times publish_message() against an in-memory
+# exchange that confirms at once: the client-side cost of the
+# publish path (part of the micro suite, benchmarks.run).
+# ============================================================
+import argparse
+import asyncio
+import json
+import time
+
+import aio_pika
+import orjson
+
+from app import messaging
+from app.config import settings
+from app.messaging import EXCHANGE, BatchPublisher
+from benchmarks.harness import report, summarize
+
+ROUTING_KEY = "bench.order.created"
+PAYLOAD = {"order_id": 123456, "user_id": 42, "total_cents": 9995, "currency": "USD"}
+
+
+async def bench_sequential(channel, messages: int) -> float:
+    """Baseline: the pre-batching publish path."""
+    start = time.perf_counter()
+    for _ in range(messages):
+        exchange = await channel.get_exchange(EXCHANGE)
+        await exchange.publish(
+            aio_pika.Message(body=json.dumps(PAYLOAD).encode(), delivery_mode=aio_pika.DeliveryMode.PERSISTENT),
+            routing_key=ROUTING_KEY,
+        )
+    return time.perf_counter() - start
+
+
+async def bench_batched(exchange, messages: int, producers: int, batch_size: int, linger_ms: float) -> float:
+    publisher = BatchPublisher(
+        exchange,
+        max_queue=settings.PUBLISH_QUEUE_SIZE,
+        batch_size=batch_size,
+        linger=linger_ms / 1000,
+        max_retries=settings.PUBLISH_MAX_RETRIES,
+        confirm_timeout=settings.PUBLISH_CONFIRM_TIMEOUT_SECONDS,
+    )
+    publisher.start()
+
+    async def producer(count: int):
+        for _ in range(count):
+            await publisher.publish(ROUTING_KEY, orjson.dumps(PAYLOAD))
+
+    per_producer = messages // producers
+    start = time.perf_counter()
+    await asyncio.gather(*(producer(per_producer) for _ in range(producers)))
+    elapsed = time.perf_counter() - start
+    await publisher.stop()
+    print(f"  batched stats: {publisher.stats()}")
+    return elapsed
+
+
+class StubExchange:
+    """Confirms every message on the next loop iteration."""
+
+    async def publish(self, message, routing_key, timeout=None):
+        await asyncio.sleep(0)
+
+
+async def bench_stub(messages: int, producers: int) -> dict:
+    publisher = BatchPublisher(
+        StubExchange(),
+        max_queue=settings.PUBLISH_QUEUE_SIZE,
+        batch_size=settings.PUBLISH_BATCH_SIZE,
+        linger=settings.PUBLISH_LINGER_MS / 1000,
+        max_retries=0,
+        confirm_timeout=settings.PUBLISH_CONFIRM_TIMEOUT_SECONDS,
+    )
+    publisher.start()
+    previous, messaging._publisher = messaging._publisher, publisher
+    samples = []
+
+    async def producer(count: int):
+        for _ in range(count):
+            start = time.perf_counter()
+            await messaging.publish_message(ROUTING_KEY, PAYLOAD)
+            samples.append(time.perf_counter() - start)
+
+    try:
+        start = time.perf_counter()
+        await asyncio.gather(*(producer(messages // producers) for _ in range(producers)))
+        elapsed = time.perf_counter() - start
+    finally:
+        messaging._publisher = previous
+        await publisher.stop()
+    return {"publish.publish_message_stub": summarize(samples, elapsed)}
+
+
+def run(messages: int, producers: int) -> dict:
+    return asyncio.run(bench_stub(messages, producers))
+
+
+async def main(args):
+    connection = await aio_pika.connect_robust(settings.RABBITMQ_URL)
+    channel = await connection.channel(publisher_confirms=True)
+    exchange = await channel.declare_exchange(EXCHANGE, aio_pika.ExchangeType.TOPIC, durable=True)
+
+    # Unbound routing key: the broker confirms and drops the messages
+    sequential = await bench_sequential(channel, args.messages)
+    batched = await bench_batched(exchange, args.messages, args.producers, args.batch_size, args.linger_ms)
+    await connection.close()
+
+    sent = args.messages // args.producers * args.producers
+    print(f"sequential: {args.messages / sequential:10.0f} msg/s")
+    print(f"batched:    {sent / batched:10.0f} msg/s  ({sequential / batched * sent / args.messages:.1f}x)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Publisher throughput benchmark")
+    parser.add_argument("--messages", type=int, default=10000)
+    parser.add_argument("--producers", type=int, default=50)
+    parser.add_argument("--batch-size", type=int, default=settings.PUBLISH_BATCH_SIZE)
+    parser.add_argument("--linger-ms", type=float, default=settings.PUBLISH_LINGER_MS)
+    parser.add_argument("--stub", action="store_true", help="in-memory exchange, no broker needed")
+    args = parser.parse_args()
+    if args.stub:
+        report(run(args.messages, args.producers))
+    else:
+        asyncio.run(main(args))
@@ -0,0 +1,73 @@
+# ============================================================
+# Order Service – Response Serialization Micro-benchmark
+# CPU per response for orders with items: FastAPI's
+# response_model path over ORM objects, Pydantic documents
+# encoded by orjson, and documents assembled from row tuples
+# (app/documents.py) rendered by ORJSONResponse. No database.
+#
+#   python -m benchmarks.bench_serialization --orders 100 --iterations 500
+# ============================================================
+import argparse
+from datetime import datetime
+
+import orjson
+from fastapi.responses import JSONResponse, ORJSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_model_field
+
+from app import documents
+from app.models import Order, OrderItem
+from app.schemas import OrderPage, OrderResponse
+from benchmarks.harness import call, report, time_calls
+
+
+def make_orders(count: int, items: int = 3) -> list:
+    now = datetime(2026, 1, 1, 12, 0, 0)
+    return [
+        Order(
+            id=n, user_id=42, status="paid", total_cents=1999 * items, currency="USD", notes=None,
+            created_at=now, updated_at=now,
+            items=[OrderItem(id=n * 10 + i, order_id=n, product_id=i, quantity=1, price_cents=1999) for i in range(items)],
+        )
+        for n in range(1, count + 1)
+    ]
+
+
+def as_rows(orders: list) -> tuple:
+    """The row tuples the read paths get for ``orders`` (ORDER_COLUMNS, ITEM_COLUMNS)."""
+    order_rows = [
+        (o.id, o.user_id, o.status, o.total_cents, o.currency, o.notes, o.created_at, o.updated_at) for o in orders
+    ]
+    item_rows = [(i.order_id, i.id, i.product_id, i.quantity, i.price_cents) for o in orders for i in o.items]
+    return order_rows, item_rows
+
+
+def run(orders: int, iterations: int) -> dict:
+    page = {"items": make_orders(orders), "next_cursor": None}
+    page_rows = as_rows(page["items"])
+    one_rows = as_rows(page["items"][:1])
+    page_field = create_model_field(name="response", type_=OrderPage, mode="serialization")
+    one = page["items"][0]
+    one_field = create_model_field(name="response", type_=OrderResponse, mode="serialization")
+
+    def fastapi_path(field, content):
+        # What a route with response_model does: validate, serialize, render
+        JSONResponse(call(serialize_response(field=field, response_content=content)))
+
+    return {
+        "serialize.order_response_model": time_calls(lambda: fastapi_path(one_field, one), iterations),
+        "serialize.order_orjson_document": time_calls(
+            lambda: orjson.dumps(OrderResponse.model_validate(one).model_dump(mode="json")), iterations),
+        "serialize.order_row_document": time_calls(lambda: orjson.dumps(documents.assemble(*one_rows)[0]), iterations),
+        f"serialize.page{orders}_response_model": time_calls(lambda: fastapi_path(page_field, page), iterations),
+        f"serialize.page{orders}_row_documents": time_calls(
+            lambda: ORJSONResponse({"items": documents.assemble(*page_rows), "next_cursor": None}), iterations),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Response serialization micro-benchmark")
+    parser.add_argument("--orders", type=int, default=100, help="orders per list page")
+    parser.add_argument("--iterations", type=int, default=500)
+    args = parser.parse_args()
+    report(run(args.orders, args.iterations))
@@ -0,0 +1,106 @@
+# ============================================================
+# Order Service – Benchmark Harness
+# Latency samples -> throughput and p50/p95/p99, written as
+# JSON and compared against a stored baseline. Shared by the
+# micro-benchmarks and the load generator (benchmarks.run).
+# ============================================================
+import json
+import platform
+import time
+from datetime import datetime, timezone
+from typing import Callable, Optional
+
+
+def percentile(samples: list, q: float) -> float:
+    """Nearest-rank percentile of ``samples`` (0 < q <= 100)."""
+    ordered = sorted(samples)
+    return ordered[max(0, min(len(ordered) - 1, int(round(q / 100 * len(ordered))) - 1))]
+
+
+def summarize(samples: list, elapsed: float, errors: int = 0) -> dict:
+    """One result: ``samples`` are per-operation latencies in seconds over ``elapsed`` wall seconds."""
+    if not samples:
+        return {"count": 0, "errors": errors, "throughput": 0.0, "p50_ms": 0.0, "p95_ms": 0.0, "p99_ms": 0.0}
+    return {
+        "count": len(samples),
+        "errors": errors,
+        "throughput": round(len(samples) / elapsed, 1),
+        "p50_ms": round(percentile(samples, 50) * 1000, 4),
+        "p95_ms": round(percentile(samples, 95) * 1000, 4),
+        "p99_ms": round(percentile(samples, 99) * 1000, 4),
+    }
+
+
+def call(coro):
+    """Drive a coroutine that never suspends, without event-loop overhead."""
+    try:
+        coro.send(None)
+    except StopIteration as done:
+        return done.value
+    raise RuntimeError("coroutine suspended")
+
+
+def time_calls(fn: Callable[[], object], iterations: int, warmup: int = 100) -> dict:
+    """Call ``fn`` ``iterations`` times, timing each call."""
+    for _ in range(warmup):
+        fn()
+    samples = [0.0] * iterations
+    clock = time.perf_counter
+    start = clock()
+    for i in range(iterations):
+        t0 = clock()
+        fn()
+        samples[i] = clock() - t0
+    return summarize(samples, clock() - start)
+
+
+def document(suite: str, results: dict, params: Optional[dict] = None) -> dict:
+    return {
+        "suite": suite,
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "params": params or {},
+        "results": results,
+    }
+
+
+def write(path: str, doc: dict):
+    with open(path, "w") as f:
+        json.dump(doc, f, indent=2, sort_keys=True)
+        f.write("\n")
+
+
+def load(path: str) -> dict:
+    with open(path) as f:
+        return json.load(f)
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    """
+    Regressions of ``results`` against ``baseline`` results: throughput down
+    or p95 up by more than ``tolerance`` (a fraction). Results missing from
+    either side are skipped.
+    """
+    regressions = []
+    for name, current in results.items():
+        before = baseline.get(name)
+        if not before or not before.get("count") or not current.get("count"):
+            continue
+        if current["throughput"] < before["throughput"] * (1 - tolerance):
+            regressions.append(f"{name}: throughput {before['throughput']} -> {current['throughput']} ops/s")
+        if current["p95_ms"] > before["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{name}: p95 {before['p95_ms']} -> {current['p95_ms']} ms")
+    return regressions
+
+
+def report(results: dict, baseline: Optional[dict] = None):
+    """Print one line per result, with the throughput change against ``baseline`` if given."""
+    print(f"{'benchmark':<44} {'ops/s':>11} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7}")
+    for name, r in results.items():
+        line = (f"{name:<44} {r['throughput']:>11.1f} {r['p50_ms']:>9.3f} {r['p95_ms']:>9.3f} "
+                f"{r['p99_ms']:>9.3f} {r['errors']:>7}")
+        before = (baseline or {}).get(name)
+        if before and before.get("throughput"):
+            line += f"  ({(r['throughput'] / before['throughput'] - 1) * 100:+.1f}% vs baseline)"
+        print(line)
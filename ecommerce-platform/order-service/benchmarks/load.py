@@ -0,0 +1,122 @@
+# ============================================================
+# Order Service – HTTP Load Generator
+# Virtual users loop over a scenario against running services
+# for a fixed duration; every request's latency is recorded
+# per operation (e.g. "orders.create").
+#
+#   docker compose --profile bench up -d --build
+#   python -m benchmarks.load --scenario orders --users 32 --duration 30
+# ============================================================
+import argparse
+import asyncio
+import random
+import time
+import uuid
+from collections import defaultdict
+
+import httpx
+from jose import jwt
+
+from app.config import settings
+from benchmarks.harness import report, summarize
+
+
+class Recorder:
+    """Latency samples and error counts per operation."""
+
+    def __init__(self):
+        self.samples = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    async def request(self, client: httpx.AsyncClient, operation: str, method: str, url: str, **kwargs):
+        start = time.perf_counter()
+        try:
+            response = await client.request(method, url, **kwargs)
+        except httpx.HTTPError:
+            self.errors[operation] += 1
+            return None
+        if response.status_code >= 400:
+            self.errors[operation] += 1
+            return None
+        self.samples[operation].append(time.perf_counter() - start)
+        return response
+
+    def results(self, elapsed: float) -> dict:
+        return {
+            operation: summarize(self.samples[operation], elapsed, self.errors[operation])
+            for operation in sorted(set(self.samples) | set(self.errors))
+        }
+
+
+def auth_headers(user_id: int) -> dict:
+    token = jwt.encode({"id": user_id, "email": f"load{user_id}@example.com"}, settings.JWT_SECRET, algorithm="HS256")
+    return {"Authorization": f"Bearer {token}"}
+
+
+async def orders_flow(client: httpx.AsyncClient, recorder: Recorder, user_id: int):
+    """Create an order, list the first page of orders, read the new order back."""
+    headers = auth_headers(user_id)
+    order = {"items": [{"product_id": random.randint(1, 500), "quantity": random.randint(1, 3), "price": 19.99}]}
+    created = await recorder.request(
+        client, "orders.create", "POST", "/api/orders/",
+        json=order, headers={**headers, "Idempotency-Key": uuid.uuid4().hex},
+    )
+    await recorder.request(client, "orders.list", "GET", "/api/orders/", params={"limit": 20}, headers=headers)
+    if created is not None:
+        await recorder.request(client, "orders.get", "GET", f"/api/orders/{created.json()['id']}", headers=headers)
+
+
+async def payments_flow(client: httpx.AsyncClient, recorder: Recorder, user_id: int):
+    """Create a payment, read it back, list the payments of its order."""
+    headers = auth_headers(user_id)
+    order_id = random.randint(1, 10 ** 9)
+    created = await recorder.request(
+        client, "payments.create", "POST", "/api/payments/",
+        json={"order_id": order_id, "amount": "19.99", "user_id": user_id},
+        headers={"Idempotency-Key": uuid.uuid4().hex},
+    )
+    if created is not None:
+        await recorder.request(client, "payments.get", "GET", f"/api/payments/{created.json()['id']}", headers=headers)
+    await recorder.request(client, "payments.by_order", "GET", f"/api/payments/order/{order_id}", headers=headers)
+
+
+SCENARIOS = {"orders": orders_flow, "payments": payments_flow}
+
+
+async def run_scenario(name: str, base_url: str, users: int, duration: float,
+                       transport: httpx.AsyncBaseTransport = None) -> dict:
+    """Run ``users`` concurrent virtual users of scenario ``name`` for ``duration`` seconds."""
+    flow = SCENARIOS[name]
+    recorder = Recorder()
+    limits = httpx.Limits(max_connections=users, max_keepalive_connections=users)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30, transport=transport) as client:
+        deadline = time.perf_counter() + duration
+
+        async def virtual_user(user_id: int):
+            while time.perf_counter() < deadline:
+                await flow(client, recorder, user_id)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(virtual_user(1_000_000 + n) for n in range(users)))
+        elapsed = time.perf_counter() - start
+    return recorder.results(elapsed)
+
+
+async def run(scenarios: list, order_url: str, payment_url: str, users: int, duration: float) -> dict:
+    urls = {"orders": order_url, "payments": payment_url}
+    results = {}
+    for name in scenarios:
+        results.update(await run_scenario(name, urls[name], users, duration))
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="HTTP load generator for order/payment flows")
+    parser.add_argument("--scenario", choices=[*SCENARIOS, "all"], default="all")
+    parser.add_argument("--order-url", default="http://localhost:8001")
+    parser.add_argument("--payment-url", default="http://localhost:8002")
+    parser.add_argument("--users", type=int, default=32, help="concurrent virtual users")
+    parser.add_argument("--duration", type=float, default=30, help="seconds per scenario")
+    args = parser.parse_args()
+    scenarios = list(SCENARIOS) if args.scenario == "all" else [args.scenario]
+    report(asyncio.run(run(scenarios, args.order_url, args.payment_url, args.users, args.duration)))
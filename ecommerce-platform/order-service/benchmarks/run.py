@@ -0,0 +1,77 @@
+# ============================================================
+# Order Service – Benchmark Runner
+# Runs a suite, prints throughput and p50/p95/p99 per result,
+# writes them as JSON and fails on regressions against a
+# stored baseline.
+#
+#   python -m benchmarks.run micro --output micro.json --baseline benchmarks/baseline-micro.json
+#   python -m benchmarks.run load --users 32 --duration 30 --output load.json
+#   python -m benchmarks.run micro --save-baseline benchmarks/baseline-micro.json
+#
+# micro: get_current_user, response serialization and
+#        publish_message (stub exchange); in-process.
+# load:  order/payment HTTP flows against running services
+#        (docker compose --profile bench).
+# ============================================================
+import argparse
+import asyncio
+import sys
+
+from benchmarks import bench_auth, bench_publish, bench_serialization, harness, load
+
+
+def run_micro(args) -> dict:
+    results = {}
+    results.update(bench_auth.run(args.iterations))
+    results.update(bench_serialization.run(orders=100, iterations=max(1, args.iterations // 40)))
+    results.update(bench_publish.run(messages=args.iterations, producers=50))
+    return results
+
+
+def run_load(args) -> dict:
+    scenarios = list(load.SCENARIOS) if args.scenario == "all" else [args.scenario]
+    return asyncio.run(load.run(scenarios, args.order_url, args.payment_url, args.users, args.duration))
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Run a benchmark suite and compare it with a baseline")
+    parser.add_argument("suite", choices=["micro", "load"])
+    parser.add_argument("--output", help="write results as JSON to this file")
+    parser.add_argument("--baseline", help="baseline JSON to compare with")
+    parser.add_argument("--save-baseline", help="write results as the new baseline to this file")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="allowed throughput drop / p95 increase against the baseline (fraction)")
+    parser.add_argument("--iterations", type=int, default=20000, help="micro: calls per benchmark")
+    parser.add_argument("--scenario", choices=[*load.SCENARIOS, "all"], default="all")
+    parser.add_argument("--order-url", default="http://localhost:8001")
+    parser.add_argument("--payment-url", default="http://localhost:8002")
+    parser.add_argument("--users", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=30)
+    args = parser.parse_args(argv)
+
+    if args.suite == "micro":
+        results = run_micro(args)
+        params = {"iterations": args.iterations}
+    else:
+        results = run_load(args)
+        params = {"scenario": args.scenario, "users": args.users, "duration": args.duration}
+    doc = harness.document(args.suite, results, params)
+
+    baseline = harness.load(args.baseline)["results"] if args.baseline else None
+    harness.report(results, baseline)
+    if args.output:
+        harness.write(args.output, doc)
+    if args.save_baseline:
+        harness.write(args.save_baseline, doc)
+
+    if baseline is not None:
+        regressions = harness.compare(results, baseline, args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,65 @@
+# ============================================================
+# Order Service – Alembic Environment
+# Runs migrations over the async engine. On Postgres an
+# advisory lock serialises concurrent runs (e.g. a migration
+# Job retried while a previous run still holds the lock).
+# Databases created by the old startup create_all (orders
+# but no alembic_version) are stamped at the 0001 baseline.
+# ============================================================
+import asyncio
+from logging.config import fileConfig
+
+from alembic import context
+from alembic.script import ScriptDirectory
+from sqlalchemy import inspect, pool, text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.config import settings
+from app.models import Base
+
+config = context.config
+if config.config_file_name is not None:
+    fileConfig(config.config_file_name, disable_existing_loggers=False)
+
+target_metadata = Base.metadata
+
+BASELINE_REVISION = "0001"
+BASELINE_TABLE = "orders"
+
+
+def database_url() -> str:
+    # Tests point migrations at SQLite through the Alembic config
+    return config.get_main_option("sqlalchemy.url") or settings.database_url
+
+
+def run_migrations_offline():
+    """Emit the SQL to stdout (alembic upgrade head --sql) instead of running it."""
+    context.configure(url=database_url(), target_metadata=target_metadata, literal_binds=True)
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def do_run_migrations(connection):
+    if connection.dialect.name == "postgresql":
+        connection.execute(text("SELECT pg_advisory_lock(hashtext('orders_schema'))"))
+        connection.commit()
+    context.configure(connection=connection, target_metadata=target_metadata)
+    with context.begin_transaction():
+        tables = inspect(connection).get_table_names()
+        if BASELINE_TABLE in tables and "alembic_version" not in tables:
+            # Created by create_all before migrations existed: already at the baseline
+            context.get_context().stamp(ScriptDirectory.from_config(config), BASELINE_REVISION)
+        context.run_migrations()
+
+
+async def run_migrations_online():
+    engine = create_async_engine(database_url(), poolclass=pool.NullPool)
+    async with engine.connect() as connection:
+        await connection.run_sync(do_run_migrations)
+    await engine.dispose()
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    asyncio.run(run_migrations_online())
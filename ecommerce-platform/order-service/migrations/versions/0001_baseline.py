@@ -0,0 +1,46 @@
+"""Baseline: orders and order_items as first created by create_all
+
+Databases that were created by the old startup create_all are already at
+this revision; env.py stamps them with it before upgrading.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "orders",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("status", sa.String(50)),
+        sa.Column("total", sa.Float()),
+        sa.Column("notes", sa.Text(), nullable=True),
+        sa.Column("created_at", sa.DateTime()),
+        sa.Column("updated_at", sa.DateTime()),
+    )
+    op.create_index("ix_orders_id", "orders", ["id"])
+    op.create_index("ix_orders_user_id", "orders", ["user_id"])
+
+    op.create_table(
+        "order_items",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("order_id", sa.Integer(), sa.ForeignKey("orders.id"), nullable=False),
+        sa.Column("product_id", sa.Integer(), nullable=False),
+        sa.Column("quantity", sa.Integer()),
+        sa.Column("price", sa.Float(), nullable=False),
+    )
+    op.create_index("ix_order_items_id", "order_items", ["id"])
+
+
+def downgrade():
+    op.drop_table("order_items")
+    op.drop_table("orders")
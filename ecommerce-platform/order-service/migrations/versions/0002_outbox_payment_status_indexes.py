@@ -0,0 +1,45 @@
+"""Outbox table, orders.payment_status_at and lookup indexes
+
+Indexes are built CONCURRENTLY on Postgres so existing tables stay
+writable while they build.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column("orders", sa.Column("payment_status_at", sa.DateTime(), nullable=True))
+    op.create_table(
+        "outbox",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("routing_key", sa.String(100), nullable=False),
+        sa.Column("payload", sa.JSON(), nullable=False),
+        sa.Column("created_at", sa.DateTime()),
+    )
+
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_orders_user_id_created_at_id", "orders",
+            ["user_id", sa.text("created_at DESC"), sa.text("id DESC")],
+            postgresql_concurrently=True,
+        )
+        op.create_index("ix_order_items_order_id", "order_items", ["order_id"], postgresql_concurrently=True)
+        # Covered by the leading column of ix_orders_user_id_created_at_id
+        op.drop_index("ix_orders_user_id", "orders", postgresql_concurrently=True)
+
+
+def downgrade():
+    op.create_index("ix_orders_user_id", "orders", ["user_id"])
+    op.drop_index("ix_order_items_order_id", "order_items")
+    op.drop_index("ix_orders_user_id_created_at_id", "orders")
+    op.drop_table("outbox")
+    op.drop_column("orders", "payment_status_at")
@@ -0,0 +1,46 @@
+"""Store money as integer minor units with a currency
+
+Converts orders.total and order_items.price (float) to total_cents and
+price_cents (BIGINT), rounding existing values to the nearest cent.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column("orders", sa.Column("total_cents", sa.BigInteger(), nullable=True))
+    op.add_column("orders", sa.Column("currency", sa.String(3), nullable=False, server_default="USD"))
+    op.add_column("order_items", sa.Column("price_cents", sa.BigInteger(), nullable=True))
+
+    op.execute("UPDATE orders SET total_cents = CAST(ROUND(COALESCE(total, 0) * 100) AS BIGINT)")
+    op.execute("UPDATE order_items SET price_cents = CAST(ROUND(price * 100) AS BIGINT)")
+
+    with op.batch_alter_table("orders") as batch:
+        batch.alter_column("total_cents", existing_type=sa.BigInteger(), nullable=False)
+        batch.drop_column("total")
+    with op.batch_alter_table("order_items") as batch:
+        batch.alter_column("price_cents", existing_type=sa.BigInteger(), nullable=False)
+        batch.drop_column("price")
+
+
+def downgrade():
+    op.add_column("orders", sa.Column("total", sa.Float(), nullable=True))
+    op.add_column("order_items", sa.Column("price", sa.Float(), nullable=True))
+    op.execute("UPDATE orders SET total = total_cents / 100.0")
+    op.execute("UPDATE order_items SET price = price_cents / 100.0")
+
+    with op.batch_alter_table("order_items") as batch:
+        batch.alter_column("price", existing_type=sa.Float(), nullable=False)
+        batch.drop_column("price_cents")
+    with op.batch_alter_table("orders") as batch:
+        batch.drop_column("currency")
+        batch.drop_column("total_cents")
@@ -0,0 +1,53 @@
+"""order_rollups table, backfilled from existing orders
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+BACKFILL = {
+    "postgresql": """
+        INSERT INTO order_rollups (user_id, day, status, currency, week, month, order_count, total_cents)
+        SELECT user_id, CAST(created_at AS DATE), COALESCE(status, 'pending'), currency,
+               CAST(date_trunc('week', created_at) AS DATE), CAST(date_trunc('month', created_at) AS DATE),
+               COUNT(*), SUM(total_cents)
+        FROM orders
+        WHERE created_at IS NOT NULL
+        GROUP BY 1, 2, 3, 4, 5, 6
+    """,
+    "sqlite": """
+        INSERT INTO order_rollups (user_id, day, status, currency, week, month, order_count, total_cents)
+        SELECT user_id, date(created_at), COALESCE(status, 'pending'), currency,
+               date(created_at, 'weekday 0', '-6 days'), date(created_at, 'start of month'),
+               COUNT(*), SUM(total_cents)
+        FROM orders
+        WHERE created_at IS NOT NULL
+        GROUP BY 1, 2, 3, 4, 5, 6
+    """,
+}
+
+
+def upgrade():
+    op.create_table(
+        "order_rollups",
+        sa.Column("user_id", sa.Integer(), primary_key=True),
+        sa.Column("day", sa.Date(), primary_key=True),
+        sa.Column("status", sa.String(50), primary_key=True),
+        sa.Column("currency", sa.String(3), primary_key=True),
+        sa.Column("week", sa.Date(), nullable=False),
+        sa.Column("month", sa.Date(), nullable=False),
+        sa.Column("order_count", sa.Integer(), nullable=False),
+        sa.Column("total_cents", sa.BigInteger(), nullable=False),
+    )
+    op.execute(BACKFILL[op.get_context().dialect.name])
+
+
+def downgrade():
+    op.drop_table("order_rollups")
@@ -0,0 +1,21 @@
+"""outbox.trace_context: trace context of the request that staged an event
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0006"
+down_revision = "0005"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column("outbox", sa.Column("trace_context", sa.JSON(), nullable=True))
+
+
+def downgrade():
+    op.drop_column("outbox", "trace_context")
@@ -0,0 +1,140 @@
+"""Monthly range partitions of orders and order_items, orders_archive
+
+order_items gets its order's created_at, created_at becomes NOT NULL on
+both, and orders_archive holds orders moved out by the archival job.
+
+On Postgres orders and order_items are rebuilt as tables partitioned by
+RANGE (created_at), one partition per month from the oldest order up to
+PARTITION_PREMAKE_MONTHS ahead (app/partitions.py keeps creating them)
+plus a DEFAULT partition for rows beyond them, with primary keys (id, created_at) and order_items referencing orders on
+(order_id, created_at). Rows are copied into the new tables, so run it in
+a maintenance window on large databases.
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-17
+"""
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.config import settings
+
+revision = "0007"
+down_revision = "0006"
+branch_labels = None
+depends_on = None
+
+PARTITIONED = ("orders", "order_items")
+
+
+def _month_start(moment: datetime, months: int = 0) -> datetime:
+    index = moment.year * 12 + moment.month - 1 + months
+    return datetime(index // 12, index % 12 + 1, 1)
+
+
+def _partition():
+    bind = op.get_bind()
+    for table in PARTITIONED:
+        op.execute(f"ALTER TABLE {table} RENAME TO {table}_unpartitioned")
+        op.execute(
+            f"CREATE TABLE {table} (LIKE {table}_unpartitioned INCLUDING DEFAULTS) PARTITION BY RANGE (created_at)"
+        )
+
+    # One partition per month from the oldest order to PARTITION_PREMAKE_MONTHS ahead
+    now = datetime.utcnow()
+    oldest = bind.execute(sa.text("SELECT min(created_at) FROM orders_unpartitioned")).scalar() or now
+    start, last = _month_start(min(oldest, now)), _month_start(now, settings.PARTITION_PREMAKE_MONTHS)
+    while start <= last:
+        end = _month_start(start, 1)
+        for table in PARTITIONED:
+            op.execute(
+                f"CREATE TABLE {table}_y{start.year}m{start.month:02d} PARTITION OF {table} "
+                f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+            )
+        start = end
+    # Rows past the newest partition land here rather than fail if maintenance stalls
+    for table in PARTITIONED:
+        op.execute(f"CREATE TABLE {table}_default PARTITION OF {table} DEFAULT")
+
+    for table in PARTITIONED:
+        op.execute(f"INSERT INTO {table} SELECT * FROM {table}_unpartitioned")
+        # The id sequences would go with the old tables
+        op.execute(f"ALTER SEQUENCE {table}_id_seq OWNED BY {table}.id")
+    op.execute("DROP TABLE order_items_unpartitioned")
+    op.execute("DROP TABLE orders_unpartitioned")
+
+    # Constraint and index names are free again once the old tables are gone
+    for table in PARTITIONED:
+        op.execute(f"ALTER TABLE {table} ADD PRIMARY KEY (id, created_at)")
+    op.create_index("ix_orders_id", "orders", ["id"])
+    op.create_index("ix_orders_user_id_created_at_id", "orders", ["user_id", sa.text("created_at DESC"), sa.text("id DESC")])
+    op.create_index("ix_order_items_id", "order_items", ["id"])
+    op.create_index("ix_order_items_order_id", "order_items", ["order_id"])
+    op.create_foreign_key(
+        "order_items_order_id_fkey", "order_items", "orders", ["order_id", "created_at"], ["id", "created_at"],
+    )
+
+
+def _unpartition():
+    for table in PARTITIONED:
+        op.execute(f"ALTER TABLE {table} RENAME TO {table}_partitioned")
+        op.execute(f"CREATE TABLE {table} (LIKE {table}_partitioned INCLUDING DEFAULTS)")
+        op.execute(f"INSERT INTO {table} SELECT * FROM {table}_partitioned")
+        op.execute(f"ALTER SEQUENCE {table}_id_seq OWNED BY {table}.id")
+    op.execute("DROP TABLE order_items_partitioned")
+    op.execute("DROP TABLE orders_partitioned")
+
+    for table in PARTITIONED:
+        op.execute(f"ALTER TABLE {table} ADD PRIMARY KEY (id)")
+
+    op.create_index("ix_orders_id", "orders", ["id"])
+    op.create_index("ix_orders_user_id_created_at_id", "orders", ["user_id", sa.text("created_at DESC"), sa.text("id DESC")])
+    op.create_index("ix_order_items_id", "order_items", ["id"])
+    op.create_index("ix_order_items_order_id", "order_items", ["order_id"])
+    op.create_foreign_key("order_items_order_id_fkey", "order_items", "orders", ["order_id"], ["id"])
+
+
+def upgrade():
+    op.execute(
+        sa.text("UPDATE orders SET created_at = :now WHERE created_at IS NULL").bindparams(now=datetime.utcnow())
+    )
+    op.add_column("order_items", sa.Column("created_at", sa.DateTime(), nullable=True))
+    op.execute(
+        "UPDATE order_items SET created_at = (SELECT orders.created_at FROM orders WHERE orders.id = order_items.order_id)"
+    )
+    with op.batch_alter_table("orders") as batch:
+        batch.alter_column("created_at", existing_type=sa.DateTime(), nullable=False)
+    with op.batch_alter_table("order_items") as batch:
+        batch.alter_column("created_at", existing_type=sa.DateTime(), nullable=False)
+
+    op.create_table(
+        "orders_archive",
+        sa.Column("id", sa.Integer(), primary_key=True, autoincrement=False),
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.Column("document", sa.LargeBinary(), nullable=False),
+    )
+    op.create_index(
+        "ix_orders_archive_user_id_created_at_id", "orders_archive",
+        ["user_id", sa.text("created_at DESC"), sa.text("id DESC")],
+    )
+
+    if op.get_bind().dialect.name == "postgresql":
+        _partition()
+
+
+def downgrade():
+    bind = op.get_bind()
+    if bind.execute(sa.text("SELECT count(*) FROM orders_archive")).scalar():
+        raise RuntimeError("orders_archive is not empty: archived orders would be lost")
+    if bind.dialect.name == "postgresql":
+        _unpartition()
+
+    op.drop_index("ix_orders_archive_user_id_created_at_id", table_name="orders_archive")
+    op.drop_table("orders_archive")
+    with op.batch_alter_table("orders") as batch:
+        batch.alter_column("created_at", existing_type=sa.DateTime(), nullable=True)
+    with op.batch_alter_table("order_items") as batch:
+        batch.drop_column("created_at")
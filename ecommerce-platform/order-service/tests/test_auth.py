@@ -0,0 +1,62 @@
+# ============================================================
+# Order Service – Auth Dependency Tests
+# Covers the verified-token cache in get_current_user.
+# ============================================================
+import asyncio
+import time
+
+import pytest
+from fastapi import HTTPException
+from fastapi.security import HTTPAuthorizationCredentials
+from jose import jwt
+
+from app import auth
+from app.auth import TokenCache, get_current_user
+from app.config import settings
+
+
+def bearer(claims: dict) -> HTTPAuthorizationCredentials:
+    token = jwt.encode(claims, settings.JWT_SECRET, algorithm="HS256")
+    return HTTPAuthorizationCredentials(scheme="Bearer", credentials=token)
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    cache = TokenCache(maxsize=2, ttl=60)
+    monkeypatch.setattr(auth, "token_cache", cache)
+    return cache
+
+
+def test_verified_tokens_are_cached(cache):
+    credentials = bearer({"id": 1, "exp": int(time.time()) + 60})
+    first = asyncio.run(get_current_user(credentials))
+    second = asyncio.run(get_current_user(credentials))
+    assert first == second
+    assert cache.stats() == {"size": 1, "hits": 1, "misses": 1, "rejects": 0}
+
+
+def test_cached_entry_never_outlives_exp(cache):
+    token = "cached-token"
+    cache.put(token, {"id": 1, "exp": time.time() - 1})
+    assert cache.get(token) is None
+
+
+def test_invalid_tokens_are_rejected_and_counted(cache):
+    credentials = HTTPAuthorizationCredentials(scheme="Bearer", credentials="not.a.jwt")
+    with pytest.raises(HTTPException) as exc:
+        asyncio.run(get_current_user(credentials))
+    assert exc.value.status_code == 401
+
+    with pytest.raises(HTTPException):
+        asyncio.run(get_current_user(bearer({"email": "no-id@example.com"})))
+    assert cache.rejects == 2
+    assert cache.stats()["size"] == 0
+
+
+def test_cache_is_bounded_lru(cache):
+    cache.put("a", {"id": 1})
+    cache.put("b", {"id": 2})
+    cache.get("a")
+    cache.put("c", {"id": 3})
+    assert cache.get("b") is None
+    assert cache.get("a") == {"id": 1}
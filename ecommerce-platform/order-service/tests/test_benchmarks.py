@@ -0,0 +1,21 @@
+# ============================================================
+# Order Service – Benchmark Harness Tests
+# ============================================================
+from benchmarks import harness
+
+
+def test_summarize_reports_throughput_and_percentiles():
+    result = harness.summarize([i / 1000 for i in range(1, 101)], elapsed=2.0, errors=1)
+    assert (result["count"], result["errors"], result["throughput"]) == (100, 1, 50.0)
+    assert (result["p50_ms"], result["p95_ms"], result["p99_ms"]) == (50.0, 95.0, 99.0)
+
+
+def test_compare_flags_throughput_and_p95_regressions_beyond_tolerance():
+    baseline = {"a": {"count": 1, "throughput": 100.0, "p95_ms": 10.0}, "b": {"count": 1, "throughput": 100.0, "p95_ms": 10.0}}
+    results = {
+        "a": {"count": 1, "throughput": 85.0, "p95_ms": 11.0},  # within 20%
+        "b": {"count": 1, "throughput": 70.0, "p95_ms": 13.0},
+        "new": {"count": 1, "throughput": 1.0, "p95_ms": 1.0},
+    }
+    regressions = harness.compare(results, baseline, tolerance=0.2)
+    assert len(regressions) == 2 and all(r.startswith("b:") for r in regressions)
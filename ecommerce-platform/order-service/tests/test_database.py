@@ -0,0 +1,115 @@
+# ============================================================
+# Order Service – Engine & Pool Configuration Tests
+# ============================================================
+import asyncio
+
+import pytest
+from prometheus_client import REGISTRY
+from sqlalchemy import column, exc, insert, table, text
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import NullPool, StaticPool
+
+from app import cache, database
+from app.config import settings
+from app.database import ReadSessionLocal, ReplicaSet, engine_options
+from app.metrics import TimedQueuePool
+
+
+def test_queue_pool_options_follow_settings(monkeypatch):
+    monkeypatch.setattr(settings, "DB_POOL_SIZE", 3)
+    monkeypatch.setattr(settings, "DB_MAX_OVERFLOW", 1)
+    options = engine_options()
+    assert options["poolclass"] is TimedQueuePool
+    assert (options["pool_size"], options["max_overflow"]) == (3, 1)
+    assert options["pool_pre_ping"] is False
+    assert "connect_args" not in options
+
+
+def test_pgbouncer_mode_disables_prepared_statement_reuse(monkeypatch):
+    monkeypatch.setattr(settings, "DB_POOL_CLASS", "null")
+    monkeypatch.setattr(settings, "DB_PGBOUNCER", True)
+    options = engine_options()
+    assert options["poolclass"] is NullPool
+    assert "pool_size" not in options
+    connect_args = options["connect_args"]
+    assert connect_args["statement_cache_size"] == 0
+    assert connect_args["prepared_statement_cache_size"] == 0
+    assert connect_args["prepared_statement_name_func"]() != connect_args["prepared_statement_name_func"]()
+
+
+def test_timed_pool_counts_checkout_timeouts():
+    engine = create_async_engine(
+        "sqlite+aiosqlite://", poolclass=TimedQueuePool, pool_size=1, max_overflow=0, pool_timeout=0.05,
+    )
+    before = REGISTRY.get_sample_value("db_pool_checkout_timeouts_total")
+
+    async def scenario():
+        async with engine.connect() as held:
+            await held.execute(text("SELECT 1"))
+            with pytest.raises(exc.TimeoutError):
+                async with engine.connect():
+                    pass
+        await engine.dispose()
+
+    asyncio.run(scenario())
+    assert REGISTRY.get_sample_value("db_pool_checkout_timeouts_total") == before + 1
+
+
+def test_replica_set_spreads_reads_over_replicas_within_lag():
+    replicas = ReplicaSet({"replica1": "r1", "replica2": "r2", "replica3": "r3"}, max_lag=2.0)
+    assert replicas.pick() is None  # nothing measured yet: read from the primary
+    replicas.lag.update(replica1=0.0, replica2=0.5, replica3=30.0)
+    assert [replicas.pick() for _ in range(4)] == ["r1", "r2", "r1", "r2"]
+    replicas.lag.update(replica1=None, replica2=2.5)
+    assert replicas.pick() is None
+
+
+def memory_engine():
+    return create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+
+
+@pytest.mark.asyncio
+async def test_read_session_reads_from_its_replica_and_flushes_to_the_primary():
+    primary, replica = memory_engine(), memory_engine()
+    for target, name in ((primary, "primary"), (replica, "replica")):
+        async with target.begin() as conn:
+            await conn.execute(text("CREATE TABLE origin (name TEXT)"))
+            await conn.execute(text("INSERT INTO origin VALUES (:name)"), {"name": name})
+
+    async with ReadSessionLocal(bind=primary) as db:
+        db.info["replica"] = replica
+        assert (await db.execute(text("SELECT name FROM origin"))).scalar() == "replica"
+        await db.execute(insert(table("origin", column("name"))).values(name="written"))
+        await db.commit()
+    async with primary.connect() as conn:
+        assert (await conn.execute(text("SELECT count(*) FROM origin"))).scalar() == 2
+    await primary.dispose()
+    await replica.dispose()
+
+
+@pytest.mark.asyncio
+async def test_users_read_their_own_writes_from_the_primary(monkeypatch):
+    import fakeredis.aioredis
+
+    replica = memory_engine()
+    replicas = ReplicaSet({"replica1": replica}, max_lag=2.0)
+    replicas.lag["replica1"] = 0.1
+    monkeypatch.setattr(database, "replicas", replicas)
+    monkeypatch.setattr(database, "_recent_writes", {})
+    monkeypatch.setattr(cache, "_redis", fakeredis.aioredis.FakeRedis())
+
+    async def read_bind(user_id: int):
+        sessions = database.get_read_db({"id": user_id})
+        db = await sessions.__anext__()
+        bind = db.info.get("replica")
+        await sessions.aclose()
+        return bind
+
+    await database.mark_write(5)
+    database._recent_writes.clear()  # the write was served by another worker
+    assert await read_bind(5) is None
+    assert await read_bind(6) is replica
+
+    replicas.lag["replica1"] = 10.0  # lagging: everyone reads from the primary
+    assert await read_bind(6) is None
+    await replica.dispose()
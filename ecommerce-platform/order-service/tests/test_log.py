@@ -0,0 +1,77 @@
+# ============================================================
+# Order Service – Structured Logging Tests
+# ============================================================
+import io
+import logging
+
+import orjson
+import pytest
+from fastapi.testclient import TestClient
+from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+
+from app import log, tracing
+from app.config import settings
+from app.main import app
+
+
+@pytest.fixture
+def json_logs(monkeypatch):
+    """Configure logging as a worker does and return a reader of the JSON lines written so far."""
+    root = logging.getLogger()
+    saved = root.handlers[:], root.level
+    monkeypatch.setattr(settings, "LOG_LEVELS", "app.messaging=WARNING,app.access=DEBUG")
+    stream = io.StringIO()
+    log.configure_logging(stream)
+
+    def read() -> list:
+        log.shutdown_logging()
+        return [orjson.loads(line) for line in stream.getvalue().splitlines()]
+
+    yield read
+    log.shutdown_logging()
+    root.handlers, root.level = saved
+    logging.getLogger("app.access").setLevel(logging.NOTSET)
+    logging.getLogger("app.messaging").setLevel(logging.NOTSET)
+
+
+def test_requests_are_logged_as_json_with_their_request_id(json_logs):
+    response = TestClient(app).get("/health", headers={"X-Request-ID": "req-123"})
+    assert response.headers["x-request-id"] == "req-123"
+    generated = TestClient(app).get("/api/orders/").headers["x-request-id"]
+
+    logging.getLogger("app.routes").warning("Payment initiation failed: %s", "boom", extra={"order_id": 7})
+    logging.getLogger("app.messaging").info("below its module level")
+
+    records = json_logs()
+    access = [r for r in records if r["logger"] == "app.access"]
+    assert access[0]["request_id"] == "req-123" and access[0]["status"] == 200 and access[0]["level"] == "debug"
+    assert access[1]["request_id"] == generated and access[1]["status"] == 403
+    warning = next(r for r in records if r["logger"] == "app.routes")
+    assert (warning["msg"], warning["order_id"], warning["service"]) == ("Payment initiation failed: boom", 7, "order-service")
+    assert "request_id" not in warning
+    assert not any(r["logger"] == "app.messaging" for r in records)
+
+
+def test_debug_records_are_sampled_per_logger():
+    sampler = log.DebugSampler(every=3)
+
+    def record(name, level=logging.DEBUG):
+        return logging.LogRecord(name, level, __file__, 0, "msg", None, None)
+
+    assert [sampler.filter(record("a")) for _ in range(6)] == [True, False, False, True, False, False]
+    assert sampler.filter(record("b"))
+    assert all(sampler.filter(record("a", logging.INFO)) for _ in range(3))
+
+
+def test_records_inside_a_sampled_span_carry_its_trace_id(json_logs):
+    tracing.configure_tracing(InMemorySpanExporter())
+    try:
+        with tracing.span("work") as current:
+            logging.getLogger("app.routes").warning("inside")
+        logging.getLogger("app.routes").warning("outside")
+    finally:
+        tracing.shutdown_tracing()
+
+    inside, outside = (r for r in json_logs() if r["logger"] == "app.routes")
+    assert inside["trace_id"] == format(current.get_span_context().trace_id, "032x")
+    assert "trace_id" not in outside
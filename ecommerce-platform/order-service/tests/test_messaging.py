@@ -0,0 +1,178 @@
+# ============================================================
+# Order Service – Publisher and Consumer Tests
+# Exercises BatchPublisher against an in-memory fake exchange
+# and BatchConsumer against fake deliveries.
+# ============================================================
+import asyncio
+
+import orjson
+import pytest
+
+from app.messaging import BatchConsumer, BatchPublisher
+
+
+class FakeExchange:
+    """Records publishes; the first ``fail_first`` calls raise like a nacked confirm."""
+
+    def __init__(self, fail_first: int = 0, delay: float = 0.0):
+        self.fail_first = fail_first
+        self.delay = delay
+        self.calls = 0
+        self.messages = []
+
+    async def publish(self, message, routing_key, timeout=None):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        if self.calls <= self.fail_first:
+            raise RuntimeError("nack")
+        self.messages.append((routing_key, orjson.loads(message.body)))
+
+
+def make_publisher(exchange, **overrides) -> BatchPublisher:
+    options = {"max_queue": 100, "batch_size": 10, "linger": 0.01, "max_retries": 2, "confirm_timeout": 1.0,
+               "publish_timeout": 5.0}
+    options.update(overrides)
+    publisher = BatchPublisher(exchange, **options)
+    publisher.start()
+    return publisher
+
+
+@pytest.mark.asyncio
+async def test_concurrent_publishes_are_batched_and_confirmed():
+    exchange = FakeExchange()
+    publisher = make_publisher(exchange)
+    results = await asyncio.gather(
+        *(publisher.publish("order.created", orjson.dumps({"order_id": n})) for n in range(25))
+    )
+    await publisher.stop()
+
+    assert all(results)
+    assert [data["order_id"] for _, data in exchange.messages] == list(range(25))
+    stats = publisher.stats()
+    assert stats["published"] == 25
+    assert stats["queue_depth"] == 0
+    assert publisher._batches == 3  # 10 + 10 + 5
+
+
+@pytest.mark.asyncio
+async def test_failed_publishes_are_retried_then_given_up():
+    publisher = make_publisher(FakeExchange(fail_first=1))
+    assert await publisher.publish("order.updated", b"{}") is True
+    assert publisher.retried == 1
+    await publisher.stop()
+
+    publisher = make_publisher(FakeExchange(fail_first=100), max_retries=1)
+    assert await publisher.publish("order.updated", b"{}") is False
+    assert publisher.stats()["failed"] == 1
+    await publisher.stop()
+
+
+@pytest.mark.asyncio
+async def test_full_queue_applies_backpressure():
+    publisher = make_publisher(FakeExchange(delay=0.05), max_queue=1, batch_size=1, linger=0)
+    first = asyncio.create_task(publisher.publish("a", b"{}"))
+    second = asyncio.create_task(publisher.publish("b", b"{}"))
+    third = asyncio.create_task(publisher.publish("c", b"{}"))
+    await asyncio.sleep(0.01)
+    # One message is in flight, one fills the queue, the third producer is blocked on put()
+    assert publisher.stats()["queue_depth"] == 1
+    assert await asyncio.gather(first, second, third) == [True, True, True]
+    await publisher.stop()
+
+
+@pytest.mark.asyncio
+async def test_a_bad_message_fails_alone_and_errors_do_not_stop_the_worker(monkeypatch):
+    exchange = FakeExchange()
+    publisher = make_publisher(exchange, max_retries=0)
+    good, bad = publisher.publish("a", b"{}"), publisher.publish("b", "not bytes")
+    assert await asyncio.gather(good, bad) == [True, False]
+    assert [routing_key for routing_key, _ in exchange.messages] == ["a"]
+
+    async def broken(batch):
+        raise RuntimeError("bug")
+
+    publish_batch = publisher._publish_batch
+    monkeypatch.setattr(publisher, "_publish_batch", broken)
+    assert await publisher.publish("c", b"{}") is False
+    monkeypatch.setattr(publisher, "_publish_batch", publish_batch)
+    assert await publisher.publish("d", b"{}") is True
+    assert publisher.stats()["failed"] == 2
+    await publisher.stop()
+
+
+@pytest.mark.asyncio
+async def test_publish_gives_up_waiting_after_the_publish_timeout():
+    publisher = make_publisher(FakeExchange(delay=0.2), publish_timeout=0.05)
+    assert await publisher.publish("a", b"{}") is False
+    assert publisher.stats()["timed_out"] == 1
+    await publisher.stop()
+
+
+class FakeMessage:
+    """An incoming delivery recording how it was settled; ``ack`` raises if ``broken``."""
+
+    def __init__(self, data, broken: bool = False):
+        self.body = orjson.dumps(data)
+        self.headers = {}
+        self.broken = broken
+        self.outcome = None
+
+    @property
+    def processed(self) -> bool:
+        return self.outcome is not None
+
+    async def ack(self):
+        if self.broken:
+            raise ConnectionError("channel closed")
+        self.outcome = "ack"
+
+    async def reject(self, requeue=False):
+        self.outcome = "requeue" if requeue else "dead-letter"
+
+
+def make_consumer(handler, **overrides) -> BatchConsumer:
+    options = {"prefetch_count": 10, "batch_size": 10, "window": 0.01, "max_attempts": 2}
+    options.update(overrides)
+    return BatchConsumer("test.queue", ["test"], dict, handler, **options)
+
+
+@pytest.mark.asyncio
+async def test_failing_batch_dead_letters_only_the_failing_events():
+    calls = []
+
+    async def handler(events):
+        calls.append(len(events))
+        if any(event.get("bad") for event in events):
+            raise RuntimeError("constraint violated")
+
+    consumer = make_consumer(handler)
+    messages = [FakeMessage({"n": 1}), FakeMessage({"n": 2, "bad": True}), FakeMessage({"n": 3})]
+    await consumer.process(messages)
+
+    assert [m.outcome for m in messages] == ["ack", "dead-letter", "ack"]
+    assert calls == [3, 3, 1, 1, 1]
+    assert (consumer.processed, consumer.dead_lettered) == (2, 1)
+
+
+@pytest.mark.asyncio
+async def test_consumer_keeps_running_after_a_batch_error():
+    handled = []
+
+    async def handler(events):
+        handled.extend(events)
+
+    consumer = make_consumer(handler, batch_size=1)
+    consumer._task = asyncio.create_task(consumer._run())
+    broken, healthy = FakeMessage({"n": 1}, broken=True), FakeMessage({"n": 2})
+    await consumer._buffer.put(broken)
+    await consumer._buffer.join()
+    await consumer._buffer.put(healthy)
+    await consumer._buffer.join()
+
+    assert consumer.stats()["running"] is True
+    assert (broken.outcome, healthy.outcome) == ("dead-letter", "ack")
+    assert handled == [{"n": 1}, {"n": 2}]
+    assert (consumer.processed, consumer.dead_lettered) == (1, 1)
+    consumer._task.cancel()
+    await asyncio.gather(consumer._task, return_exceptions=True)
+    assert consumer.stats()["running"] is False
@@ -0,0 +1,105 @@
+# ============================================================
+# Migration Tests
+# Upgrades an empty SQLite database to head and checks the
+# result matches models.py and the version startup expects.
+# ============================================================
+import asyncio
+import os
+
+import pytest
+from alembic import command
+from alembic.autogenerate import compare_metadata
+from alembic.config import Config
+from alembic.migration import MigrationContext
+from alembic.script import ScriptDirectory
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.database import SCHEMA_VERSION, check_schema_version
+from app.models import Base
+
+SERVICE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+URL = "sqlite+aiosqlite:///./test_migrations.db"
+
+
+def alembic_config() -> Config:
+    config = Config()
+    config.set_main_option("script_location", os.path.join(SERVICE_DIR, "migrations"))
+    config.set_main_option("sqlalchemy.url", URL)
+    return config
+
+
+@pytest.fixture
+def migrated():
+    if os.path.exists("test_migrations.db"):
+        os.remove("test_migrations.db")
+    command.upgrade(alembic_config(), "head")
+    yield create_async_engine(URL)
+    os.remove("test_migrations.db")
+
+
+def test_schema_version_is_migration_head():
+    assert ScriptDirectory.from_config(alembic_config()).get_current_head() == SCHEMA_VERSION
+
+
+def test_migrations_match_models(migrated):
+    def diff(connection):
+        return compare_metadata(MigrationContext.configure(connection), Base.metadata)
+
+    async def scenario():
+        async with migrated.connect() as conn:
+            return await conn.run_sync(diff)
+
+    assert asyncio.run(scenario()) == []
+
+
+def test_startup_check_rejects_unmigrated_database(migrated):
+    asyncio.run(check_schema_version(migrated))
+    command.downgrade(alembic_config(), "-1")
+    with pytest.raises(RuntimeError, match="run `alembic upgrade head`"):
+        asyncio.run(check_schema_version(migrated))
+
+
+def test_money_migration_converts_existing_rows():
+    if os.path.exists("test_migrations.db"):
+        os.remove("test_migrations.db")
+    command.upgrade(alembic_config(), "0002")
+    engine = create_async_engine(URL)
+
+    async def run(sql: str):
+        async with engine.begin() as conn:
+            result = await conn.execute(text(sql))
+            return result.all() if result.returns_rows else None
+
+    asyncio.run(run("INSERT INTO orders (id, user_id, total) VALUES (1, 1, 20.3)"))
+    asyncio.run(run("INSERT INTO order_items (order_id, product_id, quantity, price) VALUES (1, 1, 7, 2.9)"))
+    command.upgrade(alembic_config(), "head")
+    try:
+        assert asyncio.run(run("SELECT total_cents, currency FROM orders")) == [(2030, "USD")]
+        assert asyncio.run(run("SELECT price_cents FROM order_items")) == [(290,)]
+    finally:
+        asyncio.run(engine.dispose())
+        os.remove("test_migrations.db")
+
+
+def test_create_all_database_is_stamped_at_the_baseline():
+    if os.path.exists("test_migrations.db"):
+        os.remove("test_migrations.db")
+    command.upgrade(alembic_config(), "0001")
+    engine = create_async_engine(URL)
+
+    async def run(sql: str):
+        async with engine.begin() as conn:
+            result = await conn.execute(text(sql))
+            return result.all() if result.returns_rows else None
+
+    # As left by the old startup create_all: the baseline tables, no alembic_version
+    asyncio.run(run("DROP TABLE alembic_version"))
+    asyncio.run(run("INSERT INTO orders (id, user_id, total) VALUES (1, 1, 20.3)"))
+    command.upgrade(alembic_config(), "head")
+    try:
+        assert asyncio.run(run("SELECT version_num FROM alembic_version")) == [(SCHEMA_VERSION,)]
+        assert asyncio.run(run("SELECT total_cents FROM orders")) == [(2030,)]
+    finally:
+        asyncio.run(engine.dispose())
+        os.remove("test_migrations.db")
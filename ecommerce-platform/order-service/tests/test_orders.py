@@ -3,34 +3,52 @@
 # Uses SQLite in-memory DB to test without Postgres.
 # ============================================================
 import pytest
+import asyncio
 from fastapi.testclient import TestClient
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import NullPool
+from jose import jwt
 
 from app.models import Base
-from app.database import get_db
+from app.database import get_db, get_read_db
 from app.main import app
+from app import outbox
+from app.config import settings
+from app.metrics import instrument_engine
 
 # --- In-memory SQLite for CI ---
-SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
-engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
-TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+SQLALCHEMY_DATABASE_URL = "sqlite+aiosqlite:///./test.db"
+engine = create_async_engine(SQLALCHEMY_DATABASE_URL, poolclass=NullPool)
+TestingSessionLocal = async_sessionmaker(engine, expire_on_commit=False, autoflush=False)
+instrument_engine(engine, "test")
 
-Base.metadata.create_all(bind=engine)
 
+async def _create_tables():
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
 
-def override_get_db():
-    db = TestingSessionLocal()
-    try:
+
+asyncio.run(_create_tables())
+
+
+async def override_get_db():
+    async with TestingSessionLocal() as db:
         yield db
-    finally:
-        db.close()
 
 
 app.dependency_overrides[get_db] = override_get_db
+app.dependency_overrides[get_read_db] = override_get_db
+# Every test client shares one IP; tests/test_ratelimit.py turns limiting back on
+settings.RATE_LIMIT_ENABLED = False
 client = TestClient(app)
 
 
+def auth_headers(user_id: int = 1) -> dict:
+    token = jwt.encode({"id": user_id, "email": f"user{user_id}@example.com"}, settings.JWT_SECRET, algorithm="HS256")
+    return {"Authorization": f"Bearer {token}"}
+
+
 def test_health_check():
     """Health endpoint should return healthy status."""
     response = client.get("/health")
@@ -48,3 +66,405 @@ def test_list_orders_requires_auth():
     """Listing orders without a token should return 403."""
     response = client.get("/api/orders")
     assert response.status_code == 403
+
+
+def test_create_and_get_order():
+    """An authenticated user can create an order and read it back with its items."""
+    response = client.post("/api/orders/", headers=auth_headers(), json={
+        "items": [{"product_id": 1, "quantity": 2, "price": 5.0}, {"product_id": 2, "price": 3.5}],
+    })
+    assert response.status_code == 201
+    order = response.json()
+    assert order["total"] == 13.5
+    assert len(order["items"]) == 2
+
+    response = client.get(f"/api/orders/{order['id']}", headers=auth_headers())
+    assert response.status_code == 200
+    assert response.json()["items"] == order["items"]
+
+    # Other users must not see it
+    response = client.get(f"/api/orders/{order['id']}", headers=auth_headers(user_id=2))
+    assert response.status_code == 404
+
+
+def test_update_order_status():
+    """Updating an order returns the refreshed order with items loaded."""
+    order = client.post("/api/orders/", headers=auth_headers(), json={
+        "items": [{"product_id": 3, "price": 1.0}],
+    }).json()
+    response = client.put(f"/api/orders/{order['id']}", headers=auth_headers(), json={"status": "shipped"})
+    assert response.status_code == 200
+    assert response.json()["status"] == "shipped"
+    assert len(response.json()["items"]) == 1
+
+
+def test_ready_check():
+    """Readiness probe runs SELECT 1 through the async session and reports the payment circuit."""
+    response = client.get("/ready")
+    assert response.json()["status"] == "ready"
+    assert response.json()["payment_circuit"]["state"] == "closed"
+
+
+def test_list_orders_keyset_pagination():
+    """Listing pages through a user's orders newest-first without gaps or repeats."""
+    created = [
+        client.post("/api/orders/", headers=auth_headers(5), json={
+            "items": [{"product_id": n, "price": 1.0}],
+        }).json()["id"]
+        for n in range(5)
+    ]
+
+    seen, cursor = [], None
+    while True:
+        params = {"limit": 2, **({"after": cursor} if cursor else {})}
+        page = client.get("/api/orders/", headers=auth_headers(5), params=params).json()
+        assert len(page["items"]) <= 2
+        assert all(len(order["items"]) == 1 for order in page["items"])
+        seen.extend(order["id"] for order in page["items"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+
+    assert seen == sorted(created, reverse=True)
+
+
+def test_list_orders_rejects_bad_cursor():
+    response = client.get("/api/orders/", headers=auth_headers(), params={"after": "not-a-cursor"})
+    assert response.status_code == 400
+
+
+def test_create_order_writes_outbox_event_and_relay_drains_it(monkeypatch):
+    """order.created is committed with the order and published by the relay."""
+    published = []
+
+    async def fake_publish(routing_key, data, trace_context=None):
+        published.append((routing_key, data))
+        return True
+
+    monkeypatch.setattr(outbox, "SessionLocal", TestingSessionLocal)
+    monkeypatch.setattr(outbox, "publish_message", fake_publish)
+    asyncio.run(outbox.relay_batch(1000))  # drain events left by earlier tests
+    published.clear()
+
+    order = client.post("/api/orders/", headers=auth_headers(6), json={
+        "items": [{"product_id": 1, "quantity": 3, "price": 2.0}],
+    }).json()
+    assert asyncio.run(outbox.relay_batch(10)) == 1
+    assert published == [
+        ("order.created", {"order_id": order["id"], "user_id": 6, "total_cents": 600, "currency": "USD"}),
+    ]
+    assert asyncio.run(outbox.relay_batch(10)) == 0
+
+
+def test_outbox_keeps_events_when_publish_fails(monkeypatch):
+    async def broker_down(routing_key, data, trace_context=None):
+        return False
+
+    monkeypatch.setattr(outbox, "SessionLocal", TestingSessionLocal)
+    monkeypatch.setattr(outbox, "publish_message", broker_down)
+    client.post("/api/orders/", headers=auth_headers(6), json={"items": [{"product_id": 1, "price": 1.0}]})
+    assert asyncio.run(outbox.relay_batch(10)) == 0
+
+    async def broker_up(routing_key, data, trace_context=None):
+        return True
+
+    monkeypatch.setattr(outbox, "publish_message", broker_up)
+    assert asyncio.run(outbox.relay_batch(10)) >= 1
+
+
+def test_payment_events_update_order_status_in_bulk(monkeypatch):
+    """Payment events move orders to paid/refunded; stale or invalid transitions are ignored."""
+    from datetime import datetime, timedelta
+    from app import consumer
+    from app.schemas import PaymentEvent
+
+    monkeypatch.setattr(consumer, "SessionLocal", TestingSessionLocal)
+    monkeypatch.setattr(outbox, "SessionLocal", TestingSessionLocal)
+    published = []
+
+    async def fake_publish(routing_key, data, trace_context=None):
+        published.append((routing_key, data))
+        return True
+
+    monkeypatch.setattr(outbox, "publish_message", fake_publish)
+    asyncio.run(outbox.relay_batch(1000))
+    published.clear()
+
+    ids = [
+        client.post("/api/orders/", headers=auth_headers(11), json={"items": [{"product_id": 1, "price": 1.0}]}).json()["id"]
+        for _ in range(3)
+    ]
+    t0 = datetime(2026, 1, 1, 12, 0, 0)
+    asyncio.run(consumer.apply_payment_events([
+        PaymentEvent(order_id=ids[0], status="completed", updated_at=t0),
+        # Only the newest event per order in a batch is applied
+        PaymentEvent(order_id=ids[0], status="failed", updated_at=t0 - timedelta(seconds=10)),
+        PaymentEvent(order_id=ids[1], status="completed", updated_at=t0),
+        # pending -> refunded is not an allowed transition
+        PaymentEvent(order_id=ids[2], status="refunded", updated_at=t0),
+    ]))
+    asyncio.run(consumer.apply_payment_events([
+        PaymentEvent(order_id=ids[1], status="refunded", updated_at=t0 + timedelta(seconds=5)),
+    ]))
+    # A late, older event must not undo the refund
+    asyncio.run(consumer.apply_payment_events([
+        PaymentEvent(order_id=ids[1], status="completed", updated_at=t0 + timedelta(seconds=1)),
+    ]))
+
+    statuses = [client.get(f"/api/orders/{order_id}", headers=auth_headers(11)).json()["status"] for order_id in ids]
+    assert statuses == ["paid", "refunded", "pending"]
+
+    asyncio.run(outbox.relay_batch(1000))
+    updates = [(data["order_id"], data["status"]) for key, data in published if key == "order.updated"]
+    assert sorted(updates) == [(ids[0], "paid"), (ids[1], "paid"), (ids[1], "refunded")]
+
+
+def test_get_order_reads_through_cache_and_writes_invalidate(monkeypatch):
+    """GET /api/orders/{id} is served from Redis until a write invalidates it."""
+    import fakeredis.aioredis
+    import httpx
+    from app import cache
+
+    async def scenario():
+        # One event loop for the whole scenario, as the Redis client is bound to it
+        monkeypatch.setattr(cache, "_redis", fakeredis.aioredis.FakeRedis())
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as ac:
+            order = (await ac.post("/api/orders/", headers=auth_headers(12), json={
+                "items": [{"product_id": 1, "price": 4.0}],
+            })).json()
+            url = f"/api/orders/{order['id']}"
+
+            hits = cache.cache_stats()["hits"]
+            assert (await ac.get(url, headers=auth_headers(12))).json()["status"] == "pending"
+            assert (await ac.get(url, headers=auth_headers(12))).json() == order
+            assert cache.cache_stats()["hits"] == hits + 1
+            # The cached document is still owner-checked
+            assert (await ac.get(url, headers=auth_headers(13))).status_code == 404
+
+            await ac.put(url, headers=auth_headers(12), json={"status": "shipped"})
+            assert (await ac.get(url, headers=auth_headers(12))).json()["status"] == "shipped"
+
+    asyncio.run(scenario())
+
+
+def test_cache_single_flight_loads_once(monkeypatch):
+    """Concurrent misses for one key share a single loader call."""
+    import fakeredis.aioredis
+    from app import cache
+
+    monkeypatch.setattr(cache, "_redis", fakeredis.aioredis.FakeRedis())
+    calls = []
+
+    async def loader():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return b'{"id": 1}'
+
+    async def stampede():
+        return await asyncio.gather(*(cache.get_or_load("order:stampede", loader) for _ in range(20)))
+
+    assert asyncio.run(stampede()) == [b'{"id": 1}'] * 20
+    assert len(calls) == 1
+
+
+def test_cache_load_overlapping_an_invalidation_is_not_cached(monkeypatch):
+    """A load that read the old row before a write must not cache it after the write's invalidation."""
+    import fakeredis.aioredis
+    from app import cache
+
+    monkeypatch.setattr(cache, "_redis", fakeredis.aioredis.FakeRedis())
+    row = {"status": b"pending"}
+
+    async def scenario():
+        read, release = asyncio.Event(), asyncio.Event()
+
+        async def slow_loader():
+            value = row["status"]
+            read.set()
+            await release.wait()
+            return value
+
+        async def loader():
+            return row["status"]
+
+        stale = asyncio.create_task(cache.get_or_load("order:race", slow_loader))
+        await read.wait()
+        row["status"] = b"shipped"
+        await cache.invalidate("order:race")
+        # A miss after the write does not join the load that predates it
+        fresh = await asyncio.wait_for(cache.get_or_load("order:race", loader), 1)
+        release.set()
+        return await stale, fresh, await cache._redis.get("order:race")
+
+    assert asyncio.run(scenario()) == (b"pending", b"shipped", b"shipped")
+
+
+def test_bulk_create_orders_reports_partial_failures():
+    """Valid orders are created in one transaction; invalid entries are reported by index."""
+    response = client.post("/api/orders/bulk", headers=auth_headers(14), json=[
+        {"items": [{"product_id": 1, "quantity": 2, "price": 1.5}]},
+        {"items": [{"product_id": 2}]},  # missing price
+        {"items": [{"product_id": 3, "price": 4.0}, {"product_id": 4, "price": 1.0}], "notes": "b2b"},
+    ])
+    assert response.status_code == 200
+    report = response.json()
+    assert (report["created"], report["failed"]) == (2, 1)
+    assert [result["index"] for result in report["results"]] == [0, 1, 2]
+    assert "items.0.price" in report["results"][1]["error"]
+
+    created = client.get(f"/api/orders/{report['results'][2]['order_id']}", headers=auth_headers(14)).json()
+    assert created["total"] == 5.0
+    assert created["notes"] == "b2b"
+    assert len(created["items"]) == 2
+
+
+def test_bulk_create_orders_enforces_limit(monkeypatch):
+    monkeypatch.setattr(settings, "BULK_ORDER_LIMIT", 2)
+    response = client.post("/api/orders/bulk", headers=auth_headers(), json=[{"items": []}] * 3)
+    assert response.status_code == 413
+
+
+def test_metrics_endpoint_reports_routes_and_queries():
+    """/metrics exposes per-route-template latency and SQL timings."""
+    client.get("/api/orders/987654", headers=auth_headers())
+    body = client.get("/metrics").text
+    assert 'http_requests_total{method="GET",route="/api/orders/{order_id}",status="404"}' in body
+    assert 'http_request_duration_seconds_bucket{le="0.005",method="GET",route="/api/orders/{order_id}"}' in body
+    assert 'db_query_duration_seconds_count{operation="SELECT"}' in body
+    assert "db_pool_checked_out" in body
+
+
+def test_summary_is_served_from_rollups_kept_in_step_with_writes(monkeypatch):
+    """Creates, bulk creates, cancels and payment events all move the rollup counts and totals."""
+    from datetime import datetime
+    from app import consumer
+    from app.schemas import PaymentEvent
+
+    monkeypatch.setattr(consumer, "SessionLocal", TestingSessionLocal)
+    headers = auth_headers(21)
+    one = client.post("/api/orders/", headers=headers, json={"items": [{"product_id": 1, "quantity": 2, "price": 4.25}]})
+    two = client.post("/api/orders/", headers=headers, json={"items": [{"product_id": 2, "price": 10}], "currency": "EUR"})
+    client.post("/api/orders/bulk", headers=headers, json=[
+        {"items": [{"product_id": 3, "price": 1.5}]},
+        {"items": [{"product_id": 4, "price": 2.5}]},
+    ])
+    client.delete(f"/api/orders/{two.json()['id']}", headers=headers)
+    asyncio.run(consumer.apply_payment_events([
+        PaymentEvent(order_id=one.json()["id"], status="completed", updated_at=datetime.utcnow()),
+    ]))
+
+    summary = client.get("/api/orders/summary", headers=headers).json()
+    assert [(s["status"], s["currency"], s["count"], s["total_cents"]) for s in summary["by_status"]] == [
+        ("cancelled", "EUR", 1, 1000),
+        ("paid", "USD", 1, 850),
+        ("pending", "USD", 2, 400),
+    ]
+    assert summary["spend"] == [{"currency": "USD", "total_cents": 850, "total": 8.5}]
+    this_month = datetime.utcnow().date().replace(day=1).isoformat()
+    assert summary["buckets"] == [
+        {"start": this_month, "currency": "EUR", "count": 1, "spend_cents": 0, "spend": 0.0},
+        {"start": this_month, "currency": "USD", "count": 3, "spend_cents": 850, "spend": 8.5},
+    ]
+
+    daily = client.get("/api/orders/summary", headers=headers, params={"bucket": "day", "until": "2000-01-01"}).json()
+    assert daily["by_status"] == daily["buckets"] == []
+    assert client.get("/api/orders/summary", headers=headers, params={"bucket": "year"}).status_code == 422
+
+
+def test_export_streams_filtered_orders_as_ndjson_and_csv(monkeypatch):
+    """Exports stream the user's orders in small cursor batches with filters applied in SQL."""
+    import csv
+    import io
+    import orjson
+    from app import export
+
+    monkeypatch.setattr(export, "SessionLocal", TestingSessionLocal)
+    monkeypatch.setattr(settings, "EXPORT_YIELD_PER", 2)
+    headers = auth_headers(15)
+    ids = [
+        client.post("/api/orders/", headers=headers, json={"items": [{"product_id": n, "price": n}]}).json()["id"]
+        for n in (1, 2, 3, 4, 5)
+    ]
+    client.put(f"/api/orders/{ids[1]}", headers=headers, json={"status": "shipped"})
+    client.post("/api/orders/", headers=auth_headers(16), json={"items": [{"product_id": 9, "price": 9}]})
+
+    response = client.get("/api/orders/export", headers=headers)
+    assert response.headers["content-type"] == "application/x-ndjson"
+    rows = [orjson.loads(line) for line in response.text.splitlines()]
+    assert [row["id"] for row in rows] == ids
+    assert [row["total_cents"] for row in rows] == [100, 200, 300, 400, 500]
+
+    response = client.get("/api/orders/export", headers=headers, params={"format": "csv", "status": "pending"})
+    assert response.headers["content-disposition"] == 'attachment; filename="orders.csv"'
+    rows = list(csv.DictReader(io.StringIO(response.text)))
+    assert [int(row["id"]) for row in rows] == [ids[0], *ids[2:]]
+    assert rows[0]["currency"] == "USD" and "T" in rows[0]["created_at"]
+
+    future = client.get("/api/orders/export", headers=headers, params={"since": "2999-01-01T00:00:00"})
+    assert future.text == ""
+    assert client.get("/api/orders/export", headers=headers, params={"format": "xml"}).status_code == 422
+
+
+def test_create_order_with_idempotency_key_replays_the_first_response():
+    """Without Redis, the idempotency_keys row alone turns repeats into replays."""
+    headers = {**auth_headers(17), "Idempotency-Key": "checkout-1"}
+    order = {"items": [{"product_id": 1, "quantity": 3, "price": 2.5}]}
+    first = client.post("/api/orders/", headers=headers, json=order)
+    again = client.post("/api/orders/", headers=headers, json=order)
+    assert first.status_code == again.status_code == 201
+    assert again.json() == first.json()
+    assert again.headers["Idempotent-Replayed"] == "true"
+    assert len(client.get("/api/orders/", headers=auth_headers(17)).json()["items"]) == 1
+
+    assert client.post("/api/orders/", headers=headers, json={"items": []}).status_code == 422
+    # Keys are scoped per user
+    other = client.post("/api/orders/", headers={**auth_headers(18), "Idempotency-Key": "checkout-1"}, json=order)
+    assert other.status_code == 201 and other.json()["id"] != first.json()["id"]
+
+
+def test_concurrent_retries_wait_for_the_first_request(monkeypatch):
+    """Retries racing the first request poll Redis for its response instead of re-running it."""
+    import fakeredis.aioredis
+    import httpx
+    from app import cache
+
+    async def scenario():
+        monkeypatch.setattr(cache, "_redis", fakeredis.aioredis.FakeRedis())
+        headers = {**auth_headers(19), "Idempotency-Key": "double-click"}
+        order = {"items": [{"product_id": 4, "price": 10}]}
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as ac:
+            responses = await asyncio.gather(*(ac.post("/api/orders/", headers=headers, json=order) for _ in range(4)))
+            assert {response.status_code for response in responses} == {201}
+            assert len({response.json()["id"] for response in responses}) == 1
+            assert sum("Idempotent-Replayed" in response.headers for response in responses) == 3
+            assert len((await ac.get("/api/orders/", headers=auth_headers(19))).json()["items"]) == 1
+
+    asyncio.run(scenario())
+
+
+def test_row_documents_match_the_response_schema():
+    """Documents built from row tuples serialize exactly like OrderResponse."""
+    from sqlalchemy import select
+    from sqlalchemy.orm import selectinload
+    from app import documents
+    from app.models import Order
+    from app.schemas import OrderResponse
+    import orjson
+
+    created = client.post("/api/orders/", headers=auth_headers(23), json={
+        "items": [{"product_id": 1, "quantity": 3, "price": 0.1}, {"product_id": 2, "price": 1234567.89}],
+        "currency": "EUR", "notes": "gift",
+    }).json()
+
+    async def load():
+        async with TestingSessionLocal() as db:
+            query = select(*documents.ORDER_COLUMNS).where(Order.id == created["id"])
+            rows = await documents.load_orders(db, query)
+            order = (await db.execute(select(Order).options(selectinload(Order.items)).where(Order.id == created["id"]))).scalar_one()
+            return rows, OrderResponse.model_validate(order).model_dump(mode="json")
+
+    rows, expected = asyncio.run(load())
+    assert orjson.dumps(rows[0]) == orjson.dumps(expected)
+    page = client.get("/api/orders/", headers=auth_headers(23)).json()
+    assert page["items"] == [expected] == [created]
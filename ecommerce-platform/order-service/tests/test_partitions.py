@@ -0,0 +1,98 @@
+# ============================================================
+# Order Service – Partition Maintenance and Archival Tests
+# Archival on SQLite deletes the archived rows (no partitions).
+# ============================================================
+import asyncio
+from datetime import datetime
+
+import orjson
+from sqlalchemy import update
+
+from app import export, partitions
+from app.models import Order, OrderItem
+from tests.test_orders import TestingSessionLocal, auth_headers, client, engine
+
+
+def test_month_arithmetic_wraps_years():
+    assert partitions.month_start(datetime(2026, 11, 17, 9), 2) == datetime(2027, 1, 1)
+    assert partitions.month_start(datetime(2026, 1, 31), -13) == datetime(2024, 12, 1)
+    assert partitions.partition_name("orders", datetime(2027, 1, 1)) == "orders_y2027m01"
+    names = ["orders_default", "orders_y2027m01", "order_items_y2027m01", "orders_y2026m12"]
+    assert partitions._month_partitions("orders", names) == [
+        ("orders_y2026m12", datetime(2026, 12, 1)), ("orders_y2027m01", datetime(2027, 1, 1)),
+    ]
+
+
+def test_cold_orders_are_archived_and_still_readable_when_asked(monkeypatch):
+    monkeypatch.setattr(partitions, "engine", engine)
+    monkeypatch.setattr(partitions, "SessionLocal", TestingSessionLocal)
+    monkeypatch.setattr(partitions.settings, "ARCHIVE_AFTER_MONTHS", 12)
+    monkeypatch.setattr(partitions.settings, "ARCHIVE_BATCH_SIZE", 1)
+
+    headers = auth_headers(51)
+    ids = [
+        client.post("/api/orders/", headers=headers, json={
+            "items": [{"product_id": n, "quantity": 1, "price": 2.5}],
+        }).json()["id"]
+        for n in range(3)
+    ]
+    cold = {ids[0]: datetime(2024, 3, 2), ids[1]: datetime(2024, 3, 5)}
+
+    async def backdate():
+        async with TestingSessionLocal() as db:
+            for order_id, created_at in cold.items():
+                await db.execute(update(Order).where(Order.id == order_id).values(created_at=created_at))
+                await db.execute(update(OrderItem).where(OrderItem.order_id == order_id).values(created_at=created_at))
+            await db.commit()
+
+    asyncio.run(backdate())
+    assert asyncio.run(partitions.archive_orders(now=datetime(2026, 10, 17))) == 2
+
+    live = client.get("/api/orders/", headers=headers).json()
+    assert [o["id"] for o in live["items"]] == [ids[2]] and live["next_cursor"] is None
+    assert client.get(f"/api/orders/{ids[0]}", headers=headers).status_code == 404
+
+    first = client.get("/api/orders/?limit=2&include_archived=true", headers=headers).json()
+    assert [o["id"] for o in first["items"]] == [ids[2], ids[1]]
+    rest = client.get(f"/api/orders/?limit=2&include_archived=true&after={first['next_cursor']}", headers=headers).json()
+    assert [o["id"] for o in rest["items"]] == [ids[0]] and rest["next_cursor"] is None
+
+    archived = client.get(f"/api/orders/{ids[0]}?include_archived=true", headers=headers)
+    assert archived.status_code == 200
+    assert archived.json()["items"][0]["price"] == 2.5
+    assert archived.json()["created_at"] == "2024-03-02T00:00:00"
+    assert client.get(f"/api/orders/{ids[0]}?include_archived=true", headers=auth_headers(52)).status_code == 404
+
+
+def test_exports_include_archived_orders_when_asked(monkeypatch):
+    monkeypatch.setattr(partitions, "engine", engine)
+    monkeypatch.setattr(partitions, "SessionLocal", TestingSessionLocal)
+    monkeypatch.setattr(export, "SessionLocal", TestingSessionLocal)
+    monkeypatch.setattr(partitions.settings, "ARCHIVE_AFTER_MONTHS", 12)
+
+    headers = auth_headers(53)
+    ids = [
+        client.post("/api/orders/", headers=headers, json={"items": [{"product_id": n, "price": 1.0}]}).json()["id"]
+        for n in range(3)
+    ]
+    client.put(f"/api/orders/{ids[1]}", headers=headers, json={"status": "cancelled"})
+
+    async def backdate():
+        async with TestingSessionLocal() as db:
+            for order_id in ids[:2]:
+                await db.execute(update(Order).where(Order.id == order_id).values(created_at=datetime(2024, 6, 1)))
+            await db.commit()
+
+    asyncio.run(backdate())
+    assert asyncio.run(partitions.archive_orders(now=datetime(2026, 10, 17))) == 2
+
+    def exported(**params) -> list:
+        response = client.get("/api/orders/export", headers=headers, params=params)
+        return [orjson.loads(line)["id"] for line in response.text.splitlines()]
+
+    assert exported() == [ids[2]]
+    assert exported(include_archived=True) == ids
+    assert exported(include_archived=True, status="pending") == [ids[0], ids[2]]
+    assert exported(include_archived=True, since="2025-01-01T00:00:00") == [ids[2]]
+    rows = client.get("/api/orders/export", headers=headers, params={"include_archived": True, "format": "csv"}).text
+    assert rows.splitlines()[1].startswith(f"{ids[0]},pending,100,USD,,2024-06-01T00:00:00,")
@@ -0,0 +1,107 @@
+# ============================================================
+# Order Service – Payment Client & Circuit Breaker Tests
+# Uses an in-process httpx stub transport as payment-service.
+# ============================================================
+import asyncio
+
+import httpx
+import orjson
+import pytest
+
+from app import payment_client
+from app.circuit_breaker import CircuitBreaker, CircuitOpenError
+
+
+def make_breaker(**overrides) -> CircuitBreaker:
+    options = {"failure_threshold": 2, "slow_call_threshold": 0.05, "reset_timeout": 0.05}
+    options.update(overrides)
+    return CircuitBreaker("stub", **options)
+
+
+async def ok():
+    return "ok"
+
+
+async def boom():
+    raise RuntimeError("boom")
+
+
+async def slow():
+    await asyncio.sleep(0.1)
+    return "slow"
+
+
+@pytest.mark.asyncio
+async def test_breaker_opens_after_consecutive_failures():
+    breaker = make_breaker()
+    for _ in range(2):
+        with pytest.raises(RuntimeError):
+            await breaker.call(boom)
+    assert breaker.state == "open"
+    with pytest.raises(CircuitOpenError):
+        await breaker.call(ok)
+
+
+@pytest.mark.asyncio
+async def test_slow_calls_count_as_failures():
+    breaker = make_breaker()
+    assert await breaker.call(slow) == "slow"
+    assert await breaker.call(slow) == "slow"
+    assert breaker.state == "open"
+
+
+@pytest.mark.asyncio
+async def test_half_open_trial_closes_or_reopens():
+    breaker = make_breaker(failure_threshold=1)
+    with pytest.raises(RuntimeError):
+        await breaker.call(boom)
+    await asyncio.sleep(0.06)
+    assert breaker.state == "half_open"
+    with pytest.raises(RuntimeError):
+        await breaker.call(boom)
+    assert breaker.state == "open"
+
+    await asyncio.sleep(0.06)
+    assert await breaker.call(ok) == "ok"
+    assert breaker.snapshot() == {"state": "closed", "consecutive_failures": 0}
+
+
+@pytest.mark.asyncio
+async def test_cancelled_half_open_trial_frees_the_trial_slot():
+    breaker = make_breaker(failure_threshold=1)
+    with pytest.raises(RuntimeError):
+        await breaker.call(boom)
+    await asyncio.sleep(0.06)
+
+    with pytest.raises(asyncio.TimeoutError):
+        await asyncio.wait_for(breaker.call(asyncio.sleep, 1), 0.01)
+    assert breaker.state == "half_open"
+    assert await breaker.call(ok) == "ok"
+    assert breaker.state == "closed"
+
+
+@pytest.mark.asyncio
+async def test_initiate_payment_uses_shared_client(monkeypatch):
+    """Payments go through the stub server; 5xx responses trip the breaker."""
+    calls = []
+
+    def stub_payment_server(request: httpx.Request) -> httpx.Response:
+        calls.append(request)
+        return httpx.Response(500 if len(calls) > 1 else 201, json={})
+
+    monkeypatch.setattr(payment_client, "breaker", make_breaker(failure_threshold=1, reset_timeout=60))
+    await payment_client.open_payment_client(transport=httpx.MockTransport(stub_payment_server))
+    try:
+        response = await payment_client.initiate_payment(order_id=1, amount_cents=950, currency="USD", user_id=3)
+        assert response.status_code == 201
+        assert calls[0].url.path == "/api/payments/"
+        assert orjson.loads(calls[0].content)["amount"] == "9.50"
+        assert calls[0].headers["Idempotency-Key"] == "order-1"
+
+        with pytest.raises(httpx.HTTPStatusError):
+            await payment_client.initiate_payment(order_id=2, amount_cents=100, currency="USD", user_id=3)
+        with pytest.raises(CircuitOpenError):
+            await payment_client.initiate_payment(order_id=3, amount_cents=100, currency="USD", user_id=3)
+        assert len(calls) == 2
+    finally:
+        await payment_client.close_payment_client()
@@ -0,0 +1,117 @@
+# ============================================================
+# Order Service – Rate Limiting and Admission Control Tests
+# ============================================================
+import asyncio
+
+import fakeredis.aioredis
+import httpx
+import pytest
+import redis.asyncio as redis
+
+from app import auth, cache, ratelimit
+from app.config import settings
+from app.main import app
+from tests.test_orders import auth_headers, client
+
+ORDER = {"items": [{"product_id": 1, "quantity": 1, "price": 1.0}]}
+
+
+@pytest.fixture
+def limits(monkeypatch):
+    """Rate limiting on, with buckets that barely refill during a test."""
+    monkeypatch.setattr(settings, "RATE_LIMIT_ENABLED", True)
+    monkeypatch.setattr(settings, "RATE_LIMIT_USER_RATE", 0.01)
+    monkeypatch.setattr(settings, "RATE_LIMIT_USER_BURST", 10)
+    monkeypatch.setattr(settings, "RATE_LIMIT_WRITE_COST", 5)
+    monkeypatch.setattr(ratelimit.limiter, "local", ratelimit.LocalBuckets())
+    return monkeypatch
+
+
+def test_users_are_limited_in_redis(limits):
+    async def scenario():
+        # One event loop for the whole scenario, as the Redis client is bound to it
+        server = fakeredis.aioredis.FakeRedis()
+        limits.setattr(cache, "_redis", server)
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as ac:
+            for _ in range(2):
+                assert (await ac.post("/api/orders/", headers=auth_headers(61), json=ORDER)).status_code == 201
+            refused = await ac.post("/api/orders/", headers=auth_headers(61), json=ORDER)
+            assert refused.status_code == 429
+            assert int(refused.headers["retry-after"]) >= 1
+            assert (await ac.get("/api/orders/", headers=auth_headers(61))).status_code == 429
+            assert (await ac.get("/api/orders/", headers=auth_headers(62))).status_code == 200
+            assert (await ac.get("/health")).status_code == 200
+        return sorted(await server.keys("ratelimit:*"))
+
+    assert asyncio.run(scenario()) == [b"ratelimit:ip:127.0.0.1", b"ratelimit:user:61", b"ratelimit:user:62"]
+    assert ratelimit.limiter.local._levels == {}
+
+
+def test_buckets_fall_back_to_the_process_without_redis(limits):
+    limits.setattr(cache, "_redis", redis.Redis(port=1, socket_connect_timeout=0.05))
+    fallbacks = ratelimit.limiter.fallbacks
+
+    statuses = [client.post("/api/orders/", headers=auth_headers(63), json=ORDER).status_code for _ in range(3)]
+    assert statuses == [201, 201, 429]
+    assert ratelimit.limiter.fallbacks == fallbacks + 3
+
+
+def test_clients_behind_a_trusted_proxy_get_their_own_buckets(limits):
+    limits.setattr(cache, "_redis", None)
+    limits.setattr(settings, "RATE_LIMIT_IP_RATE", 0.01)
+    limits.setattr(settings, "RATE_LIMIT_IP_BURST", 1)
+
+    async def statuses(*forwarded_for: str) -> list:
+        transport = httpx.ASGITransport(app=app, client=("10.0.0.5", 40000))
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as ac:
+            return [
+                (await ac.get("/api/orders/", headers={"X-Forwarded-For": hops})).status_code for hops in forwarded_for
+            ]
+
+    # The proxy appends the address it received from; hops the client made up are ignored
+    limits.setattr(settings, "TRUSTED_PROXY_CIDRS", "10.0.0.0/8")
+    assert asyncio.run(statuses("203.0.113.1", "203.0.113.2", "198.51.100.9, 203.0.113.1")) == [403, 403, 429]
+    assert set(ratelimit.limiter.local._levels) == {"ip:203.0.113.1", "ip:203.0.113.2"}
+
+    # X-Forwarded-For from a peer outside TRUSTED_PROXY_CIDRS is not believed
+    limits.setattr(settings, "TRUSTED_PROXY_CIDRS", "")
+    assert asyncio.run(statuses("203.0.113.3", "203.0.113.4")) == [403, 429]
+    assert "ip:10.0.0.5" in ratelimit.limiter.local._levels
+
+
+def test_tokens_are_verified_once_per_request(limits):
+    limits.setattr(cache, "_redis", None)
+    tokens = auth.TokenCache(maxsize=10, ttl=60)
+    limits.setattr(auth, "token_cache", tokens)
+
+    assert client.get("/api/orders/", headers=auth_headers(65)).status_code == 200
+    assert client.get("/api/orders/", headers={"Authorization": "Bearer not.a.jwt"}).status_code == 401
+    assert tokens.stats() == {"size": 1, "hits": 0, "misses": 2, "rejects": 1}
+    assert "request" not in [param["name"] for param in app.openapi()["paths"]["/api/orders/"]["get"]["parameters"]]
+
+
+def test_requests_beyond_the_concurrency_limit_get_503(monkeypatch):
+    monkeypatch.setattr(ratelimit.admission, "limit", 0)
+    monkeypatch.setattr(settings, "ADMISSION_QUEUE_TIMEOUT_SECONDS", 0.01)
+    monkeypatch.setattr(settings, "ADMISSION_RETRY_AFTER_SECONDS", 2)
+
+    busy = client.get("/api/orders/", headers=auth_headers(64))
+    assert (busy.status_code, busy.headers["retry-after"]) == (503, "2")
+    assert client.get("/health").status_code == 200
+
+
+def test_released_slots_go_to_waiters_in_order():
+    async def scenario():
+        limiter = ratelimit.ConcurrencyLimiter(1)
+        assert await limiter.acquire(0)
+        assert not await limiter.acquire(0.01)
+        waiters = [asyncio.create_task(limiter.acquire(1)) for _ in range(2)]
+        await asyncio.sleep(0)
+        limiter.release()
+        assert await waiters[0] and not waiters[1].done()
+        limiter.release()
+        assert await waiters[1]
+        limiter.release()
+        return limiter.stats()
+
+    assert asyncio.run(scenario()) == {"limit": 1, "active": 0, "waiting": 0, "rejected": 1}
@@ -0,0 +1,105 @@
+# ============================================================
+# Order Service – Tracing Tests
+# Spans are collected by an in-memory exporter.
+# ============================================================
+import asyncio
+
+import httpx
+import orjson
+import pytest
+from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+from opentelemetry.trace import SpanKind
+
+from app import messaging, outbox, payment_client, tracing
+from app.config import settings
+from tests.test_orders import TestingSessionLocal, auth_headers, client, engine
+
+tracing.trace_engine(engine, "test")
+
+TRACE_ID = "ab" * 16
+TRACEPARENT = f"00-{TRACE_ID}-{'cd' * 8}-01"
+
+
+@pytest.fixture
+def spans(monkeypatch):
+    def start(sample_ratio: float = 1.0) -> InMemorySpanExporter:
+        monkeypatch.setattr(settings, "TRACE_SAMPLE_RATIO", sample_ratio)
+        exporter = InMemorySpanExporter()
+        tracing.configure_tracing(exporter)
+        return exporter
+
+    yield start
+    tracing.shutdown_tracing()
+
+
+class RecordingPublisher:
+    def __init__(self):
+        self.messages = []
+
+    async def publish(self, routing_key, body, headers=None):
+        self.messages.append((routing_key, orjson.loads(body), headers))
+        return True
+
+
+def test_order_trace_continues_through_queries_and_the_relayed_event(spans, monkeypatch):
+    """The caller's trace covers the route, its SQL and the order.created publish made later by the relay."""
+    exporter = spans()
+    publisher = RecordingPublisher()
+    monkeypatch.setattr(outbox, "SessionLocal", TestingSessionLocal)
+    monkeypatch.setattr(messaging, "_publisher", publisher)
+
+    response = client.post("/api/orders/", headers={**auth_headers(8), "traceparent": TRACEPARENT}, json={
+        "items": [{"product_id": 1, "quantity": 1, "price": 5.0}],
+    })
+    assert response.status_code == 201
+    asyncio.run(outbox.relay_batch(1000))
+
+    finished = exporter.get_finished_spans()
+    server = next(s for s in finished if s.kind == SpanKind.SERVER)
+    assert server.name == "POST /api/orders/"
+    assert format(server.context.trace_id, "032x") == TRACE_ID
+    assert server.parent.span_id == int("cd" * 8, 16)
+    assert server.attributes["http.status_code"] == 201
+
+    inserts = [s for s in finished if s.name == "INSERT test"]
+    assert inserts and all(s.parent.span_id == server.context.span_id for s in inserts)
+
+    routing_key, _, headers = next(m for m in publisher.messages if m[1]["order_id"] == response.json()["id"])
+    assert routing_key == "order.created"
+    assert headers["traceparent"].split("-")[1] == TRACE_ID
+    producer = next(
+        s for s in finished if s.kind == SpanKind.PRODUCER and s.context.trace_id == server.context.trace_id
+    )
+    assert producer.name == "order.created publish"
+    assert producer.parent.span_id == server.context.span_id
+
+
+def test_head_sampling_follows_the_caller(spans):
+    """With TRACE_SAMPLE_RATIO=0 new traces are dropped, but a sampled caller's trace is kept."""
+    exporter = spans(sample_ratio=0.0)
+    client.get("/health")
+    assert exporter.get_finished_spans() == ()
+
+    client.get("/health", headers={"traceparent": TRACEPARENT})
+    assert [s.name for s in exporter.get_finished_spans()] == ["GET /health"]
+
+
+@pytest.mark.asyncio
+async def test_payment_call_propagates_the_trace(spans):
+    exporter = spans()
+    calls = []
+
+    def stub_payment_server(request: httpx.Request) -> httpx.Response:
+        calls.append(request)
+        return httpx.Response(201, json={})
+
+    await payment_client.open_payment_client(transport=httpx.MockTransport(stub_payment_server))
+    try:
+        with tracing.span("create order") as parent:
+            await payment_client.initiate_payment(order_id=1, amount_cents=100, currency="USD", user_id=3)
+    finally:
+        await payment_client.close_payment_client()
+
+    call = next(s for s in exporter.get_finished_spans() if s.kind == SpanKind.CLIENT)
+    assert call.parent.span_id == parent.get_span_context().span_id
+    assert calls[0].headers["traceparent"].startswith(f"00-{call.context.trace_id:032x}-{call.context.span_id:016x}-")
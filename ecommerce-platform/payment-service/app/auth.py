@@ -1,22 +1,105 @@
 # ============================================================
 # Payment Service – JWT Auth Dependency
+# Verified tokens are cached (bounded LRU, never past `exp`).
 # ============================================================
-from fastapi import Depends, HTTPException, status
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from jose import JWTError, jwt
 from app.config import settings
 
 security = HTTPBearer()
 
+# Decoder for the configured backend, with the HS256 key prepared once
+if settings.JWT_BACKEND == "pyjwt":
+    import jwt as pyjwt
+
+    _KEY = settings.JWT_SECRET.encode()
+    _DecodeError = pyjwt.PyJWTError
+
+    def _decode(token: str) -> dict:
+        return pyjwt.decode(token, _KEY, algorithms=["HS256"])
+else:
+    from jose import JWTError, jwk, jwt
+
+    _KEY = jwk.construct(settings.JWT_SECRET, "HS256")
+    _DecodeError = JWTError
+
+    def _decode(token: str) -> dict:
+        return jwt.decode(token, _KEY, algorithms=["HS256"])
+
+
+class TokenCache:
+    """
+    Bounded LRU cache of verified token -> claims.
+    An entry expires after ``ttl`` seconds or at the token's ``exp``,
+    whichever comes first, so a cached token is never accepted after it expired.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: OrderedDict = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.rejects = 0
+
+    def get(self, token: str) -> Optional[dict]:
+        entry = self._entries.get(token)
+        if entry is not None:
+            claims, expires_at = entry
+            if time.time() < expires_at:
+                self._entries.move_to_end(token)
+                self.hits += 1
+                return claims
+            del self._entries[token]
+        self.misses += 1
+        return None
+
+    def put(self, token: str, claims: dict):
+        expires_at = time.time() + self.ttl
+        if "exp" in claims:
+            expires_at = min(expires_at, float(claims["exp"]))
+        self._entries[token] = (claims, expires_at)
+        self._entries.move_to_end(token)
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        return {"size": len(self._entries), "hits": self.hits, "misses": self.misses, "rejects": self.rejects}
+
+
+token_cache = TokenCache(maxsize=settings.JWT_CACHE_SIZE, ttl=settings.JWT_CACHE_TTL_SECONDS)
+
+
+def verify_token(token: str) -> dict:
+    payload = token_cache.get(token)
+    if payload is not None:
+        return payload
+
+    try:
+        payload = _decode(token)
+    except _DecodeError:
+        token_cache.rejects += 1
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid or expired token")
+    if payload.get("id") is None:
+        token_cache.rejects += 1
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
+    token_cache.put(token, payload)
+    return payload
+
 
 async def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
+    request: Request = None,
 ) -> dict:
+    # RateLimitMiddleware may already have verified this request's token
     token = credentials.credentials
-    try:
-        payload = jwt.decode(token, settings.JWT_SECRET, algorithms=["HS256"])
-        if payload.get("id") is None:
-            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
-        return payload
-    except JWTError:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid or expired token")
+    verified = getattr(request.state, "verified_token", None) if request is not None else None
+    if verified is not None and verified[0] == token:
+        if isinstance(verified[1], HTTPException):
+            raise verified[1]
+        return verified[1]
+    return verify_token(token)
@@ -0,0 +1,153 @@
+# ============================================================
+# Payment Service – Redis Read-through Cache
+# Caches serialized response documents. Misses are loaded once
+# per key (single-flight within the process, SET NX lock across
+# replicas); writes and consumed events invalidate keys, and
+# bump a per-key generation so a load that started before the
+# invalidation does not cache its stale document afterwards.
+# Redis being down only disables caching.
+# ============================================================
+import asyncio
+import logging
+from typing import Awaitable, Callable, Optional
+
+import redis.asyncio as redis
+from redis.exceptions import RedisError
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+_redis: Optional[redis.Redis] = None
+_inflight: dict = {}
+_stats = {"hits": 0, "misses": 0, "errors": 0}
+
+LOCK_TTL_MS = 2000
+LOCK_WAIT_SECONDS = 0.02
+LOCK_WAIT_ROUNDS = 10
+# Longer than any load, so a load never sees its key's generation expire
+GENERATION_TTL_SECONDS = 3600
+
+# KEYS: key, generation key; ARGV: document, generation read before loading, ttl.
+# Caches the document only if no invalidation happened since.
+STORE_IF_CURRENT_LUA = """
+if (redis.call('GET', KEYS[2]) or '0') == ARGV[2] then
+    redis.call('SET', KEYS[1], ARGV[1], 'EX', ARGV[3])
+    return 1
+end
+return 0
+"""
+
+
+def payment_key(payment_id: int) -> str:
+    return f"payment:{payment_id}"
+
+
+def order_payments_key(order_id: int) -> str:
+    return f"payments:order:{order_id}"
+
+
+async def connect_redis():
+    """Create the shared Redis client (connections are opened lazily)."""
+    global _redis
+    if not settings.CACHE_ENABLED:
+        return
+    _redis = redis.Redis(
+        host=settings.REDIS_HOST,
+        port=settings.REDIS_PORT,
+        socket_timeout=settings.CACHE_TIMEOUT_SECONDS,
+        socket_connect_timeout=settings.CACHE_TIMEOUT_SECONDS,
+    )
+    logger.info("Redis cache configured")
+
+
+def redis_client() -> Optional[redis.Redis]:
+    """The shared client, or None when caching is disabled or not connected."""
+    return _redis
+
+
+async def close_redis():
+    global _redis
+    if _redis:
+        await _redis.aclose()
+        _redis = None
+
+
+def _generation_key(key: str) -> str:
+    return f"gen:{key}"
+
+
+async def _load(key: str, loader: Callable[[], Awaitable[Optional[bytes]]]) -> Optional[bytes]:
+    lock_key = f"lock:{key}"
+    generation = await _redis.get(_generation_key(key)) or b"0"
+    locked = await _redis.set(lock_key, b"1", nx=True, px=LOCK_TTL_MS)
+    if not locked:
+        # Another replica is loading this key; give it a moment before loading ourselves
+        for _ in range(LOCK_WAIT_ROUNDS):
+            await asyncio.sleep(LOCK_WAIT_SECONDS)
+            cached = await _redis.get(key)
+            if cached is not None:
+                return cached
+    try:
+        value = await loader()
+        if value is not None:
+            await _redis.eval(
+                STORE_IF_CURRENT_LUA, 2, key, _generation_key(key), value, generation, settings.CACHE_TTL_SECONDS,
+            )
+        return value
+    finally:
+        if locked:
+            await _redis.delete(lock_key)
+
+
+async def get_or_load(key: str, loader: Callable[[], Awaitable[Optional[bytes]]]) -> Optional[bytes]:
+    """
+    Return the cached document for ``key`` or load it with ``loader`` (which
+    returns the serialized document, or None for "not found", which is not
+    cached). Concurrent misses for the same key share one load, so ``loader``
+    must open its own session rather than use its caller's.
+    """
+    if _redis is None:
+        return await loader()
+    try:
+        cached = await _redis.get(key)
+    except RedisError:
+        _stats["errors"] += 1
+        return await loader()
+    if cached is not None:
+        _stats["hits"] += 1
+        return cached
+
+    _stats["misses"] += 1
+    task = _inflight.get(key)
+    if task is None:
+        task = asyncio.create_task(_load(key, loader))
+        _inflight[key] = task
+        task.add_done_callback(lambda done: _inflight.get(key) is done and _inflight.pop(key))
+    try:
+        return await asyncio.shield(task)
+    except RedisError:
+        _stats["errors"] += 1
+        return await loader()
+
+
+async def invalidate(*keys: str):
+    """Drop cached documents after a write (best effort)."""
+    if _redis is None or not keys:
+        return
+    # Later misses start a new load instead of joining one that may predate the write
+    for key in keys:
+        _inflight.pop(key, None)
+    try:
+        async with _redis.pipeline() as pipe:
+            pipe.delete(*keys)
+            for key in keys:
+                pipe.incr(_generation_key(key))
+                pipe.expire(_generation_key(key), GENERATION_TTL_SECONDS)
+            await pipe.execute()
+    except RedisError:
+        _stats["errors"] += 1
+
+
+def cache_stats() -> dict:
+    return dict(_stats)
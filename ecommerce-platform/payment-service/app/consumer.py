@@ -0,0 +1,40 @@
+# ============================================================
+# Payment Service – Event Consumers
+# Initiates payment for new orders from order.created events
+# published by order-service's outbox relay.
+# ============================================================
+from sqlalchemy.exc import IntegrityError
+
+from app.database import SessionLocal
+from app.messaging import start_consumer
+from app.models import ProcessedEvent
+from app.payments import process_payment
+from app.schemas import OrderCreatedEvent
+
+ORDER_CREATED_QUEUE = "payment-service.order.created"
+
+
+async def handle_order_created(data: dict):
+    """
+    Charge a newly created order exactly once.
+    The processed_events row keyed on order_id commits together with the
+    payment, so redeliveries (even concurrent ones) never double-charge.
+    """
+    event = OrderCreatedEvent(**data)
+    async with SessionLocal() as db:
+        db.add(ProcessedEvent(event_key=f"order.created:{event.order_id}"))
+        try:
+            await process_payment(
+                db,
+                order_id=event.order_id,
+                user_id=event.user_id,
+                amount_cents=event.total_cents,
+                currency=event.currency,
+            )
+        except IntegrityError:
+            await db.rollback()  # Already charged by an earlier delivery
+
+
+async def start_consumers():
+    """Start all payment-service event consumers (called from the lifespan)."""
+    await start_consumer(ORDER_CREATED_QUEUE, "order.created", handle_order_created)
@@ -0,0 +1,37 @@
+# ============================================================
+# Payment Service – Response Documents
+# PaymentResponse JSON documents built straight from row tuples
+# for the read paths (no ORM objects, no Pydantic validation).
+# ============================================================
+from datetime import datetime
+
+import orjson
+
+from app.models import Payment
+
+PAYMENT_COLUMNS = (
+    Payment.id, Payment.order_id, Payment.user_id, Payment.amount_cents, Payment.currency, Payment.status,
+    Payment.payment_method, Payment.transaction_id, Payment.created_at, Payment.updated_at,
+)
+
+
+def assemble(rows) -> list:
+    return [
+        {
+            "id": payment_id, "order_id": order_id, "user_id": user_id, "amount_cents": amount_cents,
+            "currency": currency, "status": status, "payment_method": payment_method,
+            "transaction_id": transaction_id, "created_at": created_at, "updated_at": updated_at,
+            # Same float as float(from_minor(amount_cents))
+            "amount": amount_cents / 100,
+        }
+        for (payment_id, order_id, user_id, amount_cents, currency, status, payment_method,
+             transaction_id, created_at, updated_at) in rows
+    ]
+
+
+def decode_archived(rows) -> list:
+    """Archived documents (rows of ArchivedPayment.document), created_at back to a datetime."""
+    payments = [orjson.loads(document) for document, in rows]
+    for payment in payments:
+        payment["created_at"] = datetime.fromisoformat(payment["created_at"])
+    return payments
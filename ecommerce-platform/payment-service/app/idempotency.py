@@ -0,0 +1,180 @@
+# ============================================================
+# Payment Service – Idempotency Keys
+# A POST carrying an Idempotency-Key runs once. The key is
+# claimed in Redis (fast path; concurrent retries poll for the
+# first request's response) and in the idempotency_keys table
+# within the request's own transaction (durable guard when
+# Redis is down or has evicted the key). Repeats get the
+# stored response back.
+# ============================================================
+import asyncio
+import hashlib
+import logging
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+from typing import Optional
+
+import orjson
+from fastapi import HTTPException, Response
+from pydantic import BaseModel
+from redis.exceptions import RedisError
+from sqlalchemy import delete
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.cache import redis_client
+from app.config import settings
+from app.database import SessionLocal
+from app.models import IdempotencyKey
+
+logger = logging.getLogger(__name__)
+
+REPLAYED_HEADER = "Idempotent-Replayed"
+POLL_SECONDS = 0.05
+
+
+def fingerprint(payload: BaseModel) -> str:
+    """Hash of the request body, so a key reused for a different request is rejected."""
+    return hashlib.sha256(orjson.dumps(payload.model_dump(mode="json"), option=orjson.OPT_SORT_KEYS)).hexdigest()
+
+
+class Claim:
+    """The outcome of claiming a key: a ``replay`` response, or the right to run the request."""
+
+    def __init__(self, record: Optional[IdempotencyKey] = None, replay: Optional[Response] = None):
+        self.record = record
+        self.replay = replay
+        self.result: Optional[tuple] = None
+
+    def complete(self, status_code: int, body: bytes) -> Response:
+        """Stage the response in the claimed row; call before the request's commit."""
+        self.result = (status_code, body)
+        if self.record is not None:
+            self.record.status_code = status_code
+            self.record.response = body
+        return Response(body, status_code=status_code, media_type="application/json")
+
+
+def _check_fingerprint(stored: str, given: str):
+    if stored != given:
+        raise HTTPException(status_code=422, detail="Idempotency-Key was already used with a different request")
+
+
+def _replay(status_code: int, body: bytes) -> Response:
+    return Response(body, status_code=status_code, media_type="application/json", headers={REPLAYED_HEADER: "true"})
+
+
+def _in_progress() -> HTTPException:
+    return HTTPException(
+        status_code=409,
+        detail="A request with this Idempotency-Key is still in progress",
+        headers={"Retry-After": "1"},
+    )
+
+
+async def _reserve(key: str, fingerprint_: str) -> Optional[Response]:
+    """
+    Take the Redis marker for ``key``, or wait for the response of the request
+    holding it. Returns a replay, or None when this request should run
+    (including when Redis is unavailable).
+    """
+    client = redis_client()
+    if client is None:
+        return None
+    pending = orjson.dumps({"fingerprint": fingerprint_})
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + settings.IDEMPOTENCY_WAIT_SECONDS
+    try:
+        while True:
+            if await client.set(key, pending, nx=True, ex=settings.IDEMPOTENCY_LOCK_SECONDS):
+                return None
+            raw = await client.get(key)
+            if raw is not None:
+                stored = orjson.loads(raw)
+                _check_fingerprint(stored["fingerprint"], fingerprint_)
+                if "status_code" in stored:
+                    return _replay(stored["status_code"], stored["body"].encode())
+            if loop.time() >= deadline:
+                raise _in_progress()
+            await asyncio.sleep(POLL_SECONDS)
+    except RedisError:
+        return None
+
+
+async def _redis_call(method: str, *args, **kwargs):
+    client = redis_client()
+    if client is None:
+        return
+    try:
+        await getattr(client, method)(*args, **kwargs)
+    except RedisError:
+        pass
+
+
+@asynccontextmanager
+async def claim(db: AsyncSession, key: Optional[str], fingerprint_: str):
+    """
+    Run the body of the block at most once per ``key`` (None: no key, always run).
+    If ``replay`` is set, return it instead of doing the work; otherwise call
+    ``complete()`` with the response before committing. An exception leaves the
+    key unclaimed so the client can retry.
+    """
+    if key is None:
+        yield Claim()
+        return
+
+    redis_key = f"idempotency:{key}"
+    replay = await _reserve(redis_key, fingerprint_)
+    if replay is not None:
+        yield Claim(replay=replay)
+        return
+
+    outcome = Claim(IdempotencyKey(key=key, fingerprint=fingerprint_))
+    try:
+        # With Postgres a concurrent request holding the same key blocks this
+        # insert until it commits, then fails on the primary key
+        db.add(outcome.record)
+        try:
+            await db.flush()
+        except IntegrityError:
+            await db.rollback()
+            stored = await db.get(IdempotencyKey, key)
+            if stored is None or stored.response is None:
+                raise _in_progress()
+            _check_fingerprint(stored.fingerprint, fingerprint_)
+            outcome = Claim(replay=_replay(stored.status_code, stored.response))
+            outcome.result = (stored.status_code, stored.response)
+        yield outcome
+    except BaseException:
+        await _redis_call("delete", redis_key)
+        raise
+
+    if outcome.result is None:
+        await _redis_call("delete", redis_key)
+        return
+    status_code, body = outcome.result
+    await _redis_call(
+        "set",
+        redis_key,
+        orjson.dumps({"fingerprint": fingerprint_, "status_code": status_code, "body": body.decode()}),
+        ex=settings.IDEMPOTENCY_TTL_SECONDS,
+    )
+
+
+async def purge_expired() -> int:
+    """Delete idempotency rows older than IDEMPOTENCY_TTL_SECONDS."""
+    cutoff = datetime.utcnow() - timedelta(seconds=settings.IDEMPOTENCY_TTL_SECONDS)
+    async with SessionLocal() as db:
+        result = await db.execute(delete(IdempotencyKey).where(IdempotencyKey.created_at < cutoff))
+        await db.commit()
+        return result.rowcount
+
+
+async def run_purger():
+    """Purge expired idempotency rows every IDEMPOTENCY_PURGE_INTERVAL_SECONDS until cancelled."""
+    while True:
+        try:
+            await purge_expired()
+        except Exception as e:
+            logger.warning("Idempotency key purge failed: %s", e)
+        await asyncio.sleep(settings.IDEMPOTENCY_PURGE_INTERVAL_SECONDS)
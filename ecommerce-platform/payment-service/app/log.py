@@ -0,0 +1,193 @@
+# ============================================================
+# Payment Service – Structured Logging
+# JSON lines on stdout (one object per record, for Loki). Log
+# calls on the event loop only enqueue the record; a listener
+# thread formats and writes it. Records carry the id of the
+# request being served, DEBUG records are sampled and levels
+# are set per module from Settings.
+# ============================================================
+import copy
+import itertools
+import logging
+import queue
+import sys
+import time
+import uuid
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
+
+import orjson
+
+from app.config import settings
+from app.tracing import current_trace_id
+
+SERVICE = "payment-service"
+
+request_id_var: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+
+# Attributes every LogRecord has; anything else came in through ``extra=``
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "request_id", "trace_id"}
+_exc_formatter = logging.Formatter()
+_listener: Optional[QueueListener] = None
+
+access_logger = logging.getLogger("app.access")
+# Probes and scrapes are logged at DEBUG (and so sampled)
+QUIET_PATHS = {"/health", "/ready", "/metrics"}
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record: timestamp, level, logger, message, request/trace ids and ``extra`` fields."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        doc = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname.lower(),
+            "service": SERVICE,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        request_id = getattr(record, "request_id", None)
+        if request_id:
+            doc["request_id"] = request_id
+        trace_id = getattr(record, "trace_id", None)
+        if trace_id:
+            doc["trace_id"] = trace_id
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS:
+                doc[key] = value
+        if record.exc_text:
+            doc["exc"] = record.exc_text
+        return orjson.dumps(doc, default=str).decode()
+
+
+class AsyncQueueHandler(QueueHandler):
+    """
+    Enqueues a copy of the record with its message and traceback rendered and
+    the current request and trace ids attached (context variables don't reach
+    the listener thread); JSON encoding and the stdout write happen there.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg, record.args = record.getMessage(), None
+        if record.exc_info:
+            record.exc_text = _exc_formatter.formatException(record.exc_info)
+            record.exc_info = None
+        record.request_id = request_id_var.get()
+        record.trace_id = current_trace_id()
+        return record
+
+
+class DebugSampler(logging.Filter):
+    """Passes one in ``every`` DEBUG records (per logger) and every record above DEBUG."""
+
+    def __init__(self, every: int):
+        super().__init__()
+        self.every = max(1, every)
+        self._counters: dict = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.DEBUG or self.every == 1:
+            return True
+        counter = self._counters.get(record.name)
+        if counter is None:
+            counter = self._counters[record.name] = itertools.count()
+        return next(counter) % self.every == 0
+
+
+def parse_levels(spec: str) -> dict:
+    """"app.messaging=DEBUG,aio_pika=WARNING" -> {"app.messaging": "DEBUG", "aio_pika": "WARNING"}"""
+    levels = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        name, _, level = item.partition("=")
+        levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def configure_logging(stream=None):
+    """
+    Route all logging through the queue handler to ``stream`` (stdout) as JSON.
+    Called at worker startup: the listener thread would not survive gunicorn's
+    fork of a preloaded app.
+    """
+    global _listener
+    if _listener is not None:
+        return
+    records: queue.Queue = queue.Queue(-1)
+    handler = AsyncQueueHandler(records)
+    handler.addFilter(DebugSampler(settings.LOG_DEBUG_SAMPLE_EVERY))
+    output = logging.StreamHandler(stream or sys.stdout)
+    output.setFormatter(JsonFormatter())
+
+    root = logging.getLogger()
+    root.handlers = [handler]
+    root.setLevel(settings.LOG_LEVEL.upper())
+    for name, level in parse_levels(settings.LOG_LEVELS).items():
+        logging.getLogger(name).setLevel(level)
+    # uvicorn's own loggers go through the root handler too; requests are
+    # logged by RequestIdMiddleware
+    for name in ("uvicorn", "uvicorn.error", "uvicorn.access"):
+        logging.getLogger(name).handlers = []
+        logging.getLogger(name).propagate = True
+    logging.getLogger("uvicorn.access").disabled = True
+
+    _listener = QueueListener(records, output)
+    _listener.start()
+
+
+def shutdown_logging():
+    """Write out queued records and stop the listener thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+class RequestIdMiddleware:
+    """
+    Pure ASGI middleware giving every request an id (the caller's X-Request-ID
+    or a new one), exposing it to log records and echoing it in the response,
+    then logging one access line per request.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = None
+        for name, value in scope["headers"]:
+            if name == b"x-request-id":
+                request_id = value.decode("latin-1")[:128]
+                break
+        request_id = request_id or uuid.uuid4().hex
+        token = request_id_var.set(request_id)
+        start = time.perf_counter()
+        status_code = 500
+
+        async def send_with_request_id(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                message["headers"] = [*message.get("headers", []), (b"x-request-id", request_id.encode("latin-1"))]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_request_id)
+        finally:
+            access_logger.log(
+                logging.DEBUG if scope["path"] in QUIET_PATHS else logging.INFO,
+                "%s %s %s", scope["method"], scope["path"], status_code,
+                extra={
+                    "method": scope["method"],
+                    "path": scope["path"],
+                    "status": status_code,
+                    "duration_ms": round((time.perf_counter() - start) * 1000, 2),
+                },
+            )
+            request_id_var.reset(token)
@@ -1,23 +1,58 @@
 # ============================================================
 # Payment Service – FastAPI Application Entry Point
 # ============================================================
+import asyncio
+import logging
 from contextlib import asynccontextmanager
-from fastapi import FastAPI
+from fastapi import Depends, FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.database import engine
-from app.models import Base
+from app.database import check_schema_version, dispose_engines, engine, get_db, replicas, run_replica_monitor
 from app.routes import router as payment_router
-from app.messaging import connect_rabbitmq, close_rabbitmq
+from app.cache import cache_stats, connect_redis, close_redis
+from app.log import RequestIdMiddleware, configure_logging, shutdown_logging
+from app.metrics import MetricsMiddleware, metrics_response
+from app.ratelimit import RateLimitMiddleware, limiter_stats
+from app.tracing import TracingMiddleware, configure_tracing, shutdown_tracing
+from app.messaging import connect_rabbitmq, close_rabbitmq, consumer_stats, publisher_stats
+from app.consumer import start_consumers
+from app.idempotency import run_purger
+from app.outbox import run_outbox_relay
+from app.partitions import run_partition_maintenance
+
+logger = logging.getLogger(__name__)
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    Base.metadata.create_all(bind=engine)
-    print("✅ Payments database tables ready")
+    configure_logging()
+    configure_tracing()
+    await check_schema_version(engine)
+    logger.info("Payments database schema up to date")
+    await connect_redis()
     await connect_rabbitmq()
+    await start_consumers()
+    background = [
+        asyncio.create_task(run_outbox_relay()),
+        asyncio.create_task(run_purger()),
+        asyncio.create_task(run_replica_monitor()),
+        asyncio.create_task(run_partition_maintenance()),
+    ]
     yield
+    for task in background:
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
     await close_rabbitmq()
+    await close_redis()
+    await dispose_engines()
+    shutdown_tracing()
+    shutdown_logging()
 
 
 app = FastAPI(
@@ -25,6 +60,7 @@ app = FastAPI(
     description="Processes payments for the e-commerce platform",
     version="1.0.0",
     lifespan=lifespan,
+    default_response_class=ORJSONResponse,
 )
 
 app.add_middleware(
@@ -34,6 +70,12 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(RateLimitMiddleware)
+app.add_middleware(MetricsMiddleware)
+app.add_middleware(RequestIdMiddleware)
+# Outermost, so the request span is current for everything below it (and the
+# access line logged by RequestIdMiddleware carries the trace id)
+app.add_middleware(TracingMiddleware)
 
 
 @app.get("/health")
@@ -41,14 +83,23 @@ async def health_check():
     return {"status": "healthy", "service": "payment-service"}
 
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    return metrics_response()
+
+
 @app.get("/ready")
-async def readiness_check():
+async def readiness_check(db: AsyncSession = Depends(get_db)):
     try:
-        from app.database import SessionLocal
-        db = SessionLocal()
-        db.execute("SELECT 1")
-        db.close()
-        return {"status": "ready"}
+        await db.execute(text("SELECT 1"))
+        return {
+            "status": "ready",
+            "publisher": publisher_stats(),
+            "consumers": consumer_stats(),
+            "cache": cache_stats(),
+            "replica_lag_seconds": replicas.stats(),
+            "admission": limiter_stats(),
+        }
     except Exception as e:
         return {"status": "not ready", "error": str(e)}
 
@@ -2,7 +2,7 @@
 # Payment Service – Database Models
 # Stores payment transactions linked to orders.
 # ============================================================
-from sqlalchemy import Column, Integer, String, Float, DateTime
+from sqlalchemy import JSON, BigInteger, Column, Index, Integer, LargeBinary, String, DateTime
 from sqlalchemy.orm import declarative_base
 from datetime import datetime
 
@@ -10,15 +10,73 @@ Base = declarative_base()
 
 
 class Payment(Base):
-    """Represents a payment transaction."""
+    """
+    Represents a payment transaction. On Postgres payments is partitioned
+    by month of created_at (migration 0005) with primary key (id, created_at).
+    """
     __tablename__ = "payments"
 
     id = Column(Integer, primary_key=True, index=True)
     order_id = Column(Integer, nullable=False, index=True)
-    user_id = Column(Integer, nullable=False)
-    amount = Column(Float, nullable=False)
+    user_id = Column(Integer, nullable=False, index=True)
+    amount_cents = Column(BigInteger, nullable=False)  # integer minor units of currency
+    currency = Column(String(3), nullable=False, default="USD", server_default="USD")
     status = Column(String(50), default="pending")  # pending, completed, failed, refunded
     payment_method = Column(String(50), default="credit_card")
     transaction_id = Column(String(255), nullable=True)
-    created_at = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)  # partition key
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class ArchivedPayment(Base):
+    """A payment moved out of payments by the archival job, as its encoded document (read-only)."""
+    __tablename__ = "payments_archive"
+
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    user_id = Column(Integer, nullable=False)
+    order_id = Column(Integer, nullable=False, index=True)
+    created_at = Column(DateTime, nullable=False)
+    document = Column(LargeBinary, nullable=False)  # orjson-encoded PaymentResponse
+
+    __table_args__ = (Index("ix_payments_archive_user_id_created_at", user_id, created_at),)
+
+
+class OutboxEvent(Base):
+    """
+    A payment event waiting to be relayed to RabbitMQ, written in the same
+    transaction as the payment change (and processed_events row) it describes.
+    """
+    __tablename__ = "outbox"
+
+    id = Column(Integer, primary_key=True)
+    routing_key = Column(String(100), nullable=False)
+    payload = Column(JSON, nullable=False)
+    trace_context = Column(JSON, nullable=True)  # traceparent of the staging request/message
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
+class ProcessedEvent(Base):
+    """
+    Idempotency record for consumed events (e.g. "order.created:42").
+    Inserted in the same transaction as the side effect, so a redelivered
+    event hits the primary key and is skipped.
+    """
+    __tablename__ = "processed_events"
+
+    event_key = Column(String(255), primary_key=True)
+    processed_at = Column(DateTime, default=datetime.utcnow)
+
+
+class IdempotencyKey(Base):
+    """
+    A request made with an Idempotency-Key header and the response it got.
+    Inserted in the request's own transaction, so the key and the work it
+    guards commit together; purged after IDEMPOTENCY_TTL_SECONDS.
+    """
+    __tablename__ = "idempotency_keys"
+
+    key = Column(String(300), primary_key=True)
+    fingerprint = Column(String(64), nullable=False)  # sha256 of the request body
+    status_code = Column(Integer, nullable=True)
+    response = Column(LargeBinary, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
@@ -0,0 +1,188 @@
+# ============================================================
+# Payment Service – Partition Maintenance and Archival
+# Keeps future monthly partitions of payments (Postgres; rows
+# that reached the DEFAULT partition are moved into them),
+# reports how far ahead they reach, and moves payments older
+# than ARCHIVE_AFTER_MONTHS into
+# payments_archive, dropping their partitions afterwards
+# (deleting the rows on other databases).
+# ============================================================
+import asyncio
+import logging
+import re
+from datetime import datetime
+from typing import Optional
+
+import orjson
+from sqlalchemy import delete, select, text, tuple_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from app import documents
+from app.config import settings
+from app.database import SessionLocal, engine
+from app.metrics import PARTITION_HORIZON
+from app.models import ArchivedPayment, Payment
+
+logger = logging.getLogger(__name__)
+
+PARTITION_NAME = re.compile(r"^payments_y(?P<year>\d{4})m(?P<month>\d{2})$")
+MIN_HORIZON_DAYS = 31
+
+
+def month_start(moment: datetime, months: int = 0) -> datetime:
+    index = moment.year * 12 + moment.month - 1 + months
+    return datetime(index // 12, index % 12 + 1, 1)
+
+
+def archive_cutoff(now: Optional[datetime] = None) -> Optional[datetime]:
+    if settings.ARCHIVE_AFTER_MONTHS <= 0:
+        return None
+    return month_start(now or datetime.utcnow(), -settings.ARCHIVE_AFTER_MONTHS)
+
+
+async def _partition_months(conn) -> list:
+    """(name, first day) of the monthly partitions of payments, oldest first."""
+    children = (await conn.execute(text(
+        "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = CAST('payments' AS regclass)"
+    ))).scalars().all()
+    months = [(name, PARTITION_NAME.match(name)) for name in children]
+    return sorted(
+        ((name, datetime(int(match["year"]), int(match["month"]), 1)) for name, match in months if match),
+        key=lambda month: month[1],
+    )
+
+
+async def ensure_partitions(now: Optional[datetime] = None):
+    if engine.dialect.name != "postgresql":
+        return
+    now = now or datetime.utcnow()
+    async with engine.begin() as conn:
+        existing = {name for name, _ in await _partition_months(conn)}
+        for offset in range(settings.PARTITION_PREMAKE_MONTHS + 1):
+            start, end = month_start(now, offset), month_start(now, offset + 1)
+            name = f"payments_y{start.year}m{start.month:02d}"
+            if name in existing:
+                continue
+            stray = await conn.scalar(text(
+                "SELECT EXISTS (SELECT 1 FROM payments_default WHERE created_at >= :start AND created_at < :end)"
+            ), {"start": start, "end": end})
+            # A partition can't be attached over default rows of its range: move them in
+            if stray:
+                await conn.execute(text("ALTER TABLE payments DETACH PARTITION payments_default"))
+            await conn.execute(text(
+                f"CREATE TABLE {name} PARTITION OF payments "
+                f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+            ))
+            if stray:
+                await conn.execute(text(
+                    "WITH moved AS (DELETE FROM payments_default WHERE created_at >= :start AND created_at < :end "
+                    "RETURNING *) INSERT INTO payments SELECT * FROM moved"
+                ), {"start": start, "end": end})
+                await conn.execute(text("ALTER TABLE payments ATTACH PARTITION payments_default DEFAULT"))
+                logger.warning("Moved payments out of the default partition into %s", name)
+
+
+async def check_partition_horizon(now: Optional[datetime] = None) -> Optional[float]:
+    """Days until the newest partition ends (db_partition_horizon_days); an error under MIN_HORIZON_DAYS."""
+    if engine.dialect.name != "postgresql":
+        return None
+    now = now or datetime.utcnow()
+    async with engine.connect() as conn:
+        months = await _partition_months(conn)
+    horizon = ((month_start(months[-1][1], 1) if months else now) - now).total_seconds() / 86400
+    PARTITION_HORIZON.labels("payments").set(horizon)
+    if horizon < MIN_HORIZON_DAYS:
+        logger.error("Partitions of payments end in %.1f days: is partition maintenance running?", horizon)
+    return horizon
+
+
+async def archive_batch(cutoff: datetime, batch_size: int) -> int:
+    """Copy the oldest payments created before ``cutoff`` to payments_archive (deleted here unless on Postgres)."""
+    postgres = engine.dialect.name == "postgresql"
+    async with SessionLocal() as db:
+        query = (
+            select(*documents.PAYMENT_COLUMNS)
+            .where(Payment.created_at < cutoff)
+            .order_by(Payment.created_at, Payment.id)
+            .limit(batch_size)
+        )
+        if postgres:
+            # Archived rows stay until their partition is dropped
+            last = (await db.execute(
+                select(ArchivedPayment.created_at, ArchivedPayment.id)
+                .where(ArchivedPayment.created_at < cutoff)
+                .order_by(ArchivedPayment.created_at.desc(), ArchivedPayment.id.desc())
+                .limit(1)
+            )).first()
+            if last is not None:
+                query = query.where(tuple_(Payment.created_at, Payment.id) > tuple_(*last))
+
+        payments = documents.assemble(await db.execute(query))
+        if not payments:
+            return 0
+        insert = pg_insert if postgres else sqlite_insert
+        await db.execute(insert(ArchivedPayment).values([
+            {"id": p["id"], "user_id": p["user_id"], "order_id": p["order_id"], "created_at": p["created_at"], "document": orjson.dumps(p)}
+            for p in payments
+        ]).on_conflict_do_nothing(index_elements=[ArchivedPayment.id]))
+        if not postgres:
+            await db.execute(delete(Payment).where(Payment.id.in_([p["id"] for p in payments])))
+        await db.commit()
+        return len(payments)
+
+
+async def drop_archived_partitions(cutoff: datetime) -> list:
+    if engine.dialect.name != "postgresql":
+        return []
+    dropped = []
+    async with engine.begin() as conn:
+        for name, start in await _partition_months(conn):
+            if month_start(start, 1) <= cutoff:
+                await conn.execute(text(f"DROP TABLE {name}"))
+                dropped.append(name)
+    return dropped
+
+
+async def archive_payments(now: Optional[datetime] = None) -> int:
+    cutoff = archive_cutoff(now)
+    if cutoff is None:
+        return 0
+    archived = 0
+    while True:
+        count = await archive_batch(cutoff, settings.ARCHIVE_BATCH_SIZE)
+        archived += count
+        if count < settings.ARCHIVE_BATCH_SIZE:
+            break
+    dropped = await drop_archived_partitions(cutoff)
+    if archived or dropped:
+        logger.info("Archived %d payments created before %s", archived, cutoff.date(), extra={"dropped": dropped})
+    return archived
+
+
+async def maintain_partitions():
+    if engine.dialect.name != "postgresql":
+        await archive_payments()
+        return
+    # One worker at a time; every worker reports the horizon
+    try:
+        async with engine.connect() as conn:
+            if not await conn.scalar(text("SELECT pg_try_advisory_lock(hashtext('payments_partitions'))")):
+                return
+            try:
+                await ensure_partitions()
+                await archive_payments()
+            finally:
+                await conn.execute(text("SELECT pg_advisory_unlock(hashtext('payments_partitions'))"))
+    finally:
+        await check_partition_horizon()
+
+
+async def run_partition_maintenance():
+    while True:
+        try:
+            await maintain_partitions()
+        except Exception as e:
+            logger.warning("Partition maintenance failed: %s", e)
+        await asyncio.sleep(settings.PARTITION_MAINTENANCE_INTERVAL_SECONDS)
@@ -0,0 +1,65 @@
+# ============================================================
+# Payment Service – Payment Processing
+# Shared by the HTTP route and the order.created consumer.
+# Simulates payment processing (no real payment gateway).
+# ============================================================
+import uuid
+from typing import Optional
+
+import orjson
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.cache import invalidate, order_payments_key
+from app.database import mark_write
+from app.idempotency import Claim
+from app.models import Payment
+from app.outbox import enqueue_event
+from app.schemas import PaymentResponse
+
+
+async def process_payment(
+    db: AsyncSession,
+    order_id: int,
+    user_id: int,
+    amount_cents: int,
+    currency: str = "USD",
+    payment_method: str = "credit_card",
+    claim: Optional[Claim] = None,
+) -> Payment:
+    """
+    Charge an order and stage payment.completed in the outbox, committed
+    together with the payment (and whatever else the caller added to ``db``).
+    Simulates payment processing with a generated transaction ID.
+    In production, this would integrate with Stripe/PayPal/etc.
+    An idempotency ``claim`` gets the response committed with the payment.
+    """
+    # Generate a mock transaction ID
+    transaction_id = f"txn_{uuid.uuid4().hex[:16]}"
+
+    payment = Payment(
+        order_id=order_id,
+        user_id=user_id,
+        amount_cents=amount_cents,
+        currency=currency,
+        payment_method=payment_method,
+        transaction_id=transaction_id,
+        status="completed",  # Simulate successful payment
+    )
+    db.add(payment)
+    await db.flush()
+    enqueue_event(db, "payment.completed", {
+        "payment_id": payment.id,
+        "order_id": payment.order_id,
+        "amount_cents": payment.amount_cents,
+        "currency": payment.currency,
+        "transaction_id": transaction_id,
+        "status": payment.status,
+        "updated_at": payment.updated_at.isoformat(),
+    })
+    if claim is not None:
+        claim.complete(201, orjson.dumps(PaymentResponse.model_validate(payment).model_dump(mode="json")))
+    await db.commit()
+    await mark_write(user_id)
+    await invalidate(order_payments_key(order_id))
+    await db.refresh(payment)
+    return payment
@@ -1,17 +1,25 @@
 # ============================================================
 # Payment Service – Payment Routes
 # Processes payments for orders.
-# Simulates payment processing (no real payment gateway).
 # ============================================================
-import uuid
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-
-from app.database import get_db
-from app.models import Payment
-from app.schemas import PaymentCreate, PaymentResponse, PaymentUpdate
+from datetime import datetime
+from typing import Literal, Optional
+
+import orjson
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response, status
+from fastapi.responses import ORJSONResponse
+from sqlalchemy import select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database import get_db, get_read_db, mark_write, session_like
+from app.models import ArchivedPayment, Payment
+from app.schemas import PaymentCreate, PaymentResponse, PaymentUpdate, to_minor
 from app.auth import get_current_user
-from app.messaging import publish_message
+from app.cache import get_or_load, invalidate, order_payments_key, payment_key
+from app.outbox import enqueue_event
+from app.payments import process_payment
+from app.export import export_response
+from app import documents, idempotency
 
 router = APIRouter(prefix="/api/payments", tags=["payments"])
 
@@ -19,104 +27,177 @@ router = APIRouter(prefix="/api/payments", tags=["payments"])
 @router.post("/", response_model=PaymentResponse, status_code=status.HTTP_201_CREATED)
 async def create_payment(
     payment_data: PaymentCreate,
-    db: Session = Depends(get_db),
+    idempotency_key: Optional[str] = Header(None, max_length=255),
+    db: AsyncSession = Depends(get_db),
 ):
     """
-    Create a payment for an order.
-    Simulates payment processing with a generated transaction ID.
-    In production, this would integrate with Stripe/PayPal/etc.
+    Create a payment for an order directly over HTTP.
+    Orders normally get paid through the order.created consumer.
+    Retries with the same Idempotency-Key (per user) get the first response back.
     """
-    # Generate a mock transaction ID
-    transaction_id = f"txn_{uuid.uuid4().hex[:16]}"
-
-    payment = Payment(
-        order_id=payment_data.order_id,
-        user_id=payment_data.user_id,
-        amount=payment_data.amount,
-        payment_method=payment_data.payment_method,
-        transaction_id=transaction_id,
-        status="completed",  # Simulate successful payment
-    )
-    db.add(payment)
-    db.commit()
-    db.refresh(payment)
-
-    # Publish payment.completed event
-    await publish_message("payment.completed", {
-        "payment_id": payment.id,
-        "order_id": payment.order_id,
-        "amount": payment.amount,
-        "transaction_id": transaction_id,
-    })
-
-    return payment
+    key = f"payments:{payment_data.user_id}:{idempotency_key}" if idempotency_key else None
+    async with idempotency.claim(db, key, idempotency.fingerprint(payment_data)) as claim:
+        if claim.replay:
+            return claim.replay
+        return await process_payment(
+            db,
+            order_id=payment_data.order_id,
+            user_id=payment_data.user_id,
+            amount_cents=to_minor(payment_data.amount),
+            currency=payment_data.currency,
+            payment_method=payment_data.payment_method,
+            claim=claim,
+        )
+
+
+async def _archived_payments(db: AsyncSession, user_id: int, live: list, order_id: Optional[int] = None) -> list:
+    """
+    The user's archived payments (only ``order_id``'s if given) missing from
+    ``live``; on Postgres archived rows stay live until their partition is dropped.
+    """
+    query = select(ArchivedPayment.document).where(ArchivedPayment.user_id == user_id)
+    if order_id is not None:
+        query = query.where(ArchivedPayment.order_id == order_id)
+    live_ids = {payment["id"] for payment in live}
+    archived = documents.decode_archived(await db.execute(query.order_by(ArchivedPayment.created_at)))
+    return [payment for payment in archived if payment["id"] not in live_ids]
 
 
 @router.get("/", response_model=list[PaymentResponse])
 async def list_payments(
-    db: Session = Depends(get_db),
+    include_archived: bool = False,
+    db: AsyncSession = Depends(get_read_db),
     user: dict = Depends(get_current_user),
 ):
-    """List all payments for the authenticated user."""
-    payments = db.query(Payment).filter(Payment.user_id == user["id"]).all()
-    return payments
+    """List all payments for the authenticated user (archived ones too if asked), built from row tuples."""
+    result = await db.execute(select(*documents.PAYMENT_COLUMNS).where(Payment.user_id == user["id"]))
+    payments = documents.assemble(result)
+    if include_archived:
+        payments += await _archived_payments(db, user["id"], payments)
+    return ORJSONResponse(payments)
+
+
+@router.get("/export")
+async def export_payments(
+    fmt: Literal["ndjson", "csv"] = Query("ndjson", alias="format"),
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    status_: Optional[str] = Query(None, alias="status"),
+    include_archived: bool = False,
+    user: dict = Depends(get_current_user),
+):
+    """Stream the authenticated user's payments as NDJSON or CSV, filtered in SQL (archived ones first if asked)."""
+    query = (
+        select(
+            Payment.id, Payment.order_id, Payment.status, Payment.amount_cents, Payment.currency,
+            Payment.payment_method, Payment.transaction_id, Payment.created_at, Payment.updated_at,
+        )
+        .where(Payment.user_id == user["id"])
+        .order_by(Payment.created_at, Payment.id)
+    )
+    if since:
+        query = query.where(Payment.created_at >= since)
+    if until:
+        query = query.where(Payment.created_at < until)
+    if status_:
+        query = query.where(Payment.status == status_)
+    if not include_archived:
+        return export_response(query, fmt, "payments")
+
+    archived = (
+        select(ArchivedPayment.document)
+        .where(ArchivedPayment.user_id == user["id"])
+        .order_by(ArchivedPayment.created_at, ArchivedPayment.id)
+    )
+    if since:
+        archived = archived.where(ArchivedPayment.created_at >= since)
+    if until:
+        archived = archived.where(ArchivedPayment.created_at < until)
+    return export_response(
+        query, fmt, "payments", archived=archived,
+        keep=(lambda payment: payment["status"] == status_) if status_ else None,
+        after=lambda created_at, payment_id: query.where(
+            tuple_(Payment.created_at, Payment.id) > tuple_(created_at, payment_id)
+        ),
+    )
 
 
 @router.get("/{payment_id}", response_model=PaymentResponse)
 async def get_payment(
     payment_id: int,
-    db: Session = Depends(get_db),
+    include_archived: bool = False,
+    db: AsyncSession = Depends(get_read_db),
     user: dict = Depends(get_current_user),
 ):
-    """Get a specific payment by ID."""
-    payment = db.query(Payment).filter(
-        Payment.id == payment_id,
-        Payment.user_id == user["id"],
-    ).first()
-    if not payment:
+    """Get a specific payment by ID, read through the Redis cache (or from the archive if asked)."""
+    async def load() -> Optional[bytes]:
+        async with session_like(db) as session:
+            result = await session.execute(select(*documents.PAYMENT_COLUMNS).where(Payment.id == payment_id))
+            payments = documents.assemble(result)
+        return orjson.dumps(payments[0]) if payments else None
+
+    document = await get_or_load(payment_key(payment_id), load)
+    if document is None and include_archived:
+        document = (await db.execute(
+            select(ArchivedPayment.document)
+            .where(ArchivedPayment.id == payment_id, ArchivedPayment.user_id == user["id"])
+        )).scalar()
+    if document is None or orjson.loads(document)["user_id"] != user["id"]:
         raise HTTPException(status_code=404, detail="Payment not found")
-    return payment
+    return Response(content=document, media_type="application/json")
 
 
 @router.put("/{payment_id}", response_model=PaymentResponse)
 async def update_payment(
     payment_id: int,
     update: PaymentUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     user: dict = Depends(get_current_user),
 ):
     """Update payment status (e.g., refund)."""
-    payment = db.query(Payment).filter(
-        Payment.id == payment_id,
-        Payment.user_id == user["id"],
-    ).first()
+    result = await db.execute(
+        select(Payment).where(
+            Payment.id == payment_id,
+            Payment.user_id == user["id"],
+        )
+    )
+    payment = result.scalar_one_or_none()
     if not payment:
         raise HTTPException(status_code=404, detail="Payment not found")
 
     if update.status:
         payment.status = update.status
-
-    db.commit()
-    db.refresh(payment)
-
-    await publish_message("payment.updated", {
+    await db.flush()
+    enqueue_event(db, "payment.updated", {
         "payment_id": payment.id,
         "order_id": payment.order_id,
         "status": payment.status,
+        "updated_at": payment.updated_at.isoformat(),
     })
 
+    await db.commit()
+    await mark_write(user["id"])
+    await invalidate(payment_key(payment.id), order_payments_key(payment.order_id))
+    await db.refresh(payment)
     return payment
 
 
 @router.get("/order/{order_id}", response_model=list[PaymentResponse])
 async def get_payments_by_order(
     order_id: int,
-    db: Session = Depends(get_db),
+    include_archived: bool = False,
+    db: AsyncSession = Depends(get_read_db),
     user: dict = Depends(get_current_user),
 ):
-    """Get all payments for a specific order."""
-    payments = db.query(Payment).filter(
-        Payment.order_id == order_id,
-        Payment.user_id == user["id"],
-    ).all()
-    return payments
+    """Get all payments for a specific order, read through the Redis cache (archived ones too if asked)."""
+    async def load() -> bytes:
+        async with session_like(db) as session:
+            result = await session.execute(select(*documents.PAYMENT_COLUMNS).where(Payment.order_id == order_id))
+            return orjson.dumps(documents.assemble(result))
+
+    # The cached list holds every payment of the order; only the caller's are returned
+    payments = orjson.loads(await get_or_load(order_payments_key(order_id), load))
+    payments = [payment for payment in payments if payment["user_id"] == user["id"]]
+    if include_archived:
+        payments += await _archived_payments(db, user["id"], payments, order_id)
+    return Response(content=orjson.dumps(payments), media_type="application/json")
@@ -1,14 +1,31 @@
 # ============================================================
 # Payment Service – Schemas
 # ============================================================
-from pydantic import BaseModel
-from typing import Optional
+from pydantic import BaseModel, Field, PlainSerializer, computed_field, model_validator
+from typing import Annotated, Optional
 from datetime import datetime
+from decimal import Decimal
+
+# Decimal at the API edge, integer minor units (cents) in the database
+Money = Annotated[
+    Decimal,
+    Field(max_digits=14, decimal_places=2),
+    PlainSerializer(float, return_type=float, when_used="json"),
+]
+
+
+def to_minor(amount: Decimal) -> int:
+    return int(amount.scaleb(2))
+
+
+def from_minor(cents: int) -> Decimal:
+    return Decimal(cents).scaleb(-2)
 
 
 class PaymentCreate(BaseModel):
     order_id: int
-    amount: float
+    amount: Money
+    currency: str = Field("USD", pattern="^[A-Z]{3}$")
     user_id: int
     payment_method: str = "credit_card"
 
@@ -17,16 +34,38 @@ class PaymentResponse(BaseModel):
     id: int
     order_id: int
     user_id: int
-    amount: float
+    amount_cents: int
+    currency: str
     status: str
     payment_method: str
     transaction_id: Optional[str]
     created_at: datetime
     updated_at: datetime
 
+    @computed_field
+    @property
+    def amount(self) -> Money:
+        return from_minor(self.amount_cents)
+
     class Config:
         from_attributes = True
 
 
 class PaymentUpdate(BaseModel):
     status: Optional[str] = None
+
+
+class OrderCreatedEvent(BaseModel):
+    """order.created event published by order-service."""
+    order_id: int
+    user_id: int
+    total_cents: int
+    currency: str = "USD"
+
+    @model_validator(mode="before")
+    @classmethod
+    def _from_float_total(cls, data):
+        # Events written before the switch to minor units carry a float "total"
+        if isinstance(data, dict) and "total_cents" not in data and "total" in data:
+            data = {**data, "total_cents": to_minor(Decimal(str(data["total"])).quantize(Decimal("0.01")))}
+        return data
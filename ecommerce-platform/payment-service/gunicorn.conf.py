@@ -0,0 +1,36 @@
+# ============================================================
+# Payment Service – Gunicorn Configuration (production)
+# Pre-forks WEB_CONCURRENCY uvicorn workers from a preloaded
+# app and recycles each after about MAX_REQUESTS requests.
+# SIGTERM drains in-flight requests, then every worker runs
+# its lifespan shutdown (RabbitMQ, Redis, DB pool).
+#
+#   gunicorn -c gunicorn.conf.py app.main:app
+# ============================================================
+import os
+import shutil
+
+from app.config import settings
+
+bind = f"0.0.0.0:{settings.PORT}"
+worker_class = "app.server.Worker"
+workers = settings.WEB_CONCURRENCY
+preload_app = True
+max_requests = settings.MAX_REQUESTS
+max_requests_jitter = settings.MAX_REQUESTS_JITTER
+graceful_timeout = settings.GRACEFUL_TIMEOUT_SECONDS
+# Heartbeat files on tmpfs so a slow overlay filesystem can't stall workers
+worker_tmp_dir = "/dev/shm"
+
+# Workers write Prometheus samples here; /metrics aggregates them.
+# Start from an empty directory so a previous run isn't summed in.
+_metrics_dir = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+if _metrics_dir:
+    shutil.rmtree(_metrics_dir, ignore_errors=True)
+    os.makedirs(_metrics_dir, exist_ok=True)
+
+
+def child_exit(server, worker):
+    if _metrics_dir:
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
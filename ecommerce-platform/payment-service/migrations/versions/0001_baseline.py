@@ -0,0 +1,37 @@
+"""Baseline: payments as first created by create_all
+
+Databases that were created by the old startup create_all are already at
+this revision; env.py stamps them with it before upgrading.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "payments",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("order_id", sa.Integer(), nullable=False),
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("amount", sa.Float(), nullable=False),
+        sa.Column("status", sa.String(50)),
+        sa.Column("payment_method", sa.String(50)),
+        sa.Column("transaction_id", sa.String(255), nullable=True),
+        sa.Column("created_at", sa.DateTime()),
+        sa.Column("updated_at", sa.DateTime()),
+    )
+    op.create_index("ix_payments_id", "payments", ["id"])
+    op.create_index("ix_payments_order_id", "payments", ["order_id"])
+
+
+def downgrade():
+    op.drop_table("payments")
@@ -0,0 +1,29 @@
+"""processed_events table and payments.user_id index
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "processed_events",
+        sa.Column("event_key", sa.String(255), primary_key=True),
+        sa.Column("processed_at", sa.DateTime()),
+    )
+    # CONCURRENTLY keeps payments writable while the index builds
+    with op.get_context().autocommit_block():
+        op.create_index("ix_payments_user_id", "payments", ["user_id"], postgresql_concurrently=True)
+
+
+def downgrade():
+    op.drop_index("ix_payments_user_id", "payments")
+    op.drop_table("processed_events")
@@ -0,0 +1,31 @@
+"""Store payments.amount as integer minor units with a currency
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column("payments", sa.Column("amount_cents", sa.BigInteger(), nullable=True))
+    op.add_column("payments", sa.Column("currency", sa.String(3), nullable=False, server_default="USD"))
+    op.execute("UPDATE payments SET amount_cents = CAST(ROUND(amount * 100) AS BIGINT)")
+    with op.batch_alter_table("payments") as batch:
+        batch.alter_column("amount_cents", existing_type=sa.BigInteger(), nullable=False)
+        batch.drop_column("amount")
+
+
+def downgrade():
+    op.add_column("payments", sa.Column("amount", sa.Float(), nullable=True))
+    op.execute("UPDATE payments SET amount = amount_cents / 100.0")
+    with op.batch_alter_table("payments") as batch:
+        batch.alter_column("amount", existing_type=sa.Float(), nullable=False)
+        batch.drop_column("currency")
+        batch.drop_column("amount_cents")
@@ -0,0 +1,101 @@
+"""Monthly range partitions of payments, payments_archive
+
+payments.created_at becomes NOT NULL. On Postgres payments is rebuilt as
+a table partitioned by RANGE (created_at), one partition per month from
+the oldest payment to PARTITION_PREMAKE_MONTHS ahead plus a DEFAULT
+partition, with primary key (id, created_at). Rows are copied, so run it
+in a maintenance window on large databases.
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-17
+"""
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.config import settings
+
+revision = "0005"
+down_revision = "0004"
+branch_labels = None
+depends_on = None
+
+
+def _month_start(moment: datetime, months: int = 0) -> datetime:
+    index = moment.year * 12 + moment.month - 1 + months
+    return datetime(index // 12, index % 12 + 1, 1)
+
+
+def _create_indexes():
+    op.create_index("ix_payments_id", "payments", ["id"])
+    op.create_index("ix_payments_order_id", "payments", ["order_id"])
+    op.create_index("ix_payments_user_id", "payments", ["user_id"])
+
+
+def _partition():
+    bind = op.get_bind()
+    op.execute("ALTER TABLE payments RENAME TO payments_unpartitioned")
+    op.execute(
+        "CREATE TABLE payments (LIKE payments_unpartitioned INCLUDING DEFAULTS) PARTITION BY RANGE (created_at)"
+    )
+    now = datetime.utcnow()
+    oldest = bind.execute(sa.text("SELECT min(created_at) FROM payments_unpartitioned")).scalar() or now
+    start, last = _month_start(min(oldest, now)), _month_start(now, settings.PARTITION_PREMAKE_MONTHS)
+    while start <= last:
+        end = _month_start(start, 1)
+        op.execute(
+            f"CREATE TABLE payments_y{start.year}m{start.month:02d} PARTITION OF payments "
+            f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+        )
+        start = end
+    op.execute("CREATE TABLE payments_default PARTITION OF payments DEFAULT")
+    op.execute("INSERT INTO payments SELECT * FROM payments_unpartitioned")
+    op.execute("ALTER SEQUENCE payments_id_seq OWNED BY payments.id")
+    op.execute("DROP TABLE payments_unpartitioned")
+    op.execute("ALTER TABLE payments ADD PRIMARY KEY (id, created_at)")
+    _create_indexes()
+
+
+def _unpartition():
+    op.execute("ALTER TABLE payments RENAME TO payments_partitioned")
+    op.execute("CREATE TABLE payments (LIKE payments_partitioned INCLUDING DEFAULTS)")
+    op.execute("INSERT INTO payments SELECT * FROM payments_partitioned")
+    op.execute("ALTER SEQUENCE payments_id_seq OWNED BY payments.id")
+    op.execute("DROP TABLE payments_partitioned")
+    op.execute("ALTER TABLE payments ADD PRIMARY KEY (id)")
+    _create_indexes()
+
+
+def upgrade():
+    op.execute(
+        sa.text("UPDATE payments SET created_at = :now WHERE created_at IS NULL").bindparams(now=datetime.utcnow())
+    )
+    with op.batch_alter_table("payments") as batch:
+        batch.alter_column("created_at", existing_type=sa.DateTime(), nullable=False)
+
+    op.create_table(
+        "payments_archive",
+        sa.Column("id", sa.Integer(), primary_key=True, autoincrement=False),
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.Column("document", sa.LargeBinary(), nullable=False),
+    )
+    op.create_index("ix_payments_archive_user_id_created_at", "payments_archive", ["user_id", "created_at"])
+
+    if op.get_bind().dialect.name == "postgresql":
+        _partition()
+
+
+def downgrade():
+    bind = op.get_bind()
+    if bind.execute(sa.text("SELECT count(*) FROM payments_archive")).scalar():
+        raise RuntimeError("payments_archive is not empty: archived payments would be lost")
+    if bind.dialect.name == "postgresql":
+        _unpartition()
+
+    op.drop_index("ix_payments_archive_user_id_created_at", table_name="payments_archive")
+    op.drop_table("payments_archive")
+    with op.batch_alter_table("payments") as batch:
+        batch.alter_column("created_at", existing_type=sa.DateTime(), nullable=True)
@@ -0,0 +1,41 @@
+"""payments_archive.order_id: archived payments looked up by order
+
+Backfilled from the archived documents.
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-17
+"""
+from alembic import op
+import orjson
+import sqlalchemy as sa
+
+revision = "0007"
+down_revision = "0006"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column("payments_archive", sa.Column("order_id", sa.Integer(), nullable=True))
+    bind = op.get_bind()
+    if bind.dialect.name == "postgresql":
+        op.execute(
+            "UPDATE payments_archive "
+            "SET order_id = CAST(CAST(convert_from(document, 'UTF8') AS jsonb) ->> 'order_id' AS integer)"
+        )
+    else:
+        archive = sa.table("payments_archive", sa.column("id"), sa.column("order_id"))
+        for payment_id, document in bind.execute(sa.text("SELECT id, document FROM payments_archive")).all():
+            bind.execute(
+                archive.update().where(archive.c.id == payment_id).values(order_id=orjson.loads(document)["order_id"])
+            )
+    with op.batch_alter_table("payments_archive") as batch:
+        batch.alter_column("order_id", existing_type=sa.Integer(), nullable=False)
+    op.create_index("ix_payments_archive_order_id", "payments_archive", ["order_id"])
+
+
+def downgrade():
+    op.drop_index("ix_payments_archive_order_id", table_name="payments_archive")
+    with op.batch_alter_table("payments_archive") as batch:
+        batch.drop_column("order_id")
@@ -1,32 +1,53 @@
 # Payment Service – Tests (uses SQLite in-memory, no Postgres needed)
+import asyncio
 from fastapi.testclient import TestClient
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import NullPool
+from jose import jwt
 
 from app.models import Base
-from app.database import get_db
+from app.database import get_db, get_read_db
 from app.main import app
+from app import consumer
+from app.messaging import Consumer
+from app.config import settings
+from app.metrics import instrument_engine
+from app.tracing import trace_engine
+from app.schemas import OrderCreatedEvent
 
 # --- In-memory SQLite for CI ---
-SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
-engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
-TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+SQLALCHEMY_DATABASE_URL = "sqlite+aiosqlite:///./test.db"
+engine = create_async_engine(SQLALCHEMY_DATABASE_URL, poolclass=NullPool)
+TestingSessionLocal = async_sessionmaker(engine, expire_on_commit=False, autoflush=False)
+instrument_engine(engine, "test")
+trace_engine(engine, "test")
 
-Base.metadata.create_all(bind=engine)
 
+async def _create_tables():
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
 
-def override_get_db():
-    db = TestingSessionLocal()
-    try:
+
+asyncio.run(_create_tables())
+
+
+async def override_get_db():
+    async with TestingSessionLocal() as db:
         yield db
-    finally:
-        db.close()
 
 
 app.dependency_overrides[get_db] = override_get_db
+app.dependency_overrides[get_read_db] = override_get_db
+settings.RATE_LIMIT_ENABLED = False  # one client IP for every test
 client = TestClient(app)
 
 
+def auth_headers(user_id: int = 1) -> dict:
+    token = jwt.encode({"id": user_id}, settings.JWT_SECRET, algorithm="HS256")
+    return {"Authorization": f"Bearer {token}"}
+
+
 def test_health_check():
     response = client.get("/health")
     assert response.status_code == 200
@@ -41,5 +62,353 @@ def test_create_payment_no_auth():
     assert response.status_code == 201
     data = response.json()
     assert data["amount"] == 99.99
+    assert (data["amount_cents"], data["currency"]) == (9999, "USD")
     assert data["status"] == "completed"
     assert data["transaction_id"].startswith("txn_")
+
+
+def test_get_payments_by_order():
+    """Payments for an order are only visible to their owner."""
+    created = client.post("/api/payments", json={"order_id": 42, "amount": 10.0, "user_id": 7}).json()
+    response = client.get("/api/payments/order/42", headers=auth_headers(7))
+    assert response.status_code == 200
+    assert [p["id"] for p in response.json()] == [created["id"]]
+    assert client.get(f"/api/payments/{created['id']}", headers=auth_headers(8)).status_code == 404
+
+
+def test_metrics_endpoint():
+    client.get("/api/payments/order/31337", headers=auth_headers())
+    body = client.get("/metrics").text
+    assert 'http_requests_total{method="GET",route="/api/payments/order/{order_id}",status="200"}' in body
+    assert 'db_query_duration_seconds_count{operation="SELECT"}' in body
+
+
+def test_order_created_consumer_pays_once(monkeypatch):
+    """order.created creates one payment per order even when redelivered."""
+    monkeypatch.setattr(consumer, "SessionLocal", TestingSessionLocal)
+    event = {"order_id": 501, "user_id": 9, "total_cents": 2500, "currency": "USD"}
+
+    async def deliver_twice_concurrently():
+        await asyncio.gather(consumer.handle_order_created(event), consumer.handle_order_created(event))
+
+    asyncio.run(deliver_twice_concurrently())
+    asyncio.run(consumer.handle_order_created(event))
+
+    payments = client.get("/api/payments/order/501", headers=auth_headers(9)).json()
+    assert len(payments) == 1
+    assert [e["payment_id"] for e in asyncio.run(outbox_payloads("payment.completed", order_id=501))] == [payments[0]["id"]]
+    assert (payments[0]["amount_cents"], payments[0]["amount"]) == (2500, 25.0)
+    assert payments[0]["status"] == "completed"
+
+
+async def outbox_payloads(routing_key: str, order_id: int) -> list:
+    from sqlalchemy import select
+    from app.models import OutboxEvent
+
+    async with TestingSessionLocal() as db:
+        payloads = (await db.execute(select(OutboxEvent.payload).where(OutboxEvent.routing_key == routing_key))).scalars()
+        return [p for p in payloads if p["order_id"] == order_id]
+
+
+def test_order_created_event_accepts_legacy_float_total():
+    assert OrderCreatedEvent(order_id=1, user_id=2, total=19.99).total_cents == 1999
+
+
+class FakeMessage:
+    def __init__(self, body: bytes):
+        self.body = body
+        self.headers = {}
+        self.routing_key = "order.created"
+        self.outcome = None
+        self.broken = False
+
+    @property
+    def processed(self) -> bool:
+        return self.outcome is not None
+
+    async def ack(self):
+        if self.broken:
+            raise ConnectionError("channel closed")
+        self.outcome = "ack"
+
+    async def reject(self, requeue=False):
+        self.outcome = "requeue" if requeue else "dead-letter"
+
+
+def run_consumer(handler, body: bytes) -> tuple:
+    worker = Consumer("test.queue", "test", handler, prefetch_count=1, workers=1, max_attempts=3)
+    message = FakeMessage(body)
+    asyncio.run(worker.process(message))
+    return message.outcome, worker.stats()
+
+
+def test_consumer_dead_letters_poison_messages():
+    """Undecodable or invalid events go straight to the DLQ without retries."""
+    calls = []
+
+    async def handler(data):
+        calls.append(data)
+        consumer.OrderCreatedEvent(**data)
+
+    assert run_consumer(handler, b"not json")[0] == "dead-letter"
+    assert run_consumer(handler, b'{"order_id": "x"}')[0] == "dead-letter"
+    assert len(calls) == 1
+
+
+def test_consumer_charges_legacy_float_total_events(monkeypatch):
+    """order.created events from before minor units are charged, not dead-lettered."""
+    monkeypatch.setattr(consumer, "SessionLocal", TestingSessionLocal)
+
+    outcome, stats = run_consumer(consumer.handle_order_created, b'{"order_id": 502, "user_id": 9, "total": 20.3}')
+    assert (outcome, stats["processed"], stats["dead_lettered"]) == ("ack", 1, 0)
+    payments = client.get("/api/payments/order/502", headers=auth_headers(9)).json()
+    assert [(p["amount_cents"], p["currency"]) for p in payments] == [(2030, "USD")]
+
+
+def test_consumer_retries_transient_failures():
+    attempts = []
+
+    async def flaky(data):
+        attempts.append(data)
+        if len(attempts) < 2:
+            raise ConnectionError("db down")
+
+    outcome, stats = run_consumer(flaky, b'{"order_id": 1}')
+    assert outcome == "ack"
+    assert len(attempts) == 2
+    assert stats["processed"] == 1
+
+
+def test_consumer_workers_survive_processing_errors():
+    async def scenario():
+        async def handler(data):
+            pass
+
+        worker = Consumer("test.queue", "test", handler, prefetch_count=2, workers=1, max_attempts=1)
+        worker._tasks = [asyncio.create_task(worker._worker())]
+        broken, healthy = FakeMessage(b'{"order_id": 1}'), FakeMessage(b'{"order_id": 2}')
+        broken.broken = True
+        for message in (broken, healthy):
+            await worker._buffer.put(message)
+        await worker._buffer.join()
+        running = worker.stats()["workers_running"]
+        await worker.stop(timeout=0)
+        return broken.outcome, healthy.outcome, running, worker.stats()
+
+    broken, healthy, running, stats = asyncio.run(scenario())
+    assert (broken, healthy, running) == ("dead-letter", "ack", 1)
+    assert (stats["workers_running"], stats["processed"], stats["dead_lettered"]) == (0, 1, 1)
+
+
+def test_consumed_order_created_continues_the_publishers_trace(monkeypatch):
+    """The consumer span, its SQL and the relayed payment.completed publish join the trace in the message headers."""
+    import orjson
+    from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+    from opentelemetry.trace import SpanKind
+    from app import messaging, outbox, tracing
+
+    published = []
+
+    class RecordingPublisher:
+        async def publish(self, routing_key, body, headers=None):
+            published.append((routing_key, headers))
+            return True
+
+    trace_id = "ab" * 16
+    monkeypatch.setattr(consumer, "SessionLocal", TestingSessionLocal)
+    monkeypatch.setattr(outbox, "SessionLocal", TestingSessionLocal)
+    monkeypatch.setattr(messaging, "_publisher", RecordingPublisher())
+    exporter = InMemorySpanExporter()
+    tracing.configure_tracing(exporter)
+    try:
+        worker = Consumer("payment-service.order.created", "order.created", consumer.handle_order_created,
+                          prefetch_count=1, workers=1, max_attempts=1)
+        message = FakeMessage(orjson.dumps({"order_id": 601, "user_id": 9, "total_cents": 100, "currency": "USD"}))
+        message.headers = {"traceparent": f"00-{trace_id}-{'cd' * 8}-01"}
+        asyncio.run(worker.process(message))
+        assert published == []  # staged in the outbox with the payment, not published yet
+        spans = exporter.get_finished_spans()
+        asyncio.run(outbox.relay_batch(1000))
+        relayed = exporter.get_finished_spans()[len(spans):]
+    finally:
+        tracing.shutdown_tracing()
+
+    assert message.outcome == "ack"
+    assert {format(s.context.trace_id, "032x") for s in spans} == {trace_id}
+    process = next(s for s in spans if s.kind == SpanKind.CONSUMER)
+    assert (process.name, process.parent.span_id) == ("payment-service.order.created process", int("cd" * 8, 16))
+    assert any(s.name == "INSERT test" for s in spans)
+    assert any(s.kind == SpanKind.PRODUCER and format(s.context.trace_id, "032x") == trace_id for s in relayed)
+    assert any(m[0] == "payment.completed" and m[1]["traceparent"].split("-")[1] == trace_id for m in published)
+
+
+def test_payment_reads_are_cached_and_invalidated_by_writes(monkeypatch):
+    """Cached order payment lists are dropped when a new payment or an update lands."""
+    import fakeredis.aioredis
+    import httpx
+    from app import cache
+
+    async def scenario():
+        monkeypatch.setattr(cache, "_redis", fakeredis.aioredis.FakeRedis())
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as ac:
+            first = (await ac.post("/api/payments/", json={"order_id": 777, "amount": 5.0, "user_id": 3})).json()
+            assert len((await ac.get("/api/payments/order/777", headers=auth_headers(3))).json()) == 1
+            assert (await ac.get(f"/api/payments/{first['id']}", headers=auth_headers(3))).json() == first
+
+            await ac.post("/api/payments/", json={"order_id": 777, "amount": 6.0, "user_id": 3})
+            assert len((await ac.get("/api/payments/order/777", headers=auth_headers(3))).json()) == 2
+            assert (await ac.get("/api/payments/order/777", headers=auth_headers(4))).json() == []
+
+            await ac.put(f"/api/payments/{first['id']}", headers=auth_headers(3), json={"status": "refunded"})
+            assert (await ac.get(f"/api/payments/{first['id']}", headers=auth_headers(3))).json()["status"] == "refunded"
+            assert cache.cache_stats()["hits"] >= 1
+
+    asyncio.run(scenario())
+
+
+def test_cache_load_started_before_an_invalidation_is_not_stored(monkeypatch):
+    import fakeredis.aioredis
+    from app import cache
+
+    monkeypatch.setattr(cache, "_redis", fakeredis.aioredis.FakeRedis())
+
+    async def scenario():
+        release = asyncio.Event()
+
+        async def stale_loader():
+            await release.wait()
+            return b"[]"
+
+        load = asyncio.create_task(cache.get_or_load("payments:order:1", stale_loader))
+        await asyncio.sleep(0.01)
+        await cache.invalidate("payments:order:1")
+        release.set()
+        return await load, await cache._redis.get("payments:order:1")
+
+    assert asyncio.run(scenario()) == (b"[]", None)
+
+
+def test_export_streams_filtered_payments(monkeypatch):
+    import orjson
+    from app import export
+
+    monkeypatch.setattr(export, "SessionLocal", TestingSessionLocal)
+    monkeypatch.setattr(settings, "EXPORT_YIELD_PER", 1)
+    for order_id in (901, 902, 903):
+        client.post("/api/payments/", json={"order_id": order_id, "amount": 1.25, "user_id": 21})
+
+    rows = [orjson.loads(line) for line in client.get("/api/payments/export", headers=auth_headers(21)).text.splitlines()]
+    assert [(row["order_id"], row["amount_cents"]) for row in rows] == [(901, 125), (902, 125), (903, 125)]
+
+    csv_body = client.get("/api/payments/export", headers=auth_headers(21), params={"format": "csv", "status": "refunded"}).text
+    assert csv_body.splitlines() == [
+        "id,order_id,status,amount_cents,currency,payment_method,transaction_id,created_at,updated_at",
+    ]
+
+
+def test_create_payment_with_idempotency_key_charges_once():
+    headers = {"Idempotency-Key": "order-950"}
+    payment = {"order_id": 950, "amount": 12.0, "user_id": 22}
+    first = client.post("/api/payments/", headers=headers, json=payment)
+    again = client.post("/api/payments/", headers=headers, json=payment)
+    assert first.status_code == again.status_code == 201
+    assert again.json() == first.json() and again.headers["Idempotent-Replayed"] == "true"
+    assert len(client.get("/api/payments/order/950", headers=auth_headers(22)).json()) == 1
+    assert client.post("/api/payments/", headers=headers, json={**payment, "amount": 13.0}).status_code == 422
+
+
+def test_idempotency_keys_are_scoped_per_user():
+    headers = {"Idempotency-Key": "order-951"}
+    first = client.post("/api/payments/", headers=headers, json={"order_id": 951, "amount": 5.0, "user_id": 26})
+    other = client.post("/api/payments/", headers=headers, json={"order_id": 951, "amount": 7.0, "user_id": 27})
+    assert first.status_code == other.status_code == 201
+    assert "Idempotent-Replayed" not in other.headers and other.json()["id"] != first.json()["id"]
+    assert [p["amount_cents"] for p in client.get("/api/payments/order/951", headers=auth_headers(26)).json()] == [500]
+
+
+def test_row_documents_match_the_response_schema():
+    import orjson
+    from sqlalchemy import select
+    from app import documents
+    from app.models import Payment
+    from app.schemas import PaymentResponse
+
+    created = client.post("/api/payments/", json={"order_id": 960, "amount": "1234567.89", "user_id": 24}).json()
+
+    async def load():
+        async with TestingSessionLocal() as db:
+            rows = documents.assemble(await db.execute(select(*documents.PAYMENT_COLUMNS).where(Payment.id == created["id"])))
+            payment = await db.get(Payment, created["id"])
+            return rows, PaymentResponse.model_validate(payment).model_dump(mode="json")
+
+    rows, expected = asyncio.run(load())
+    assert orjson.dumps(rows[0]) == orjson.dumps(expected)
+    assert client.get("/api/payments/", headers=auth_headers(24)).json() == [expected] == [created]
+
+
+def test_old_payments_are_archived_and_readable_when_asked(monkeypatch):
+    from datetime import datetime
+    import orjson
+    from sqlalchemy import update
+    from app import export, partitions
+    from app.models import ArchivedPayment, Payment
+
+    monkeypatch.setattr(partitions, "engine", engine)
+    monkeypatch.setattr(partitions, "SessionLocal", TestingSessionLocal)
+    old, recent = (client.post("/api/payments/", json={"order_id": n, "amount": 3.0, "user_id": 25}).json()
+                   for n in (970, 971))
+
+    async def backdate():
+        async with TestingSessionLocal() as db:
+            await db.execute(update(Payment).where(Payment.id == old["id"]).values(created_at=datetime(2024, 5, 9)))
+            await db.commit()
+
+    asyncio.run(backdate())
+    assert asyncio.run(partitions.archive_payments(now=datetime(2026, 10, 17))) == 1
+
+    assert [p["id"] for p in client.get("/api/payments/", headers=auth_headers(25)).json()] == [recent["id"]]
+    assert client.get(f"/api/payments/{old['id']}", headers=auth_headers(25)).status_code == 404
+    listed = client.get("/api/payments/?include_archived=true", headers=auth_headers(25)).json()
+    assert [p["id"] for p in listed] == [recent["id"], old["id"]]
+    archived = client.get(f"/api/payments/{old['id']}?include_archived=true", headers=auth_headers(25)).json()
+    assert (archived["amount_cents"], archived["created_at"]) == (300, "2024-05-09T00:00:00")
+    assert client.get("/api/payments/order/970", headers=auth_headers(25)).json() == []
+    assert client.get("/api/payments/order/970?include_archived=true", headers=auth_headers(25)).json() == [archived]
+
+    monkeypatch.setattr(export, "SessionLocal", TestingSessionLocal)
+    exported = client.get("/api/payments/export?include_archived=true", headers=auth_headers(25)).text.splitlines()
+    assert [orjson.loads(line)["id"] for line in exported] == [old["id"], recent["id"]]
+    assert len(client.get("/api/payments/export", headers=auth_headers(25)).text.splitlines()) == 1
+
+    async def archive_recent_but_keep_it_live():
+        # As on Postgres, where archived rows stay in their partition until it is dropped
+        async with TestingSessionLocal() as db:
+            document = orjson.dumps({**recent, "created_at": datetime.fromisoformat(recent["created_at"])})
+            db.add(ArchivedPayment(id=recent["id"], user_id=25, order_id=971, created_at=datetime.fromisoformat(recent["created_at"]),
+                                   document=document))
+            await db.commit()
+
+    asyncio.run(archive_recent_but_keep_it_live())
+    assert len(client.get("/api/payments/?include_archived=true", headers=auth_headers(25)).json()) == 2
+    assert len(client.get("/api/payments/order/971?include_archived=true", headers=auth_headers(25)).json()) == 1
+    exported = client.get("/api/payments/export?include_archived=true", headers=auth_headers(25)).text.splitlines()
+    assert [orjson.loads(line)["id"] for line in exported] == [old["id"], recent["id"]]
+
+
+def test_rate_limits_and_admission_control(monkeypatch):
+    from app import ratelimit
+
+    monkeypatch.setattr(settings, "RATE_LIMIT_ENABLED", True)
+    monkeypatch.setattr(settings, "RATE_LIMIT_USER_RATE", 0.01)
+    monkeypatch.setattr(settings, "RATE_LIMIT_USER_BURST", 3)
+    monkeypatch.setattr(ratelimit.limiter, "local", ratelimit.LocalBuckets())
+    statuses = [client.get("/api/payments/", headers=auth_headers(26)).status_code for _ in range(4)]
+    assert statuses == [200, 200, 200, 429]
+    assert client.get("/api/payments/", headers=auth_headers(27)).status_code == 200
+
+    monkeypatch.setattr(ratelimit.admission, "limit", 0)
+    monkeypatch.setattr(settings, "ADMISSION_QUEUE_TIMEOUT_SECONDS", 0.01)
+    busy = client.get("/api/payments/", headers=auth_headers(27))
+    assert (busy.status_code, busy.headers["retry-after"]) == (503, "1")
+    assert client.get("/health").status_code == 200